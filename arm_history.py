@@ -0,0 +1,71 @@
+from typing import Dict, Iterable, Iterator, Optional
+
+HISTORY_LENGTH = 50
+
+
+class ArmHistory:
+    __slots__ = ('bits', 'length', 'maxlen')
+
+    def __init__(self, outcomes: Iterable[float] = (), maxlen: int = HISTORY_LENGTH):
+        self.bits = 0
+        self.length = 0
+        self.maxlen = maxlen
+        for outcome in outcomes:
+            self.append(outcome)
+
+    @classmethod
+    def from_state(cls, scores: Dict, maxlen: int = HISTORY_LENGTH) -> 'ArmHistory':
+        if 'history_bits' in scores:
+            history = cls(maxlen=maxlen)
+            history.length = min(int(scores.get('history_length', 0)), maxlen)
+            history.bits = int(scores['history_bits']) & ((1 << history.length) - 1)
+            return history
+        return cls(scores.get('history', []), maxlen=maxlen)
+
+    def to_state(self) -> Dict[str, int]:
+        return {'history_bits': self.bits, 'history_length': self.length}
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[float]:
+        for position in range(self.length - 1, -1, -1):
+            yield float((self.bits >> position) & 1)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ArmHistory):
+            return NotImplemented
+        return (self.bits, self.length, self.maxlen) == (other.bits, other.length, other.maxlen)
+
+    def __repr__(self) -> str:
+        return f"ArmHistory({list(self)!r})"
+
+    def append(self, outcome: float):
+        self.bits = ((self.bits << 1) | (1 if outcome > 0.5 else 0)) & ((1 << self.maxlen) - 1)
+        self.length = min(self.length + 1, self.maxlen)
+
+    def pop(self) -> float:
+        if not self.length:
+            raise IndexError("pop from an empty ArmHistory")
+        newest = self.bits & 1
+        self.bits >>= 1
+        self.length -= 1
+        return float(newest)
+
+    def appendleft(self, outcome: float):
+        if self.length >= self.maxlen:
+            return
+        if outcome > 0.5:
+            self.bits |= 1 << self.length
+        self.length += 1
+
+    def oldest(self) -> Optional[float]:
+        if not self.length:
+            return None
+        return float((self.bits >> (self.length - 1)) & 1)
+
+    def recent_mean(self, count: int) -> float:
+        count = min(count, self.length)
+        if not count:
+            return 0.0
+        return bin(self.bits & ((1 << count) - 1)).count('1') / count
@@ -0,0 +1,98 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_CALL_TIMEOUT = 20.0
+
+
+class AsyncSpotifyClient:
+    def __init__(self, spotify, max_concurrency: int = DEFAULT_CONCURRENCY,
+                 call_timeout: float = DEFAULT_CALL_TIMEOUT):
+        self.spotify = spotify
+        self.max_concurrency = max_concurrency
+        self.call_timeout = call_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='spotify-io')
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name='spotify-loop', daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def run(self, coroutine, timeout: Optional[float] = None):
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("AsyncSpotifyClient.run cannot block the event loop thread")
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result(timeout)
+
+    async def _call(self, call: functools.partial, timeout: Optional[float] = None):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            running = asyncio.get_running_loop().run_in_executor(self._executor, call)
+            return await asyncio.wait_for(running, timeout)
+
+    async def search_tracks(self, query: str, limit: int = 50, offset: int = 0,
+                            random_offset: bool = False) -> List[Dict]:
+        return await self._call(functools.partial(self.spotify.search_tracks, query, limit=limit, offset=offset,
+                                                  random_offset=random_offset), self.call_timeout)
+
+    async def search_many(self, queries: List[str], limit: int = 50, timeout: Optional[float] = None,
+                          random_offset: bool = False, limits: Optional[Dict[str, int]] = None) -> Dict[str, List[Dict]]:
+        limits = limits or {}
+        tasks = {query: asyncio.ensure_future(self.search_tracks(query, limit=limits.get(query, limit),
+                                                                 random_offset=random_offset))
+                 for query in dict.fromkeys(queries)}
+        if not tasks:
+            return {}
+        done, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            print(f"{len(pending)} of {len(tasks)} searches timed out after {timeout}s")
+
+        results = {}
+        for query, task in tasks.items():
+            if task not in done:
+                results[query] = []
+            elif task.exception() is not None:
+                print(f"Error searching {query!r}: {task.exception()}")
+                results[query] = []
+            else:
+                results[query] = task.result()
+        return results
+
+    async def get_batch_track_features(self, track_ids: List[str], batch_size: int = 100) -> Dict[str, Optional[Dict]]:
+        unique_ids = list(dict.fromkeys(track_ids))
+        batches = [unique_ids[i:i + batch_size] for i in range(0, len(unique_ids), batch_size)]
+        outcomes = await asyncio.gather(*(self._call(functools.partial(self.spotify.get_batch_track_features, batch),
+                                                     self.call_timeout)
+                                          for batch in batches), return_exceptions=True)
+        results = {}
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                print(f"Error fetching track features: {outcome}")
+                continue
+            results.update(outcome)
+        return results
+
+    async def update_playlist(self, track_uris: List[str], max_tracks: Optional[int] = None) -> Dict:
+        return await self._call(functools.partial(self.spotify.update_playlist, track_uris, max_tracks=max_tracks))
+
+    async def get_current_track(self) -> Optional[Dict]:
+        return await self._call(functools.partial(self.spotify.get_current_track), self.call_timeout)
+
+    async def play_track(self, uri: str):
+        return await self._call(functools.partial(self.spotify.play_track, uri), self.call_timeout)
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._executor.shutdown(wait=False)
+        self._loop.close()
@@ -0,0 +1,235 @@
+import argparse
+import heapq
+import os
+import random
+import tempfile
+import time
+import timeit
+from typing import Dict, Optional
+
+import numpy as np
+
+from catalog import TrackCatalog
+from genre_taxonomy import GENRE_TAXONOMY
+from features import FEATURE_NAMES
+from learning_engine import DEFAULT_ENGINE_CONFIG, ScoringModel, score_top_rows
+from playlist_selection import DEFAULT_ARTIST_CAP, DEFAULT_RELEVANCE_WEIGHT, default_genre_cap, mmr_select
+
+
+def _legacy_get_parent_genre(subgenre: str) -> Optional[str]:
+    subgenre_lower = subgenre.lower()
+
+    parent = GENRE_TAXONOMY.subgenre_to_parent.get(subgenre_lower)
+    if parent:
+        return parent
+
+    for normalized_subgenre, parent in GENRE_TAXONOMY.subgenre_to_parent.items():
+        if subgenre_lower in normalized_subgenre or normalized_subgenre in subgenre_lower:
+            return parent
+
+    return None
+
+
+def _legacy_is_cultural_variant(genre: str) -> bool:
+    cultural_prefixes = ['k-', 'j-', 'c-', 'mandopop', 'cantopop', 'britpop']
+    genre_lower = genre.lower()
+
+    for prefix in cultural_prefixes:
+        if genre_lower.startswith(prefix):
+            return True
+
+    cultural_genres = {
+        'k-pop', 'j-pop', 'c-pop', 'j-rock', 'k-indie',
+        'mandopop', 'cantopop', 'britpop', 'j-rap', 'k-r&b'
+    }
+    return genre_lower in cultural_genres
+
+
+def _report(name: str, legacy_seconds: float, current_seconds: float, calls: int):
+    legacy_ns = legacy_seconds / calls * 1e9
+    current_ns = current_seconds / calls * 1e9
+    print(f"{name:<28} legacy {legacy_ns:10.1f} ns/call   compiled {current_ns:8.1f} ns/call   "
+          f"speedup {legacy_seconds / current_seconds:6.1f}x")
+
+
+def bench_genre_taxonomy(repeat: int = 5, seed: int = 0) -> Dict[str, float]:
+    rng = random.Random(seed)
+    known = list(GENRE_TAXONOMY.subgenre_to_parent.keys())
+    unknown = ['k-pop', 'j-rock', 'bedroom pop', 'chamber psych', 'vapor soul', 'hyperpop',
+               'modern rock', 'german hip hop', 'indie soul', 'mandopop', 'lo-fi beats']
+    genres = [rng.choice(known + unknown) for _ in range(2000)]
+
+    for genre in genres:
+        assert GENRE_TAXONOMY.get_parent_genre(genre) == _legacy_get_parent_genre(genre), genre
+        assert GENRE_TAXONOMY.is_cultural_variant(genre) == _legacy_is_cultural_variant(genre), genre
+
+    calls = len(genres) * repeat
+    results = {}
+    cases = [
+        ('get_parent_genre', _legacy_get_parent_genre, GENRE_TAXONOMY.get_parent_genre),
+        ('is_cultural_variant', _legacy_is_cultural_variant, GENRE_TAXONOMY.is_cultural_variant),
+    ]
+    for name, legacy, current in cases:
+        legacy_seconds = timeit.timeit(lambda: [legacy(g) for g in genres], number=repeat)
+        current_seconds = timeit.timeit(lambda: [current(g) for g in genres], number=repeat)
+        _report(name, legacy_seconds, current_seconds, calls)
+        results[name] = legacy_seconds / current_seconds
+
+    return results
+
+
+def _pairwise_mmr_select(relevance, features, count, artist_keys, genre_keys):
+    spread = max(relevance) - min(relevance)
+    relevance = [(r - min(relevance)) / spread for r in relevance]
+    mean = [sum(column) / len(features) for column in zip(*features)]
+    unit = []
+    for row in features:
+        centered = [value - m for value, m in zip(row, mean)]
+        norm = sum(value * value for value in centered) ** 0.5
+        unit.append([value / norm for value in centered] if norm > 1e-9 else [0.0] * len(centered))
+
+    genre_cap = default_genre_cap(count)
+    selected = []
+    artist_counts = {}
+    genre_counts = {}
+    for _ in range(count):
+        best, best_score = None, float('-inf')
+        for i in range(len(relevance)):
+            if i in selected:
+                continue
+            if artist_counts.get(artist_keys[i], 0) >= DEFAULT_ARTIST_CAP or genre_counts.get(genre_keys[i], 0) >= genre_cap:
+                continue
+            similarity = max((sum(a * b for a, b in zip(unit[i], unit[j])) for j in selected), default=0.0)
+            score = DEFAULT_RELEVANCE_WEIGHT * relevance[i] - (1 - DEFAULT_RELEVANCE_WEIGHT) * max(similarity, 0.0)
+            if score > best_score:
+                best, best_score = i, score
+        selected.append(best)
+        artist_counts[artist_keys[best]] = artist_counts.get(artist_keys[best], 0) + 1
+        genre_counts[genre_keys[best]] = genre_counts.get(genre_keys[best], 0) + 1
+    return selected
+
+
+def bench_mmr(candidates: int = 1000, count: int = 25, repeat: int = 20, seed: int = 0) -> Dict[str, float]:
+    rng = np.random.default_rng(seed)
+    relevance = rng.random(candidates)
+    features = rng.random((candidates, 9))
+    artist_keys = [f"artist{i}" for i in rng.integers(0, candidates // 4, candidates)]
+    genre_keys = [f"genre{i}" for i in rng.integers(0, 12, candidates)]
+
+    picks = mmr_select(relevance, features, count, artist_keys=artist_keys, genre_keys=genre_keys)
+    legacy_picks = _pairwise_mmr_select(relevance.tolist(), features.tolist(), count, artist_keys, genre_keys)
+    assert picks == legacy_picks, (picks, legacy_picks)
+
+    legacy_seconds = timeit.timeit(
+        lambda: _pairwise_mmr_select(relevance.tolist(), features.tolist(), count, artist_keys, genre_keys), number=1)
+    current_seconds = timeit.timeit(
+        lambda: mmr_select(relevance, features, count, artist_keys=artist_keys, genre_keys=genre_keys),
+        number=repeat) / repeat
+    print(f"{f'mmr {count} of {candidates}':<28} pairwise {legacy_seconds * 1e3:10.1f} ms   "
+          f"vectorized {current_seconds * 1e3:8.2f} ms   speedup {legacy_seconds / current_seconds:6.1f}x")
+    return {'mmr_ms': current_seconds * 1e3, 'speedup': legacy_seconds / current_seconds}
+
+
+def _synthetic_scoring_model(rng: np.random.Generator, genres: int, artists: int) -> ScoringModel:
+    config = DEFAULT_ENGINE_CONFIG
+    return ScoringModel(
+        centroids=rng.random((4, 9), dtype=np.float32),
+        global_mean=np.full(9, 0.5, dtype=np.float32),
+        recent_mean=rng.random(9, dtype=np.float32),
+        session_mean=rng.random(9, dtype=np.float32),
+        preference_weights=(0.4, 0.4, 0.2),
+        distance_scale=config['distance_scale'],
+        genre_scores=rng.random(genres + 1, dtype=np.float32),
+        artist_scores=rng.random(artists + 1, dtype=np.float32),
+        genre_diversity=np.full(genres + 1, 0.15, dtype=np.float32),
+        artist_penalty=np.zeros(artists + 1, dtype=np.float32),
+        diversity_bonus=0.1,
+        exploration_rate=0.2,
+        mood_enabled=True,
+        session_bonus=0.0,
+        weights=np.array([config['feature_weight'], config['genre_weight'], config['artist_weight'],
+                          config['exploration_weight'], config['diversity_weight'],
+                          config['genre_diversity_weight'], config['mood_weight']], dtype=np.float32),
+        fallback_weights=np.array([config['fallback_feature_weight'], config['fallback_genre_weight'],
+                                   config['fallback_artist_weight'], config['fallback_exploration_weight'],
+                                   config['fallback_diversity_weight'], config['fallback_genre_diversity_weight'],
+                                   0.0], dtype=np.float32)
+    )
+
+
+def _synthetic_catalog_records(rng: np.random.Generator, rows: int, genres: int, artists: int):
+    features = rng.random((rows, len(FEATURE_NAMES)))
+    genre_ids = rng.integers(-1, genres, rows)
+    artist_ids = rng.integers(-1, artists, rows)
+    fallback = rng.random(rows) < 0.01
+    for i in range(rows):
+        record = {'id': f"t{i:021d}"}
+        if not fallback[i]:
+            record.update(zip(FEATURE_NAMES, features[i].tolist()))
+        if genre_ids[i] >= 0:
+            record['genre'] = f"genre{genre_ids[i]}"
+        if artist_ids[i] >= 0:
+            record['artist_id'] = f"a{artist_ids[i]:021d}"
+        yield record
+
+
+def bench_parallel_scoring(rows: int = 1_000_000, limit: int = 100, chunk_rows: int = 65536,
+                           workers: Optional[int] = None, seed: int = 0) -> Dict[str, float]:
+    from parallel_scoring import ParallelScorer
+
+    rng = np.random.default_rng(seed)
+    with tempfile.TemporaryDirectory() as directory:
+        catalog = TrackCatalog.build(os.path.join(directory, 'catalog'),
+                                     _synthetic_catalog_records(rng, rows, 500, 50000), normalized=True)
+        model = _synthetic_scoring_model(rng, len(catalog.genres), len(catalog.artist_ids))
+
+        start = time.perf_counter()
+        best = []
+        for offset, features, genre_ids, artist_idx, fallback in catalog.iter_chunks(chunk_rows):
+            for candidate in score_top_rows(model, features, genre_ids, artist_idx, fallback, offset, limit, rng):
+                if len(best) < limit:
+                    heapq.heappush(best, candidate)
+                elif candidate > best[0]:
+                    heapq.heapreplace(best, candidate)
+        serial_seconds = time.perf_counter() - start
+
+        scorer = ParallelScorer(workers=workers, chunk_rows=chunk_rows)
+        try:
+            scorer.top_rows(catalog, model, limit, seed=seed)
+            start = time.perf_counter()
+            top = scorer.top_rows(catalog, model, limit, seed=seed)
+            parallel_seconds = time.perf_counter() - start
+        finally:
+            scorer.close()
+        del catalog
+
+    assert len(top) == min(limit, rows)
+    print(f"{'catalog top-' + str(limit):<28} serial {rows / serial_seconds / 1e6:8.2f} Mrows/s   "
+          f"{scorer.workers} workers {rows / parallel_seconds / 1e6:8.2f} Mrows/s   "
+          f"speedup {serial_seconds / parallel_seconds:6.1f}x ({os.cpu_count()} cores)")
+    return {'serial_rows_per_second': rows / serial_seconds, 'parallel_rows_per_second': rows / parallel_seconds}
+
+
+BENCHMARKS = {
+    'genre_taxonomy': bench_genre_taxonomy,
+    'parallel_scoring': bench_parallel_scoring,
+    'mmr': bench_mmr,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for hot paths of the learning engine")
+    parser.add_argument('names', nargs='*', help=f"Benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    for name in args.names or list(BENCHMARKS):
+        print(f"== {name}")
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import argparse
+import csv
+import json
+import os
+import shutil
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from features import FALLBACK_VECTOR, FEATURE_NAMES, get_primary_genre
+
+CATALOG_VERSION = 1
+ID_WIDTH = 22
+ID_DTYPE = f'S{ID_WIDTH}'
+DEFAULT_CHUNK_ROWS = 65536
+
+
+def normalize_audio_features(raw: Dict) -> List[float]:
+    vector = []
+    for name in FEATURE_NAMES:
+        value = float(raw[name])
+        if name == 'tempo':
+            value = value / 200.0
+        elif name == 'loudness':
+            value = (value + 60) / 60.0
+        vector.append(value)
+    return vector
+
+
+def _split_list(value) -> List[str]:
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [str(item) for item in value if item]
+    return [item.strip() for item in str(value).split(';') if item.strip()]
+
+
+def read_records(path: str) -> Iterator[Dict]:
+    with open(path, newline='', encoding='utf-8') as file:
+        if path.lower().endswith('.csv'):
+            yield from csv.DictReader(file)
+            return
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Skipping malformed record {path}:{line_number}: {e}")
+
+
+class CatalogBuilder:
+    def __init__(self, path: str, normalized: bool = False, flush_rows: int = 10000):
+        self.path = path
+        self.normalized = normalized
+        self.flush_rows = flush_rows
+        os.makedirs(path, exist_ok=True)
+
+        self.rows = 0
+        self.skipped = 0
+        self.genres: Dict[str, int] = {}
+        self.artists: Dict[str, int] = {}
+        self._buffers = self._empty_buffers()
+        self._metadata_offset = 0
+
+        self._files = {
+            'features': open(self._file('features.f32'), 'wb'),
+            'track_ids': open(self._file('track_ids.bin'), 'wb'),
+            'genre_ids': open(self._file('genre_ids.i32'), 'wb'),
+            'artist_idx': open(self._file('artist_idx.i32'), 'wb'),
+            'fallback': open(self._file('fallback.u8'), 'wb'),
+            'metadata_offsets': open(self._file('metadata.idx'), 'wb'),
+        }
+        self._metadata = open(self._file('metadata.jsonl'), 'wb')
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @staticmethod
+    def _empty_buffers() -> Dict[str, List]:
+        return {name: [] for name in ('features', 'track_ids', 'genre_ids', 'artist_idx', 'fallback', 'metadata_offsets')}
+
+    def add(self, record: Dict) -> bool:
+        track_id = str(record.get('id') or record.get('track_id') or '')
+        if not track_id or len(track_id) > ID_WIDTH or not track_id.isascii():
+            self.skipped += 1
+            return False
+
+        try:
+            if self.normalized:
+                vector = [float(record[name]) for name in FEATURE_NAMES]
+            else:
+                vector = normalize_audio_features(record)
+            fallback = False
+        except (KeyError, TypeError, ValueError):
+            vector = list(FALLBACK_VECTOR)
+            fallback = True
+
+        genres = _split_list(record.get('genres') or record.get('genre'))
+        primary_genre = get_primary_genre(genres)
+        artist_id = record.get('artist_id') or next(iter(_split_list(record.get('artist_ids'))), None)
+        if artist_id and (len(artist_id) > ID_WIDTH or not artist_id.isascii()):
+            artist_id = None
+
+        buffers = self._buffers
+        buffers['features'].append(vector)
+        buffers['track_ids'].append(track_id.encode('ascii'))
+        buffers['genre_ids'].append(self.genres.setdefault(primary_genre, len(self.genres)) if primary_genre else -1)
+        buffers['artist_idx'].append(self.artists.setdefault(artist_id, len(self.artists)) if artist_id else -1)
+        buffers['fallback'].append(fallback)
+        buffers['metadata_offsets'].append(self._metadata_offset)
+
+        metadata = {key: record[key] for key in ('name', 'artist', 'album_cover', 'uri') if record.get(key)}
+        if 'artist' not in metadata and record.get('artists'):
+            metadata['artist'] = ', '.join(_split_list(record['artists']))
+        line = (json.dumps(metadata, ensure_ascii=False) + '\n').encode('utf-8')
+        self._metadata.write(line)
+        self._metadata_offset += len(line)
+
+        self.rows += 1
+        if len(buffers['features']) >= self.flush_rows:
+            self._flush()
+        return True
+
+    def add_all(self, records: Iterable[Dict]):
+        for record in records:
+            self.add(record)
+
+    def _flush(self):
+        buffers = self._buffers
+        if not buffers['features']:
+            return
+        self._files['features'].write(np.asarray(buffers['features'], dtype=np.float32).tobytes())
+        self._files['track_ids'].write(np.asarray(buffers['track_ids'], dtype=ID_DTYPE).tobytes())
+        self._files['genre_ids'].write(np.asarray(buffers['genre_ids'], dtype=np.int32).tobytes())
+        self._files['artist_idx'].write(np.asarray(buffers['artist_idx'], dtype=np.int32).tobytes())
+        self._files['fallback'].write(np.asarray(buffers['fallback'], dtype=np.uint8).tobytes())
+        self._files['metadata_offsets'].write(np.asarray(buffers['metadata_offsets'], dtype=np.int64).tobytes())
+        self._buffers = self._empty_buffers()
+
+    def close(self):
+        self._flush()
+        self._files['metadata_offsets'].write(np.asarray([self._metadata_offset], dtype=np.int64).tobytes())
+        for file in self._files.values():
+            file.close()
+        self._metadata.close()
+
+        artist_ids = np.asarray(list(self.artists), dtype=ID_DTYPE)
+        order = np.argsort(artist_ids, kind='stable')
+        np.asarray(artist_ids[order], dtype=ID_DTYPE).tofile(self._file('artist_ids.bin'))
+        self._remap_artists(order)
+
+        with open(self._file('genres.json'), 'w') as file:
+            json.dump(list(self.genres), file)
+        with open(self._file('catalog.json'), 'w') as file:
+            json.dump({
+                'version': CATALOG_VERSION,
+                'rows': self.rows,
+                'features': FEATURE_NAMES,
+                'genres': len(self.genres),
+                'artists': len(self.artists)
+            }, file, indent=2)
+
+    def _remap_artists(self, order: np.ndarray):
+        if not self.rows or not len(order):
+            return
+        rank = np.empty(len(order), dtype=np.int32)
+        rank[order] = np.arange(len(order), dtype=np.int32)
+        artist_idx = np.memmap(self._file('artist_idx.i32'), dtype=np.int32, mode='r+', shape=(self.rows,))
+        for start in range(0, self.rows, DEFAULT_CHUNK_ROWS):
+            block = artist_idx[start:start + DEFAULT_CHUNK_ROWS]
+            known = block >= 0
+            block[known] = rank[block[known]]
+        artist_idx.flush()
+        del artist_idx
+
+
+class TrackCatalog:
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'catalog.json')) as file:
+            self.meta = json.load(file)
+        if self.meta.get('version') != CATALOG_VERSION or self.meta.get('features') != FEATURE_NAMES:
+            raise ValueError(f"Unsupported catalog format in {path}")
+
+        self.rows = int(self.meta['rows'])
+        self.features = self._map('features.f32', np.float32, (self.rows, len(FEATURE_NAMES)))
+        self.track_ids = self._map('track_ids.bin', ID_DTYPE, (self.rows,))
+        self.genre_ids = self._map('genre_ids.i32', np.int32, (self.rows,))
+        self.artist_idx = self._map('artist_idx.i32', np.int32, (self.rows,))
+        self.fallback = self._map('fallback.u8', np.uint8, (self.rows,))
+        self.metadata_offsets = self._map('metadata.idx', np.int64, (self.rows + 1,))
+        self.artist_ids = self._map('artist_ids.bin', ID_DTYPE, (int(self.meta['artists']),))
+
+        with open(os.path.join(path, 'genres.json')) as file:
+            self.genres: List[str] = json.load(file)
+        self.genre_index = {genre: i for i, genre in enumerate(self.genres)}
+
+    def _map(self, name: str, dtype, shape: Tuple[int, ...]) -> np.ndarray:
+        if not shape[0]:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(os.path.join(self.path, name), dtype=dtype, mode='r', shape=shape)
+
+    def __len__(self) -> int:
+        return self.rows
+
+    @classmethod
+    def build(cls, path: str, records: Iterable[Dict], normalized: bool = False) -> 'TrackCatalog':
+        temp_path = path.rstrip('/\\') + '.building'
+        shutil.rmtree(temp_path, ignore_errors=True)
+        builder = CatalogBuilder(temp_path, normalized=normalized)
+        try:
+            builder.add_all(records)
+            builder.close()
+        except BaseException:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            raise
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(temp_path, path)
+        print(f"Built catalog at {path}: {builder.rows} tracks, {len(builder.genres)} genres, "
+              f"{len(builder.artists)} artists ({builder.skipped} records skipped)")
+        return cls(path)
+
+    def artist_rows(self, artist_ids: Iterable[str]) -> Dict[str, int]:
+        found = {}
+        if not len(self.artist_ids):
+            return found
+        for artist_id in artist_ids:
+            if not artist_id or len(artist_id) > ID_WIDTH:
+                continue
+            key = artist_id.encode('ascii', 'ignore')
+            position = int(np.searchsorted(self.artist_ids, key))
+            if position < len(self.artist_ids) and self.artist_ids[position] == key:
+                found[artist_id] = position
+        return found
+
+    def iter_chunks(self, chunk_rows: int = DEFAULT_CHUNK_ROWS, start: int = 0,
+                    stop: Optional[int] = None) -> Iterator[Tuple[int, np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        stop = self.rows if stop is None else min(stop, self.rows)
+        for offset in range(start, stop, chunk_rows):
+            end = min(offset + chunk_rows, stop)
+            yield (offset, self.features[offset:end], self.genre_ids[offset:end],
+                   self.artist_idx[offset:end], self.fallback[offset:end])
+
+    def track_id(self, row: int) -> str:
+        return self.track_ids[row].decode('ascii')
+
+    def metadata(self, row: int) -> Dict:
+        start, end = int(self.metadata_offsets[row]), int(self.metadata_offsets[row + 1])
+        with open(os.path.join(self.path, 'metadata.jsonl'), 'rb') as file:
+            file.seek(start)
+            return json.loads(file.read(end - start))
+
+    def track(self, row: int) -> Dict:
+        track_id = self.track_id(row)
+        metadata = self.metadata(row)
+        return {
+            'id': track_id,
+            'name': metadata.get('name', 'Unknown'),
+            'artist': metadata.get('artist', 'Unknown'),
+            'album_cover': metadata.get('album_cover'),
+            'uri': metadata.get('uri') or f"spotify:track:{track_id}"
+        }
+
+    def track_features(self, row: int) -> Dict:
+        features = {name: float(value) for name, value in zip(FEATURE_NAMES, self.features[row])}
+        genre_id = int(self.genre_ids[row])
+        artist_idx = int(self.artist_idx[row])
+        features.update({
+            'id': self.track_id(row),
+            'genres': [self.genres[genre_id]] if genre_id >= 0 else [],
+            'artist_id': self.artist_ids[artist_idx].decode('ascii') if artist_idx >= 0 else None,
+            'fallback': bool(self.fallback[row])
+        })
+        return features
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a local track catalog for scoring without API calls")
+    parser.add_argument('sources', nargs='+', help="JSONL or CSV files with one track per record")
+    parser.add_argument('--output', default=os.path.join('data', 'catalog'), help="Catalog directory to write")
+    parser.add_argument('--normalized', action='store_true',
+                        help="Feature values are already scaled to 0-1 (tempo and loudness included)")
+    args = parser.parse_args()
+
+    def records():
+        for source in args.sources:
+            yield from read_records(source)
+
+    TrackCatalog.build(args.output, records(), normalized=args.normalized)
+
+
+if __name__ == "__main__":
+    main()
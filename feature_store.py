@@ -0,0 +1,329 @@
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from features import FALLBACK_VECTOR, FEATURE_NAMES, get_primary_genre
+
+FEATURE_STORE_VERSION = 1
+INITIAL_CAPACITY = 1024
+
+
+def feature_vector(features: Dict) -> List[float]:
+    return [float(features[name]) for name in FEATURE_NAMES]
+
+
+def _local_ids(ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    present = ids >= 0
+    vocabulary = np.unique(ids[present])
+    local = np.full(len(ids), -1, dtype=np.int32)
+    local[present] = np.searchsorted(vocabulary, ids[present])
+    return vocabulary, local
+
+
+class FeatureBlock:
+    def __init__(self, store: 'FeatureStore', rows: Sequence[int]):
+        rows = np.asarray(rows, dtype=np.intp)
+        with store._lock:
+            self.features, genre_ids, artist_idx, self.fallback = store.take(rows)
+            self.track_ids = [store.track_ids[row] for row in rows]
+            genre_vocabulary, self.genre_ids = _local_ids(genre_ids)
+            artist_vocabulary, self.artist_idx = _local_ids(artist_idx)
+            self.genres = [store.genres[genre] for genre in genre_vocabulary]
+            self.artist_ids = [store.artist_ids[artist] for artist in artist_vocabulary]
+        self.genre_index = {genre: i for i, genre in enumerate(self.genres)}
+        self.artist_index = {artist_id: i for i, artist_id in enumerate(self.artist_ids)}
+
+    def __len__(self) -> int:
+        return len(self.track_ids)
+
+    def artist_rows(self, artist_ids: Iterable[str]) -> Dict[str, int]:
+        return {artist_id: self.artist_index[artist_id] for artist_id in artist_ids if artist_id in self.artist_index}
+
+
+class FeatureStore:
+    def __init__(self, capacity: int = INITIAL_CAPACITY, path: Optional[str] = None, save_interval: float = 30.0):
+        self.path = path
+        self.save_interval = save_interval
+        self.size = 0
+        self.rows: Dict[str, int] = {}
+        self.track_ids: List[str] = []
+        self.genres: List[str] = []
+        self.genre_index: Dict[str, int] = {}
+        self.artist_ids: List[str] = []
+        self.artist_index: Dict[str, int] = {}
+        self._genre_sets: List[tuple] = [()]
+        self._genre_set_index: Dict[tuple, int] = {(): 0}
+        self._allocate(max(1, capacity))
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._last_save = time.time()
+        if path:
+            self._load()
+
+    def _allocate(self, capacity: int):
+        old_size = self.size
+        features = np.empty((capacity, len(FEATURE_NAMES)), dtype=np.float32)
+        genre_ids = np.full(capacity, -1, dtype=np.int32)
+        artist_idx = np.full(capacity, -1, dtype=np.int32)
+        genre_set_ids = np.zeros(capacity, dtype=np.int32)
+        fallback = np.zeros(capacity, dtype=np.uint8)
+        if old_size:
+            features[:old_size] = self._features[:old_size]
+            genre_ids[:old_size] = self._genre_ids[:old_size]
+            artist_idx[:old_size] = self._artist_idx[:old_size]
+            genre_set_ids[:old_size] = self._genre_set_ids[:old_size]
+            fallback[:old_size] = self._fallback[:old_size]
+        self._features = features
+        self._genre_ids = genre_ids
+        self._artist_idx = artist_idx
+        self._genre_set_ids = genre_set_ids
+        self._fallback = fallback
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, track_id: str) -> bool:
+        return track_id in self.rows
+
+    @property
+    def features(self) -> np.ndarray:
+        return self._features[:self.size]
+
+    @property
+    def genre_ids(self) -> np.ndarray:
+        return self._genre_ids[:self.size]
+
+    @property
+    def artist_idx(self) -> np.ndarray:
+        return self._artist_idx[:self.size]
+
+    @property
+    def fallback(self) -> np.ndarray:
+        return self._fallback[:self.size]
+
+    def row(self, track_id: str) -> Optional[int]:
+        return self.rows.get(track_id)
+
+    def _intern_genre(self, genre: str) -> int:
+        index = self.genre_index.get(genre)
+        if index is None:
+            index = self.genre_index[genre] = len(self.genres)
+            self.genres.append(genre)
+        return index
+
+    def _intern_artist(self, artist_id: Optional[str]) -> int:
+        if not artist_id:
+            return -1
+        index = self.artist_index.get(artist_id)
+        if index is None:
+            index = self.artist_index[artist_id] = len(self.artist_ids)
+            self.artist_ids.append(artist_id)
+        return index
+
+    def _intern_genre_set(self, genres: Sequence[str]) -> int:
+        key = tuple(self._intern_genre(genre) for genre in genres)
+        index = self._genre_set_index.get(key)
+        if index is None:
+            index = self._genre_set_index[key] = len(self._genre_sets)
+            self._genre_sets.append(key)
+        return index
+
+    def _set_genres(self, row: int, genres: Sequence[str]):
+        primary_genre = get_primary_genre(list(genres))
+        self._genre_set_ids[row] = self._intern_genre_set(genres)
+        self._genre_ids[row] = self._intern_genre(primary_genre) if primary_genre else -1
+
+    def add(self, track_id: str, vector: Sequence[float], genres: Sequence[str] = (),
+            artist_id: Optional[str] = None, fallback: bool = False) -> int:
+        with self._lock:
+            row = self.rows.get(track_id)
+            if row is None:
+                if self.size == len(self._features):
+                    self._allocate(len(self._features) * 2)
+                row = self.size
+                self.rows[track_id] = row
+                self.track_ids.append(track_id)
+                self.size += 1
+            self._features[row] = vector
+            self._artist_idx[row] = self._intern_artist(artist_id)
+            self._fallback[row] = bool(fallback)
+            self._set_genres(row, genres or ())
+            self._dirty = True
+            return row
+
+    def add_many(self, track_ids: Sequence[str], vectors: np.ndarray, genres: Sequence[Sequence[str]],
+                 artist_ids: Sequence[Optional[str]], fallback: Sequence[bool]) -> np.ndarray:
+        with self._lock:
+            while self.size + len(track_ids) > len(self._features):
+                self._allocate(len(self._features) * 2)
+            rows = np.empty(len(track_ids), dtype=np.intp)
+            for i, track_id in enumerate(track_ids):
+                row = self.rows.get(track_id)
+                if row is None:
+                    row = self.rows[track_id] = self.size
+                    self.track_ids.append(track_id)
+                    self.size += 1
+                rows[i] = row
+                self._artist_idx[row] = self._intern_artist(artist_ids[i])
+                self._set_genres(row, genres[i] or ())
+            self._features[rows] = vectors
+            self._fallback[rows] = fallback
+            self._dirty = True
+            return rows
+
+    def add_features(self, features: Dict) -> int:
+        return self.add(features['id'], feature_vector(features), features.get('genres') or (),
+                        features.get('artist_id'), bool(features.get('fallback')))
+
+    def set_genres(self, row: int, genres: Sequence[str]):
+        with self._lock:
+            self._set_genres(row, genres)
+            self._dirty = True
+
+    def track_id(self, row: int) -> str:
+        return self.track_ids[row]
+
+    def track_genres(self, row: int) -> List[str]:
+        return [self.genres[genre] for genre in self._genre_sets[self._genre_set_ids[row]]]
+
+    def primary_genre(self, row: int) -> Optional[str]:
+        genre_id = int(self._genre_ids[row])
+        return self.genres[genre_id] if genre_id >= 0 else None
+
+    def artist_id(self, row: int) -> Optional[str]:
+        artist_idx = int(self._artist_idx[row])
+        return self.artist_ids[artist_idx] if artist_idx >= 0 else None
+
+    def is_fallback(self, row: int) -> bool:
+        return bool(self._fallback[row])
+
+    def take(self, rows: Sequence[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        rows = np.asarray(rows, dtype=np.intp)
+        with self._lock:
+            return self._features[rows], self._genre_ids[rows], self._artist_idx[rows], self._fallback[rows]
+
+    def artist_rows(self, artist_ids: Iterable[str]) -> Dict[str, int]:
+        return {artist_id: self.artist_index[artist_id] for artist_id in artist_ids if artist_id in self.artist_index}
+
+    def block(self, rows: Sequence[int]) -> FeatureBlock:
+        return FeatureBlock(self, rows)
+
+    def track_features(self, row: int) -> Dict:
+        features = {name: float(value) for name, value in zip(FEATURE_NAMES, self._features[row])}
+        features.update({
+            'id': self.track_ids[row],
+            'genres': self.track_genres(row),
+            'artist_id': self.artist_id(row),
+            'fallback': self.is_fallback(row)
+        })
+        return features
+
+    def fallback_track_ids(self) -> List[str]:
+        with self._lock:
+            return [self.track_ids[row] for row in np.flatnonzero(self.fallback)]
+
+    def genreless_track_ids(self) -> List[str]:
+        with self._lock:
+            missing = (self._genre_set_ids[:self.size] == 0) & (self._artist_idx[:self.size] >= 0)
+            return [self.track_ids[row] for row in np.flatnonzero(missing)]
+
+    def clear(self):
+        with self._lock:
+            self.size = 0
+            self.rows.clear()
+            self.track_ids.clear()
+            self.genres.clear()
+            self.genre_index.clear()
+            self.artist_ids.clear()
+            self.artist_index.clear()
+            self._genre_sets = [()]
+            self._genre_set_index = {(): 0}
+            self._allocate(INITIAL_CAPACITY)
+            self._dirty = True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = self.size
+            array_bytes = sum(array[:size].nbytes for array in (
+                self._features, self._genre_ids, self._artist_idx, self._genre_set_ids, self._fallback))
+            return {
+                'tracks': size,
+                'genres': len(self.genres),
+                'artists': len(self.artist_ids),
+                'bytes_per_track': array_bytes / size if size else 0.0
+            }
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as stored:
+                if int(stored['version']) != FEATURE_STORE_VERSION or list(stored['feature_names']) != FEATURE_NAMES:
+                    print(f"Ignoring feature store {self.path} written in an older format")
+                    return
+                track_ids = stored['track_ids'].tolist()
+                genres = stored['genres'].tolist()
+                artist_ids = stored['artist_ids'].tolist()
+                set_offsets = stored['genre_set_offsets']
+                set_members = stored['genre_set_members']
+                arrays = {name: stored[name] for name in (
+                    'features', 'genre_ids', 'artist_idx', 'genre_set_ids', 'fallback')}
+        except Exception as e:
+            print(f"Error loading feature store {self.path}: {e}")
+            return
+
+        size = len(track_ids)
+        self.size = 0
+        self._allocate(max(INITIAL_CAPACITY, size))
+        self._features[:size] = arrays['features']
+        self._genre_ids[:size] = arrays['genre_ids']
+        self._artist_idx[:size] = arrays['artist_idx']
+        self._genre_set_ids[:size] = arrays['genre_set_ids']
+        self._fallback[:size] = arrays['fallback']
+        self.size = size
+        self.track_ids = track_ids
+        self.rows = {track_id: row for row, track_id in enumerate(track_ids)}
+        self.genres = genres
+        self.genre_index = {genre: i for i, genre in enumerate(genres)}
+        self.artist_ids = artist_ids
+        self.artist_index = {artist_id: i for i, artist_id in enumerate(artist_ids)}
+        self._genre_sets = [tuple(int(genre) for genre in set_members[start:end])
+                            for start, end in zip(set_offsets[:-1], set_offsets[1:])]
+        self._genre_set_index = {genre_set: i for i, genre_set in enumerate(self._genre_sets)}
+
+    def save(self, force: bool = False):
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty or (not force and time.time() - self._last_save < self.save_interval):
+                return
+            size = self.size
+            set_lengths = [len(genre_set) for genre_set in self._genre_sets]
+            stored = {
+                'version': np.int32(FEATURE_STORE_VERSION),
+                'feature_names': np.array(FEATURE_NAMES),
+                'track_ids': np.array(self.track_ids, dtype=str),
+                'genres': np.array(self.genres, dtype=str),
+                'artist_ids': np.array(self.artist_ids, dtype=str),
+                'genre_set_offsets': np.concatenate([[0], np.cumsum(set_lengths)]).astype(np.int64),
+                'genre_set_members': np.array([genre for genre_set in self._genre_sets for genre in genre_set],
+                                              dtype=np.int32),
+                'features': self._features[:size].copy(),
+                'genre_ids': self._genre_ids[:size].copy(),
+                'artist_idx': self._artist_idx[:size].copy(),
+                'genre_set_ids': self._genre_set_ids[:size].copy(),
+                'fallback': self._fallback[:size].copy()
+            }
+            self._dirty = False
+            self._last_save = time.time()
+
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, 'wb') as file:
+                np.savez(file, **stored)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            print(f"Error writing feature store {self.path}: {e}")
@@ -0,0 +1,27 @@
+from typing import List, Optional
+
+from genre_taxonomy import GENRE_TAXONOMY
+
+FEATURE_NAMES = [
+    'danceability', 'energy', 'valence', 'tempo', 'acousticness',
+    'instrumentalness', 'speechiness', 'liveness', 'loudness'
+]
+
+FALLBACK_VECTOR = [0.5, 0.5, 0.5, 0.5, 0.5, 0.0, 0.5, 0.5, 0.5]
+
+
+def get_primary_genre(genres: List[str]) -> Optional[str]:
+    if not genres:
+        return None
+
+    infos = [GENRE_TAXONOMY.lookup(genre) for genre in genres]
+
+    for genre, info in zip(genres, infos):
+        if info.is_cultural:
+            return genre
+
+    for genre, info in zip(genres, infos):
+        if info.parent:
+            return genre
+
+    return genres[0]
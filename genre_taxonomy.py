@@ -1,10 +1,33 @@
-from typing import Dict, List, Set, Optional
+import re
+import sys
+import threading
+from types import MappingProxyType
+from typing import Dict, List, Set, Optional, NamedTuple
+
+CULTURAL_PREFIXES = ('k-', 'j-', 'c-', 'mandopop', 'cantopop', 'britpop')
+
+
+class GenreInfo(NamedTuple):
+    genre_id: int
+    parent: Optional[str]
+    is_cultural: bool
+    display_name: str
+
 
 class GenreTaxonomy:
     def __init__(self):
         self.taxonomy = self._build_taxonomy()
         self.subgenre_to_parent = self._build_reverse_mapping()
-        
+
+        self._cultural_pattern = re.compile('|'.join(re.escape(prefix) for prefix in CULTURAL_PREFIXES))
+        self._compile_lock = threading.Lock()
+        self._genre_names: List[str] = []
+        self._genre_ids: Dict[str, int] = {}
+        self._lookup: Dict[str, GenreInfo] = {}
+        for subgenre in self.subgenre_to_parent:
+            self._compile(subgenre)
+        self.genre_table = MappingProxyType(self._lookup)
+
     def _build_taxonomy(self) -> Dict[str, List[str]]:
         return {
             'House': [
@@ -467,21 +490,58 @@ class GenreTaxonomy:
                 reverse_map[child.lower()] = parent
         return reverse_map
     
-    def get_parent_genre(self, subgenre: str) -> Optional[str]:
-        subgenre_lower = subgenre.lower()
-        
-        parent = self.subgenre_to_parent.get(subgenre_lower)
+    def _resolve_parent(self, genre_lower: str) -> Optional[str]:
+        parent = self.subgenre_to_parent.get(genre_lower)
         if parent:
             return parent
-        
+
         for normalized_subgenre, parent in self.subgenre_to_parent.items():
-            if subgenre_lower in normalized_subgenre or normalized_subgenre in subgenre_lower:
+            if genre_lower in normalized_subgenre or normalized_subgenre in genre_lower:
                 return parent
-        
+
         return None
+
+    def _compile(self, genre: str) -> GenreInfo:
+        with self._compile_lock:
+            info = self._lookup.get(genre)
+            if info is not None:
+                return info
+
+            genre_lower = sys.intern(genre.lower())
+            info = self._lookup.get(genre_lower)
+            if info is None:
+                parent = self._resolve_parent(genre_lower)
+                genre_id = len(self._genre_names)
+                self._genre_names.append(genre_lower)
+                self._genre_ids[genre_lower] = genre_id
+                info = GenreInfo(
+                    genre_id=genre_id,
+                    parent=sys.intern(parent) if parent else None,
+                    is_cultural=self._cultural_pattern.match(genre_lower) is not None,
+                    display_name=sys.intern(parent if parent else genre_lower.title())
+                )
+                self._lookup[genre_lower] = info
+
+            self._lookup[sys.intern(genre)] = info
+            return info
+
+    def lookup(self, genre: str) -> GenreInfo:
+        info = self._lookup.get(genre)
+        if info is None:
+            info = self._compile(genre)
+        return info
+
+    def genre_id(self, genre: str) -> int:
+        return self.lookup(genre).genre_id
+
+    def genre_name(self, genre_id: int) -> str:
+        return self._genre_names[genre_id]
+
+    def get_parent_genre(self, subgenre: str) -> Optional[str]:
+        return self.lookup(subgenre).parent
     
     def should_aggregate(self, genre: str) -> bool:
-        return self.get_parent_genre(genre) is not None
+        return self.lookup(genre).parent is not None
     
     def get_all_parent_genres(self) -> Set[str]:
         return set(self.taxonomy.keys())
@@ -490,41 +550,21 @@ class GenreTaxonomy:
         return self.taxonomy.get(parent, [])
     
     def is_cultural_variant(self, genre: str) -> bool:
-        cultural_prefixes = ['k-', 'j-', 'c-', 'mandopop', 'cantopop', 'britpop']
-        genre_lower = genre.lower()
-        
-        for prefix in cultural_prefixes:
-            if genre_lower.startswith(prefix):
-                return True
-        
-        cultural_genres = {
-            'k-pop', 'j-pop', 'c-pop', 'j-rock', 'k-indie',
-            'mandopop', 'cantopop', 'britpop', 'j-rap', 'k-r&b'
-        }
-        return genre_lower in cultural_genres
-    
+        return self.lookup(genre).is_cultural
+
     def normalize_genre_for_display(self, genre: str) -> str:
-        parent = self.get_parent_genre(genre)
-        if parent:
-            return parent
-        
-        if self.is_cultural_variant(genre):
-            return genre.title()
-        
-        return genre.title()
-    
+        return self.lookup(genre).display_name
+
     def get_genre_hierarchy_info(self, genre: str) -> Dict[str, any]:
-        parent = self.get_parent_genre(genre)
-        is_parent = genre in self.taxonomy
-        is_cultural = self.is_cultural_variant(genre)
-        
+        info = self.lookup(genre)
+
         return {
             'original': genre,
-            'parent': parent,
-            'display_name': self.normalize_genre_for_display(genre),
-            'is_parent': is_parent,
-            'is_cultural_variant': is_cultural,
-            'should_aggregate': parent is not None
+            'parent': info.parent,
+            'display_name': info.display_name,
+            'is_parent': genre in self.taxonomy,
+            'is_cultural_variant': info.is_cultural,
+            'should_aggregate': info.parent is not None
         }
 
 GENRE_TAXONOMY = GenreTaxonomy()
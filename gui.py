@@ -4,7 +4,6 @@ import requests
 from io import BytesIO
 import threading
 import time
-import numpy as np
 
 class MusicLearnerGUI(ctk.CTk):
     BUTTON_DEFAULT = "#2a2a2a"
@@ -16,12 +15,13 @@ class MusicLearnerGUI(ctk.CTk):
     GENRE_ITEM_HEIGHT = 65
     GENRE_ITEM_SPACING = 71
 
-    def __init__(self, spotify_client, learning_engine, storage):
+    def __init__(self, spotify_client, learning_engine, storage, playlist_size=25):
         super().__init__()
 
         self.spotify = spotify_client
         self.engine = learning_engine
         self.storage = storage
+        self.playlist_size = playlist_size
 
         self.title("Spotify AI Learner")
         self.state('zoomed')
@@ -353,13 +353,7 @@ class MusicLearnerGUI(ctk.CTk):
 
     def _update_playlist_async(self):
         try:
-            tracks = self.engine.generate_playlist_tracks(self.session_played_tracks, count=25)
-            if not tracks:
-                self.after(0, lambda: self._playlist_done("No tracks found", False))
-                return
-
-            track_uris = [t['uri'] for t in tracks if t.get('uri')]
-            result = self.spotify.update_playlist(track_uris)
+            result = self.engine.refresh_playlist(self.session_played_tracks, count=self.playlist_size)
 
             if result['success']:
                 message = f"Playlist updated ({result['track_count']} tracks)"
@@ -392,32 +386,9 @@ class MusicLearnerGUI(ctk.CTk):
             self.pending_ui_updates = False
 
         try:
-            aggregated_scores = self.engine.get_aggregated_genre_scores()
-            genre_data = []
-
-            for genre, scores in aggregated_scores.items():
-                try:
-                    alpha = scores['alpha']
-                    beta = scores['beta']
-                    history = scores.get('history', [])
-                    interactions = len(history)
-
-                    if interactions == 0:
-                        continue
-
-                    probability = np.random.beta(alpha, beta)
-                    genre_data.append({
-                        'name': genre,
-                        'probability': probability,
-                        'samples': interactions,
-                        'total_interactions': alpha + beta,
-                        'subgenres': scores.get('subgenres', [])
-                    })
-                except Exception as e:
-                    print(f"Error processing genre {genre}: {e}")
-                    continue
-
-            if not genre_data:
+            top_genres = self.engine.get_genre_leaderboard(limit=15)
+
+            if not top_genres:
                 for genre_name in list(self.genre_widgets.keys()):
                     if genre_name in self.genre_widgets:
                         self.genre_widgets[genre_name]['frame'].destroy()
@@ -443,9 +414,6 @@ class MusicLearnerGUI(ctk.CTk):
                     if widget in self.genre_items:
                         self.genre_items.remove(widget)
 
-            genre_data.sort(key=lambda x: (x['probability'], x['samples']), reverse=True)
-            top_genres = genre_data[:15]
-
             new_genre_names = {g['name'] for g in top_genres}
             old_genre_names = set(self.genre_widgets.keys())
 
@@ -652,41 +620,12 @@ class MusicLearnerGUI(ctk.CTk):
 
     def fetch_genre_track(self, genre_name):
         try:
-            from genre_taxonomy import GENRE_TAXONOMY
-            parent = GENRE_TAXONOMY.get_parent_genre(genre_name.lower())
-            search_genre = parent if parent else genre_name
-
-            results = self.spotify.client.search(q=f"genre:{search_genre}", type='track', limit=50)
-
-            if not results or 'tracks' not in results or not results['tracks']:
-                return
-
-            tracks = results['tracks']['items']
-            if not tracks:
+            track_data = self.engine.get_genre_track(genre_name, self.session_played_tracks)
+            if not track_data:
                 return
 
-            import random
-            available_tracks = [t for t in tracks if t.get('id') and t['id'] not in self.session_played_tracks]
-            if not available_tracks:
-                available_tracks = [t for t in tracks if t.get('id')]
-
-            if not available_tracks:
-                return
-
-            track = random.choice(available_tracks)
-            if not track.get('id') or not track.get('name'):
-                return
-
-            track_data = {
-                'id': track['id'],
-                'name': track['name'],
-                'artist': ', '.join([artist.get('name', 'Unknown') for artist in track.get('artists', [])]),
-                'album_cover': track['album']['images'][0]['url'] if track.get('album') and track['album'].get('images') else None,
-                'uri': track.get('uri', '')
-            }
-
             self.current_recommended_track = track_data
-            self.session_played_tracks.add(track['id'])
+            self.session_played_tracks.add(track_data['id'])
             self.after(0, lambda: self.update_recommendation_ui(track_data))
 
             if self.auto_play_enabled:
@@ -804,19 +743,11 @@ class MusicLearnerGUI(ctk.CTk):
 
             print(f"Saving rating for {track_id}: {rating} (replacing={replacing}, should_count={should_count})")
 
-            threading.Thread(
-                target=self.process_rating,
-                args=(track_id, rating, False, replacing, should_count),
-                daemon=True
-            ).start()
+            self.process_rating(track_id, rating, False, replacing, should_count)
 
     def undo_rating(self, track_id, rating, was_counted):
         print(f"Undoing rating for {track_id}: {rating} (was_counted={was_counted})")
-        threading.Thread(
-            target=self.process_rating,
-            args=(track_id, rating, True, False, was_counted),
-            daemon=True
-        ).start()
+        self.process_rating(track_id, rating, True, False, was_counted)
 
     def toggle_tracking(self):
         if not self.is_running:
@@ -945,14 +876,14 @@ class MusicLearnerGUI(ctk.CTk):
         self.update_mood_indicator()
 
     def update_mood_indicator(self):
-        if self.engine.session_ratings >= 3:
-            mood_desc = self.get_mood_description()
+        stats = self.engine.get_session_stats()
+        if stats['session_ratings'] >= 3:
+            mood_desc = self.get_mood_description(stats['session_feature_mean'])
             self.mood_indicator.configure(text=f"\u266a {mood_desc}")
         else:
             self.mood_indicator.configure(text="\u2022 Learning...")
 
-    def get_mood_description(self):
-        mean = self.engine.session_feature_mean
+    def get_mood_description(self, mean):
 
         energy = mean[1]
         valence = mean[2]
@@ -972,9 +903,15 @@ class MusicLearnerGUI(ctk.CTk):
             return "Balanced"
 
     def process_rating(self, track_id, rating, is_undo=False, is_replacement=False, should_count=False):
+        print(f"Processing rating for track {track_id}: {rating} (undo={is_undo}, replacement={is_replacement}, should_count={should_count})")
+        future = self.engine.submit_rating(track_id, rating, is_undo=is_undo, should_count=should_count)
+        future.add_done_callback(
+            lambda done: self.after(0, self._finish_rating, done, track_id, rating, is_undo, should_count)
+        )
+
+    def _finish_rating(self, future, track_id, rating, is_undo, should_count):
         try:
-            print(f"Processing rating for track {track_id}: {rating} (undo={is_undo}, replacement={is_replacement}, should_count={should_count})")
-            self.engine.update_with_rating(track_id, rating, is_undo=is_undo, should_count=should_count)
+            future.result()
 
             if should_count and not is_undo:
                 self.counted_tracks.add(track_id)
@@ -987,7 +924,8 @@ class MusicLearnerGUI(ctk.CTk):
             else:
                 self.committed_tracks[track_id] = rating
 
-            print(f"Rating processed! Total: {self.engine.total_ratings}, Session: {self.engine.session_ratings}")
+            stats = self.engine.get_session_stats()
+            print(f"Rating processed! Total: {stats['total_ratings']}, Session: {stats['session_ratings']}")
 
             self.after(100, self._safe_ui_update)
 
@@ -1046,15 +984,17 @@ class MusicLearnerGUI(ctk.CTk):
 
     def update_stats(self):
         try:
-            total_ratings = self.engine.total_ratings
-            session_ratings = self.engine.session_ratings
+            stats = self.engine.get_session_stats()
+            total_ratings = stats['total_ratings']
+            session_ratings = stats['session_ratings']
 
-            self.stats_label.configure(text=f"Tracks: {total_ratings}")
+            feature_note = " (genre only)" if stats.get('feature_mode') == 'fallback' else ""
+            self.stats_label.configure(text=f"Tracks: {total_ratings}{feature_note}")
 
-            if self.engine.consecutive_dislikes >= 2:
+            if stats['consecutive_dislikes'] >= 2:
                 mode = "Exploring"
                 color = "#f97316"
-            elif self.engine.exploration_rate < 0.2:
+            elif stats['exploration_rate'] < 0.2:
                 mode = "Dialed In"
                 color = self.accent_green
             elif session_ratings >= 5:
@@ -1082,26 +1022,7 @@ class MusicLearnerGUI(ctk.CTk):
         )
 
         if result:
-            self.engine.genre_scores.clear()
-            self.engine.artist_scores.clear()
-            self.engine.total_ratings = 0
-            self.engine.session_ratings = 0
-            self.engine.recent_ratings.clear()
-            self.engine.global_feature_mean = np.array([0.5] * 9)
-            self.engine.recent_feature_mean = np.array([0.5] * 9)
-            self.engine.session_feature_mean = np.array([0.5] * 9)
-            self.engine.exploration_rate = 0.4
-            self.engine.consecutive_dislikes = 0
-
-            import os
-            import json
-            data_dir = "data"
-            if os.path.exists(os.path.join(data_dir, "ratings.json")):
-                with open(os.path.join(data_dir, "ratings.json"), 'w') as f:
-                    json.dump({}, f)
-            if os.path.exists(os.path.join(data_dir, "model_state.json")):
-                with open(os.path.join(data_dir, "model_state.json"), 'w') as f:
-                    json.dump({}, f)
+            self.engine.reset_model()
 
             self.rated_tracks.clear()
             self.counted_tracks.clear()
@@ -0,0 +1,147 @@
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from learning_engine import DEFAULT_ENGINE_CONFIG
+from replay_evaluator import ReplayDataset, ReplaySpotifyClient, replay
+from storage import Storage, DEFAULT_PROFILE
+
+SEARCH_SPACE = {
+    'feature_weight': (0.10, 0.45),
+    'genre_weight': (0.15, 0.50),
+    'artist_weight': (0.0, 0.20),
+    'exploration_weight': (0.0, 0.15),
+    'diversity_weight': (0.0, 0.15),
+    'genre_diversity_weight': (0.0, 0.15),
+    'mood_weight': (0.0, 0.10),
+    'distance_scale': (0.5, 4.0),
+    'global_learning_rate': (0.01, 0.15),
+    'recent_learning_rate': (0.05, 0.35),
+    'session_learning_rate': (0.1, 0.6),
+    'dislike_global_factor': (0.0, 1.0),
+    'dislike_recent_factor': (0.0, 1.0),
+    'like_strength': (1.0, 5.0),
+    'dislike_strength': (0.5, 3.0),
+    'artist_strength_factor': (0.1, 0.6)
+}
+
+_worker_dataset: Optional[ReplayDataset] = None
+_worker_spotify: Optional[ReplaySpotifyClient] = None
+_worker_blocks: List[shared_memory.SharedMemory] = []
+
+
+def _attach(name: str, shape: Tuple[int, ...], dtype: str) -> np.ndarray:
+    block = shared_memory.SharedMemory(name=name)
+    _worker_blocks.append(block)
+    array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    array.setflags(write=False)
+    return array
+
+
+def _init_worker(features_spec, ratings_spec, track_ids, genres, artist_ids):
+    global _worker_dataset, _worker_spotify
+    features = _attach(*features_spec)
+    ratings = _attach(*ratings_spec)
+    _worker_dataset = ReplayDataset(track_ids, features, ratings, genres, artist_ids)
+    _worker_spotify = ReplaySpotifyClient(_worker_dataset)
+
+
+def _evaluate(task: Tuple[int, Dict, int]) -> Tuple[int, Dict, Dict]:
+    trial, config, seed = task
+    return trial, config, replay(_worker_dataset, seed=seed, config=config, spotify=_worker_spotify)
+
+
+def _share(array: np.ndarray) -> Tuple[shared_memory.SharedMemory, Tuple]:
+    block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    shared[:] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def sample_configs(trials: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    configs = [dict(DEFAULT_ENGINE_CONFIG)]
+    while len(configs) < trials:
+        config = dict(DEFAULT_ENGINE_CONFIG)
+        for key, (low, high) in SEARCH_SPACE.items():
+            config[key] = round(rng.uniform(low, high), 4)
+        configs.append(config)
+    return configs[:trials]
+
+
+def _rank_key(result: Tuple[int, Dict, Dict]):
+    _, _, metrics = result
+    auc = metrics['auc'] if metrics['auc'] is not None else float('-inf')
+    return auc, metrics['ratings_per_second']
+
+
+def run_sweep(dataset: ReplayDataset, configs: List[Dict], workers: Optional[int] = None,
+              seed: int = 0) -> List[Tuple[int, Dict, Dict]]:
+    features_block, features_spec = _share(np.ascontiguousarray(dataset.features, dtype=np.float64))
+    ratings_block, ratings_spec = _share(np.ascontiguousarray(dataset.ratings))
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(),
+            initializer=_init_worker,
+            initargs=(features_spec, ratings_spec, dataset.track_ids, dataset.genres, dataset.artist_ids)
+        ) as executor:
+            tasks = [(trial, config, seed) for trial, config in enumerate(configs)]
+            results = list(executor.map(_evaluate, tasks))
+    finally:
+        for block in (features_block, ratings_block):
+            block.close()
+            block.unlink()
+
+    results.sort(key=_rank_key, reverse=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep scoring weights by replaying rating history in parallel")
+    parser.add_argument('--data-dir', default='data', help="Data directory holding ratings.json")
+    parser.add_argument('--profile', default=DEFAULT_PROFILE, help="Profile whose ratings are replayed")
+    parser.add_argument('--trials', type=int, default=64, help="Number of configurations to evaluate")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for config sampling and replay")
+    parser.add_argument('--output', help="Where to write the best config (default: the profile's engine_config.json)")
+    parser.add_argument('--top', type=int, default=10, help="Number of ranked configurations to print")
+    args = parser.parse_args()
+
+    storage = Storage(args.data_dir, profile=args.profile)
+    dataset = ReplayDataset.from_storage(storage)
+    if not len(dataset):
+        print("No ratings with stored features to replay")
+        return
+
+    configs = sample_configs(args.trials, seed=args.seed)
+    start = time.perf_counter()
+    results = run_sweep(dataset, configs, workers=args.workers, seed=args.seed)
+    elapsed = time.perf_counter() - start
+
+    print(f"Evaluated {len(configs)} configs over {len(dataset)} ratings in {elapsed:.1f}s "
+          f"({len(configs) * len(dataset) / elapsed:.0f} replayed ratings/s)")
+    for rank, (trial, _, metrics) in enumerate(results[:args.top], 1):
+        auc = f"{metrics['auc']:.4f}" if metrics['auc'] is not None else "n/a"
+        label = "default" if trial == 0 else f"trial {trial}"
+        print(f"#{rank:<3} {label:<10} AUC {auc}  {metrics['ratings_per_second']:.0f} ratings/s")
+
+    _, best_config, best_metrics = results[0]
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(best_config, file, indent=2)
+        output = args.output
+    else:
+        storage.save_engine_config(best_config)
+        output = storage.engine_config_file
+    print(f"Best config (AUC {best_metrics['auc']}) written to {output}")
+
+
+if __name__ == "__main__":
+    main()
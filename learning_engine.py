@@ -1,38 +1,225 @@
 import numpy as np
-from typing import Dict, List, Optional, Tuple
-from collections import defaultdict, deque
+import heapq
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from collections import OrderedDict, defaultdict, deque
+import queue
 import random
+import threading
 from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from genre_taxonomy import GENRE_TAXONOMY
+from arm_history import ArmHistory
+from features import get_primary_genre
+from playlist_selection import mmr_select
+
+DEFAULT_ENGINE_CONFIG = {
+    'feature_weight': 0.28,
+    'genre_weight': 0.35,
+    'artist_weight': 0.08,
+    'exploration_weight': 0.08,
+    'diversity_weight': 0.10,
+    'genre_diversity_weight': 0.07,
+    'mood_weight': 0.04,
+    'fallback_feature_weight': 0.10,
+    'fallback_genre_weight': 0.45,
+    'fallback_artist_weight': 0.10,
+    'fallback_exploration_weight': 0.12,
+    'fallback_diversity_weight': 0.12,
+    'fallback_genre_diversity_weight': 0.11,
+    'distance_scale': 2.0,
+    'global_learning_rate': 0.05,
+    'recent_learning_rate': 0.15,
+    'session_learning_rate': 0.3,
+    'dislike_global_factor': 0.3,
+    'dislike_recent_factor': 0.5,
+    'like_strength': 3.0,
+    'dislike_strength': 1.5,
+    'artist_strength_factor': 0.3,
+    'decay_hours': 24.0,
+    'decay_rate': 0.1
+}
+
+
+def load_engine_config(overrides: Optional[Dict] = None) -> Dict[str, float]:
+    config = dict(DEFAULT_ENGINE_CONFIG)
+    for key, value in (overrides or {}).items():
+        if key not in DEFAULT_ENGINE_CONFIG:
+            print(f"Ignoring unknown engine config key: {key}")
+            continue
+        try:
+            config[key] = float(value)
+        except (TypeError, ValueError):
+            print(f"Ignoring invalid value for engine config key {key}: {value!r}")
+    return config
+
+
+EMPTY_HISTORY_SUMMARY = (0.0, 0.0, 0)
+
+
+def _summarize_history(history: ArmHistory) -> Tuple[float, float, int]:
+    if not len(history):
+        return EMPTY_HISTORY_SUMMARY
+    return history.recent_mean(10), history.recent_mean(5), len(history)
+
+
+def _freeze_arms(arms: Dict[str, Dict], summaries: Dict[str, Tuple[float, float, int]]) -> Dict[str, Tuple]:
+    return {key: (scores['alpha'], scores['beta']) + summaries.get(key, EMPTY_HISTORY_SUMMARY)
+            for key, scores in arms.items()}
+
+
+def _frozen_array(values) -> np.ndarray:
+    array = np.array(values, dtype=float)
+    array.setflags(write=False)
+    return array
+
+
+def _shape_arm_samples(samples: np.ndarray, alphas: np.ndarray, betas: np.ndarray, recent_avgs: np.ndarray,
+                       recent_weight: float, penalty_ratio: float, penalty_factor: float) -> np.ndarray:
+    shaped = samples + recent_weight * recent_avgs
+    shaped = np.where(betas > alphas * penalty_ratio, shaped * penalty_factor, shaped)
+    return np.clip(shaped, 0.0, 1.0)
+
+
+class ScoringModel(NamedTuple):
+    centroids: np.ndarray
+    global_mean: np.ndarray
+    recent_mean: np.ndarray
+    session_mean: np.ndarray
+    preference_weights: Tuple[float, float, float]
+    distance_scale: float
+    genre_scores: np.ndarray
+    artist_scores: np.ndarray
+    genre_diversity: np.ndarray
+    artist_penalty: np.ndarray
+    diversity_bonus: float
+    exploration_rate: float
+    mood_enabled: bool
+    session_bonus: float
+    weights: np.ndarray
+    fallback_weights: np.ndarray
+
+
+def _closeness(features: np.ndarray, center: np.ndarray, scale: float) -> np.ndarray:
+    return np.exp(-np.sqrt(((features - center) ** 2).sum(axis=1)) * scale)
+
+
+def score_feature_block(model: ScoringModel, features: np.ndarray, genre_ids: np.ndarray, artist_idx: np.ndarray,
+                        fallback: np.ndarray, rng: np.random.Generator,
+                        recent: Optional[np.ndarray] = None) -> np.ndarray:
+    features = np.asarray(features, dtype=np.float32)
+    fallback = np.asarray(fallback, dtype=bool)
+    count = len(features)
+    scale = model.distance_scale
+
+    if len(model.centroids):
+        distances = np.full(count, np.inf, dtype=np.float32)
+        for centroid in model.centroids:
+            np.minimum(distances, np.sqrt(((features - centroid) ** 2).sum(axis=1)), out=distances)
+        global_score = np.exp(-distances * scale)
+    else:
+        global_score = _closeness(features, model.global_mean, scale)
+    recent_score = _closeness(features, model.recent_mean, scale)
+    session_score = _closeness(features, model.session_mean, scale)
+
+    global_weight, recent_weight, session_weight = model.preference_weights
+    feature_score = global_weight * global_score + recent_weight * recent_score + session_weight * session_score
+    feature_score = np.where(fallback, 0.5, feature_score)
+
+    mood_bonus = np.where(fallback, 0.0, session_score * 0.15) if model.mood_enabled else np.zeros(count)
+
+    components = np.stack([
+        feature_score,
+        model.genre_scores[genre_ids],
+        model.artist_scores[artist_idx],
+        rng.random(count) * model.exploration_rate,
+        np.where(recent, 0.0, model.diversity_bonus) if recent is not None else np.full(count, model.diversity_bonus),
+        model.genre_diversity[genre_ids],
+        mood_bonus
+    ])
+    weights = np.where(fallback, model.fallback_weights[:, None], model.weights[:, None])
+    scores = (weights * components).sum(axis=0) + rng.uniform(-0.01, 0.01, count) - model.artist_penalty[artist_idx]
+
+    if model.session_bonus:
+        scores += np.where(fallback, 0.0, session_score * model.session_bonus)
+    return scores
+
+
+def score_top_rows(model: ScoringModel, features: np.ndarray, genre_ids: np.ndarray, artist_idx: np.ndarray,
+                   fallback: np.ndarray, offset: int, limit: int, rng: np.random.Generator) -> List[Tuple[float, int]]:
+    scores = score_feature_block(model, features, genre_ids, artist_idx, fallback, rng)
+    if len(scores) > limit:
+        top = np.argpartition(scores, -limit)[-limit:]
+    else:
+        top = np.arange(len(scores))
+    return [(float(scores[i]), offset + int(i)) for i in top]
+
+
+class ModelSnapshot:
+    __slots__ = (
+        'genre_arms', 'artist_arms', 'global_feature_mean', 'recent_feature_mean', 'session_feature_mean',
+        'cluster_centroids', 'cluster_counts', 'recent_ratings', 'exploration_rate', 'total_ratings',
+        'session_ratings', 'consecutive_dislikes'
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ModelSnapshot is immutable")
+
+
+class EngineClosedError(RuntimeError):
+    pass
+
 
 class LearningEngine:
-    def __init__(self, storage, spotify_client):
+    SEARCH_TIMEOUT = 10.0
+    SNAPSHOT_INTERVAL = 50
+
+    def __init__(self, storage, spotify_client, config: Optional[Dict] = None, seed: Optional[int] = None,
+                 catalog=None, catalog_scorer=None):
         self.storage = storage
         self.spotify = spotify_client
+        self.catalog = catalog
+        self.catalog_scorer = catalog_scorer
+        self.rng = np.random.default_rng(seed)
+        self.config = load_engine_config({**self.storage.load_engine_config(), **(config or {})})
 
         state = self.storage.load_model_state()
 
         loaded_genre_scores = state.get('genre_scores', {})
-        self.genre_scores = defaultdict(lambda: {'alpha': 1.0, 'beta': 1.0, 'history': deque(maxlen=50)})
+        self.genre_scores = defaultdict(lambda: {'alpha': 1.0, 'beta': 1.0, 'history': ArmHistory()})
         for genre, scores in loaded_genre_scores.items():
             self.genre_scores[genre] = {
                 'alpha': float(scores.get('alpha', 1.0)),
                 'beta': float(scores.get('beta', 1.0)),
-                'history': deque(scores.get('history', []), maxlen=50)
+                'history': ArmHistory.from_state(scores)
             }
 
         loaded_artist_scores = state.get('artist_scores', {})
-        self.artist_scores = defaultdict(lambda: {'alpha': 1.0, 'beta': 1.0, 'history': deque(maxlen=50)})
+        self.artist_scores = defaultdict(lambda: {'alpha': 1.0, 'beta': 1.0, 'history': ArmHistory()})
         for artist, scores in loaded_artist_scores.items():
             self.artist_scores[artist] = {
                 'alpha': float(scores.get('alpha', 1.0)),
                 'beta': float(scores.get('beta', 1.0)),
-                'history': deque(scores.get('history', []), maxlen=50)
+                'history': ArmHistory.from_state(scores)
             }
 
-        self.feature_clusters = state.get('feature_clusters', [])
+        self._genre_summaries = {genre: _summarize_history(scores['history'])
+                                 for genre, scores in self.genre_scores.items()}
+        self._artist_summaries = {artist: _summarize_history(scores['history'])
+                                  for artist, scores in self.artist_scores.items()}
+
+        self.max_clusters = 6
+        self.cluster_spawn_distance = 0.35
+        self.min_cluster_learning_rate = 0.05
+        self.cluster_centroids, self.cluster_counts, self.cluster_ids = self._load_clusters(state.get('feature_clusters', []))
+        self._next_cluster_id = max(self.cluster_ids, default=-1) + 1
         self.recent_ratings = deque(maxlen=100)
+        self._rating_deltas: "OrderedDict[int, Dict]" = OrderedDict()
+        self._delta_seqs: Dict[str, int] = {}
+        self.max_rating_deltas = 500
         self.session_preferences = deque(maxlen=10)
 
         self.global_feature_mean = np.array(state.get('global_feature_mean', [0.5] * 9))
@@ -51,18 +238,138 @@ class LearningEngine:
         self.last_rating_time = datetime.now()
         self.session_start_time = datetime.now()
 
-    def get_feature_vector(self, track_features: Dict) -> np.ndarray:
-        return np.array([
-            track_features['danceability'],
-            track_features['energy'],
-            track_features['valence'],
-            track_features['tempo'],
-            track_features['acousticness'],
-            track_features['instrumentalness'],
-            track_features['speechiness'],
-            track_features['liveness'],
-            track_features['loudness']
-        ])
+        self._journal_seq = int(state.get('journal_seq', 0))
+        self._snapshot_seq = self._journal_seq
+        self._recover_from_journal()
+
+        self._publish_snapshot()
+        self._updates = queue.Queue()
+        self._closed = False
+        self._submit_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run_updates, name="learning-engine-updates", daemon=True)
+        self._worker.start()
+
+    def _publish_snapshot(self):
+        self.snapshot = ModelSnapshot(
+            genre_arms=_freeze_arms(self.genre_scores, self._genre_summaries),
+            artist_arms=_freeze_arms(self.artist_scores, self._artist_summaries),
+            global_feature_mean=_frozen_array(self.global_feature_mean),
+            recent_feature_mean=_frozen_array(self.recent_feature_mean),
+            session_feature_mean=_frozen_array(self.session_feature_mean),
+            cluster_centroids=_frozen_array(self.cluster_centroids).reshape(-1, 9),
+            cluster_counts=_frozen_array(self.cluster_counts),
+            recent_ratings=tuple(self.recent_ratings),
+            exploration_rate=self.exploration_rate,
+            total_ratings=self.total_ratings,
+            session_ratings=self.session_ratings,
+            consecutive_dislikes=self.consecutive_dislikes
+        )
+
+    def _run_updates(self):
+        while True:
+            task = self._updates.get()
+            if task is None:
+                return
+            self._run_task(*task)
+
+    def _run_task(self, function, args: Tuple, future: Future):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(function(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def _submit(self, function, *args) -> Future:
+        future = Future()
+        if threading.current_thread() is self._worker:
+            self._run_task(function, args, future)
+            return future
+        with self._submit_lock:
+            if self._closed:
+                raise EngineClosedError("LearningEngine is closed")
+            self._updates.put((function, args, future))
+        return future
+
+    def close(self):
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._updates.put((self._snapshot_if_pending, (), Future()))
+            self._updates.put(None)
+        self._worker.join(timeout=5)
+
+    def _load_clusters(self, clusters: List[Dict]) -> Tuple[np.ndarray, np.ndarray, List[int]]:
+        centroids = []
+        counts = []
+        ids = []
+        for cluster in clusters[:self.max_clusters]:
+            try:
+                centroid = [float(value) for value in cluster['centroid']]
+                if len(centroid) != 9:
+                    continue
+                cluster_id = int(cluster.get('id', len(ids)))
+                if cluster_id in ids:
+                    cluster_id = max(ids) + 1
+                centroids.append(centroid)
+                counts.append(float(cluster.get('count', 1.0)))
+                ids.append(cluster_id)
+            except (KeyError, TypeError, ValueError):
+                continue
+        return np.array(centroids, dtype=float).reshape(-1, 9), np.array(counts, dtype=float), ids
+
+    def _serialize_clusters(self) -> List[Dict]:
+        return [{'id': cluster_id, 'centroid': centroid.tolist(), 'count': float(count)}
+                for cluster_id, centroid, count in zip(self.cluster_ids, self.cluster_centroids, self.cluster_counts)]
+
+    def _spawn_cluster(self, feature_vector: np.ndarray) -> Dict:
+        cluster_id = self._next_cluster_id
+        self._next_cluster_id += 1
+        self.cluster_centroids = np.vstack([self.cluster_centroids.reshape(-1, 9), feature_vector.reshape(1, 9)]).astype(float)
+        self.cluster_counts = np.append(self.cluster_counts, 1.0)
+        self.cluster_ids.append(cluster_id)
+        return {'op': 'spawn', 'cluster_id': cluster_id}
+
+    def _nearest_cluster(self, centroids: np.ndarray, feature_vector: np.ndarray) -> Tuple[int, float]:
+        distances = np.sqrt(((centroids - feature_vector) ** 2).sum(axis=1))
+        nearest = int(np.argmin(distances))
+        return nearest, float(distances[nearest])
+
+    def update_clusters(self, feature_vector: np.ndarray) -> Dict:
+        if len(self.cluster_counts) == 0:
+            return self._spawn_cluster(feature_vector)
+
+        nearest, distance = self._nearest_cluster(self.cluster_centroids, feature_vector)
+
+        if distance > self.cluster_spawn_distance and len(self.cluster_counts) < self.max_clusters:
+            return self._spawn_cluster(feature_vector)
+
+        cluster_update = {
+            'op': 'update',
+            'cluster_id': self.cluster_ids[nearest],
+            'centroid': self.cluster_centroids[nearest].tolist(),
+            'count': float(self.cluster_counts[nearest])
+        }
+        self.cluster_counts[nearest] += 1.0
+        learning_rate = max(1.0 / self.cluster_counts[nearest], self.min_cluster_learning_rate)
+        self.cluster_centroids[nearest] += learning_rate * (feature_vector - self.cluster_centroids[nearest])
+        return cluster_update
+
+    def revert_cluster_update(self, cluster_update: Dict):
+        if cluster_update['cluster_id'] not in self.cluster_ids:
+            return
+        index = self.cluster_ids.index(cluster_update['cluster_id'])
+
+        if cluster_update['op'] == 'spawn':
+            self.cluster_centroids = np.delete(self.cluster_centroids, index, axis=0)
+            self.cluster_counts = np.delete(self.cluster_counts, index)
+            del self.cluster_ids[index]
+            self._next_cluster_id = cluster_update['cluster_id']
+            return
+
+        self.cluster_centroids[index] = cluster_update['centroid']
+        self.cluster_counts[index] = cluster_update['count']
 
     def detect_session_shift(self) -> bool:
         time_since_last_rating = (datetime.now() - self.last_rating_time).total_seconds()
@@ -87,294 +394,207 @@ class LearningEngine:
         self.session_start_time = datetime.now()
         self.exploration_rate = min(0.5, self.exploration_rate + 0.1)
 
-    def apply_time_decay(self):
+    def _time_decay_retention(self) -> float:
         time_elapsed = (datetime.now() - self.last_rating_time).total_seconds() / 3600
-        decay = np.exp(-time_elapsed / 24)
-
-        for genre in self.genre_scores:
-            self.genre_scores[genre]['alpha'] *= (1 - (1 - decay) * 0.1)
-            self.genre_scores[genre]['beta'] *= (1 - (1 - decay) * 0.1)
-            self.genre_scores[genre]['alpha'] = max(1.0, self.genre_scores[genre]['alpha'])
-            self.genre_scores[genre]['beta'] = max(1.0, self.genre_scores[genre]['beta'])
-
-        for artist in self.artist_scores:
-            self.artist_scores[artist]['alpha'] *= (1 - (1 - decay) * 0.1)
-            self.artist_scores[artist]['beta'] *= (1 - (1 - decay) * 0.1)
-            self.artist_scores[artist]['alpha'] = max(1.0, self.artist_scores[artist]['alpha'])
-            self.artist_scores[artist]['beta'] = max(1.0, self.artist_scores[artist]['beta'])
-
-    def get_recent_preference_weights(self) -> Tuple[float, float, float]:
-        if self.session_ratings < 3:
+        decay = np.exp(-time_elapsed / self.config['decay_hours'])
+        return 1 - (1 - decay) * self.config['decay_rate']
+
+    def _decay_arms(self, retention: float) -> List[List]:
+        clamped = []
+        for kind, arms in (('genre', self.genre_scores), ('artist', self.artist_scores)):
+            for key, score_data in arms.items():
+                for field in ('alpha', 'beta'):
+                    previous = score_data[field]
+                    decayed = previous * retention
+                    if decayed <= 1.0 and previous != 1.0:
+                        clamped.append([kind, key, field, previous])
+                    score_data[field] = max(1.0, decayed)
+        return clamped
+
+    def _undo_decay(self, decay: Dict):
+        retention = decay['retention']
+        if retention != 1.0:
+            for arms in (self.genre_scores, self.artist_scores):
+                for score_data in arms.values():
+                    for field in ('alpha', 'beta'):
+                        if score_data[field] != 1.0:
+                            score_data[field] /= retention
+        arms = {'genre': self.genre_scores, 'artist': self.artist_scores}
+        for kind, key, field, previous in decay['clamped']:
+            arms[kind][key][field] = previous
+
+    def apply_time_decay(self):
+        retention = self._time_decay_retention()
+        self._decay_arms(retention)
+        return retention
+
+    def get_recent_preference_weights(self, session_ratings: int) -> Tuple[float, float, float]:
+        if session_ratings < 3:
             return 0.5, 0.4, 0.1
 
-        if self.session_ratings >= 10:
+        if session_ratings >= 10:
             return 0.3, 0.3, 0.4
 
         return 0.4, 0.4, 0.2
 
-    def thompson_sample_genre(self, genres: List[str]) -> float:
-        if not genres:
-            return 0.5
-
-        primary_genre = self._get_primary_genre(genres)
-        if not primary_genre:
-            return 0.5
-
-        score_data = self.genre_scores[primary_genre]
-        alpha = score_data['alpha']
-        beta = score_data['beta']
-
-        mean_estimate = alpha / (alpha + beta)
-
-        recent_bonus = 0
-        if score_data['history']:
-            recent_ratings = list(score_data['history'])[-10:]
-            recent_avg = sum(recent_ratings) / len(recent_ratings)
-            recent_bonus = recent_avg * 0.5
-
-        total_samples = alpha + beta - 2
-        confidence = min(1.0, total_samples / 20.0)
-
-        sample = (confidence * mean_estimate + (1 - confidence) * 0.5) + recent_bonus
-
-        if beta > alpha * 2.5:
-            sample *= 0.4
-
-        return min(1.0, max(0.0, sample))
-
-    def thompson_sample_artist(self, artist_id: str) -> float:
-        score_data = self.artist_scores[artist_id]
-        alpha = score_data['alpha']
-        beta = score_data['beta']
-
-        mean_estimate = alpha / (alpha + beta)
+    def submit_rating(self, track_id: str, rating: int, is_undo: bool = False, should_count: bool = True) -> Future:
+        return self._submit(self._apply_rating, track_id, rating, is_undo, should_count)
 
-        recent_bonus = 0
-        if score_data['history']:
-            recent_ratings = list(score_data['history'])[-10:]
-            recent_avg = sum(recent_ratings) / len(recent_ratings)
-            recent_bonus = recent_avg * 0.4
-
-        total_samples = alpha + beta - 2
-        confidence = min(1.0, total_samples / 15.0)
-
-        sample = (confidence * mean_estimate + (1 - confidence) * 0.5) + recent_bonus
-
-        if beta > alpha * 2:
-            sample *= 0.5
-
-        return min(1.0, max(0.0, sample))
-
-    def calculate_track_score(self, track_features: Dict) -> float:
-        try:
-            if not track_features:
-                return 0.5
-
-            feature_vector = self.get_feature_vector(track_features)
-
-            is_fallback = bool(track_features.get('fallback'))
-
-            if not is_fallback:
-                try:
-                    global_weight, recent_weight, session_weight = self.get_recent_preference_weights()
-
-                    global_distance = np.linalg.norm(feature_vector - self.global_feature_mean)
-                    global_score = np.exp(-global_distance * 2)
-
-                    recent_distance = np.linalg.norm(feature_vector - self.recent_feature_mean)
-                    recent_score = np.exp(-recent_distance * 2)
-
-                    session_distance = np.linalg.norm(feature_vector - self.session_feature_mean)
-                    session_score = np.exp(-session_distance * 2)
-
-                    feature_score = (global_weight * global_score +
-                                    recent_weight * recent_score +
-                                    session_weight * session_score)
-                except Exception as feat_err:
-                    print(f"Error calculating feature score: {feat_err}")
-                    feature_score = 0.5
-            else:
-                feature_score = 0.5
-
-            genre_score = self.thompson_sample_genre(track_features.get('genres', []))
-            artist_score = self.thompson_sample_artist(track_features['artist_id']) if track_features.get('artist_id') else 0.5
-
-            diversity_bonus = 0
-            artist_penalty = 0
-            genre_diversity_bonus = 0
-
-            if len(self.recent_ratings) >= 5:
-                recent_track_ids = [r['track_id'] for r in list(self.recent_ratings)[-5:]]
-                if track_features['id'] not in recent_track_ids:
-                    diversity_bonus = 0.1
-
-                if track_features.get('artist_id'):
-                    recent_10_artist_count = sum(1 for r in list(self.recent_ratings)[-10:]
-                                                 if r.get('artist_id') == track_features['artist_id'])
-                    recent_5_artist_count = sum(1 for r in list(self.recent_ratings)[-5:]
-                                                if r.get('artist_id') == track_features['artist_id'])
-
-                    if recent_5_artist_count > 0:
-                        artist_penalty = 0.5 * (recent_5_artist_count / 5.0)
-                    elif recent_10_artist_count > 1:
-                        artist_penalty = 0.3 * (recent_10_artist_count / 10.0)
-
-                current_genre = self._get_primary_genre(track_features.get('genres', []))
-                if current_genre:
-                    recent_genres = [r.get('primary_genre') for r in list(self.recent_ratings)[-5:]
-                                   if r.get('primary_genre')]
-                    if current_genre not in recent_genres and len(recent_genres) >= 2:
-                        genre_diversity_bonus = 0.15
-
-            exploration_bonus = random.random() * self.exploration_rate
-
-            mood_consistency_bonus = 0
-            if not is_fallback and self.session_ratings >= 3:
-                session_distance = np.linalg.norm(feature_vector - self.session_feature_mean)
-                session_score = np.exp(-session_distance * 2)
-                mood_consistency_bonus = session_score * 0.15
-
-            jitter = random.uniform(-0.01, 0.01)
-
-            if is_fallback:
-                final_score = (0.10 * feature_score +
-                              0.45 * genre_score +
-                              0.10 * artist_score +
-                              0.12 * exploration_bonus +
-                              0.12 * diversity_bonus +
-                              0.11 * genre_diversity_bonus +
-                              jitter) - artist_penalty
-            else:
-                final_score = (0.28 * feature_score +
-                              0.35 * genre_score +
-                              0.08 * artist_score +
-                              0.08 * exploration_bonus +
-                              0.10 * diversity_bonus +
-                              0.07 * genre_diversity_bonus +
-                              0.04 * mood_consistency_bonus +
-                              jitter) - artist_penalty
-
-            return final_score
+    def update_with_rating(self, track_id: str, rating: int, is_undo: bool = False, should_count: bool = True):
+        return self.submit_rating(track_id, rating, is_undo, should_count).result()
 
-        except Exception as e:
-            print(f"Error in calculate_track_score: {e}")
-            return 0.5
+    def _apply_rating(self, track_id: str, rating: int, is_undo: bool, should_count: bool):
+        if is_undo:
+            self._revert_rating(track_id, should_count)
+            return
 
-    def update_with_rating(self, track_id: str, rating: int, is_undo: bool = False, should_count: bool = True):
         if self.detect_session_shift():
             self.reset_session()
+            self._publish_snapshot()
 
-        track_features = self.spotify.get_track_features(track_id)
-        if not track_features:
+        store = self.spotify.feature_store
+        row = self.spotify.get_feature_row(track_id)
+        if row is None:
             print(f"WARNING: Could not get track features for {track_id}")
             return
 
-        if not track_features.get('genres') and track_features.get('artist_id'):
+        genres = store.track_genres(row)
+        artist_id = store.artist_id(row)
+        if not genres and artist_id:
             try:
-                genres = self.spotify.fetch_genres_for_artist(track_features['artist_id'])
+                genres = self.spotify.fetch_genres_for_artist(artist_id)
                 if genres:
-                    track_features['genres'] = genres
-                    self.spotify._feature_cache[track_id] = track_features
+                    store.set_genres(row, genres)
                     print(f"Fetched {len(genres)} genres from artist cache: {genres[:3]}")
             except Exception as e:
                 print(f"Could not fetch genres for artist: {e}")
 
-        if not track_features.get('genres'):
-            fallback_genre = self._infer_genre_from_features(track_features)
+        if not genres:
+            fallback_genre = self._infer_genre_from_features(store.track_features(row))
             if fallback_genre:
-                track_features['genres'] = [fallback_genre]
+                genres = [fallback_genre]
                 print(f"Using inferred genre: {fallback_genre}")
 
-        primary_genre = self._get_primary_genre(track_features.get('genres', []))
+        primary_genre = self._get_primary_genre(genres)
 
         print(f"Updating with rating {rating} for track {track_id}")
-        print(f"Track genres: {track_features.get('genres', [])}")
+        print(f"Track genres: {genres}")
         print(f"Primary genre: {primary_genre}")
 
-        feature_vector = self.get_feature_vector(track_features)
-        reward = 1.0 if rating > 0 else 0.0
+        entry = {
+            'op': 'rate',
+            'track_id': track_id,
+            'rating': rating,
+            'features': store.features[row].tolist(),
+            'fallback': store.is_fallback(row),
+            'primary_genre': primary_genre,
+            'artist_id': artist_id,
+            'retention': float(self._time_decay_retention()),
+            'counted': should_count,
+            'session_id': self.session_start_time.isoformat(),
+            'timestamp': datetime.now().isoformat(),
+            'exploration_rate': self.exploration_rate,
+            'consecutive_dislikes': self.consecutive_dislikes
+        }
+        self._journal(entry)
+        rating_data = self._apply_update(entry)
 
-        strength_multiplier = -1.0 if is_undo else 1.0
+        self._publish_snapshot()
+
+        self.storage.save_rating(track_id, rating, rating_data)
+        self._snapshot_if_due()
+
+    def _apply_update(self, entry: Dict) -> Dict:
+        track_id = entry['track_id']
+        rating = entry['rating']
+        should_count = entry['counted']
+        feature_vector = np.array(entry['features'])
+
+        delta = {
+            'seq': entry['seq'],
+            'track_id': track_id,
+            'rating': rating,
+            'entry': entry,
+            'previous': {
+                'global_feature_mean': self.global_feature_mean.tolist(),
+                'recent_feature_mean': self.recent_feature_mean.tolist(),
+                'session_feature_mean': self.session_feature_mean.tolist(),
+                'exploration_rate': self.exploration_rate,
+                'consecutive_dislikes': self.consecutive_dislikes,
+                'total_ratings': self.total_ratings,
+                'session_ratings': self.session_ratings,
+                'last_rating_time': self.last_rating_time.isoformat()
+            },
+            'decay': {'retention': entry['retention'], 'clamped': self._decay_arms(entry['retention'])},
+            'recent_removed': None,
+            'recent_evicted': None,
+            'cluster_update': None
+        }
+        self.last_rating_time = datetime.fromisoformat(entry['timestamp'])
 
         rating_data = {
             'track_id': track_id,
             'rating': rating,
-            'features': feature_vector.tolist(),
-            'timestamp': datetime.now().isoformat(),
-            'session_id': self.session_start_time.isoformat(),
-            'primary_genre': primary_genre,
-            'artist_id': track_features.get('artist_id')
+            'features': entry['features'],
+            'timestamp': entry['timestamp'],
+            'session_id': entry['session_id'],
+            'primary_genre': entry['primary_genre'],
+            'artist_id': entry['artist_id']
         }
 
-        self.recent_ratings = deque([r for r in self.recent_ratings if r['track_id'] != track_id], maxlen=100)
-        if not is_undo:
-            self.recent_ratings.append(rating_data)
+        if track_id in self._delta_seqs:
+            for index, previous_rating in enumerate(self.recent_ratings):
+                if previous_rating['track_id'] == track_id:
+                    delta['recent_removed'] = [index, previous_rating]
+                    del self.recent_ratings[index]
+                    break
+        if len(self.recent_ratings) == self.recent_ratings.maxlen:
+            delta['recent_evicted'] = self.recent_ratings[0]
+        self.recent_ratings.append(rating_data)
 
-        global_learning_rate = 0.05
-        recent_learning_rate = 0.15
-        session_learning_rate = 0.3
+        global_learning_rate = self.config['global_learning_rate']
+        recent_learning_rate = self.config['recent_learning_rate']
+        session_learning_rate = self.config['session_learning_rate']
 
         if rating > 0:
-            error = feature_vector - self.global_feature_mean
-            self.global_feature_mean += global_learning_rate * error
-
-            error = feature_vector - self.recent_feature_mean
-            self.recent_feature_mean += recent_learning_rate * error
+            global_step = global_learning_rate * (feature_vector - self.global_feature_mean)
+            recent_step = recent_learning_rate * (feature_vector - self.recent_feature_mean)
 
             if self.session_ratings > 0:
-                error = feature_vector - self.session_feature_mean
-                self.session_feature_mean += session_learning_rate * error
+                session_step = session_learning_rate * (feature_vector - self.session_feature_mean)
             else:
-                self.session_feature_mean = feature_vector
+                session_step = feature_vector - self.session_feature_mean
+
+            if not entry['fallback']:
+                delta['cluster_update'] = self.update_clusters(feature_vector)
 
             self.consecutive_dislikes = 0
         else:
-            anti_error = self.global_feature_mean - feature_vector
-            self.global_feature_mean += global_learning_rate * 0.3 * anti_error
-
-            anti_error = self.recent_feature_mean - feature_vector
-            self.recent_feature_mean += recent_learning_rate * 0.5 * anti_error
+            global_step = global_learning_rate * self.config['dislike_global_factor'] * (self.global_feature_mean - feature_vector)
+            recent_step = recent_learning_rate * self.config['dislike_recent_factor'] * (self.recent_feature_mean - feature_vector)
+            session_step = np.zeros(9)
 
             self.consecutive_dislikes += 1
 
-        base_strength = 3.0 if reward > 0 else 1.5
-        strength = base_strength * strength_multiplier
-        artist_strength = strength * 0.3
-
-        if primary_genre:
-            if rating > 0:
-                self.genre_scores[primary_genre]['alpha'] += strength
-                if not is_undo:
-                    self.genre_scores[primary_genre]['history'].append(1.0)
-                elif self.genre_scores[primary_genre]['history']:
-                    self.genre_scores[primary_genre]['history'].pop()
-            else:
-                self.genre_scores[primary_genre]['beta'] += strength
-                if not is_undo:
-                    self.genre_scores[primary_genre]['history'].append(0.0)
-                elif self.genre_scores[primary_genre]['history']:
-                    self.genre_scores[primary_genre]['history'].pop()
-
-        if track_features.get('artist_id'):
-            artist_id = track_features['artist_id']
-            if rating > 0:
-                self.artist_scores[artist_id]['alpha'] += artist_strength
-                if not is_undo:
-                    self.artist_scores[artist_id]['history'].append(1.0)
-                elif self.artist_scores[artist_id]['history']:
-                    self.artist_scores[artist_id]['history'].pop()
-            else:
-                self.artist_scores[artist_id]['beta'] += artist_strength
-                if not is_undo:
-                    self.artist_scores[artist_id]['history'].append(0.0)
-                elif self.artist_scores[artist_id]['history']:
-                    self.artist_scores[artist_id]['history'].pop()
-
-        if is_undo:
-            if should_count:
-                self.total_ratings = max(0, self.total_ratings - 1)
-                self.session_ratings = max(0, self.session_ratings - 1)
-        elif should_count:
+        self.global_feature_mean = self.global_feature_mean + global_step
+        self.recent_feature_mean = self.recent_feature_mean + recent_step
+        self.session_feature_mean = self.session_feature_mean + session_step
+
+        field = 'alpha' if rating > 0 else 'beta'
+        outcome = 1.0 if rating > 0 else 0.0
+        strength = self.config['like_strength'] if rating > 0 else self.config['dislike_strength']
+        primary_genre = entry['primary_genre']
+        artist_id = entry['artist_id']
+
+        delta['genre'] = self._bump_arm(
+            self.genre_scores, self._genre_summaries, primary_genre, field, strength, outcome
+        ) if primary_genre else None
+        delta['artist'] = self._bump_arm(
+            self.artist_scores, self._artist_summaries, artist_id, field,
+            strength * self.config['artist_strength_factor'], outcome
+        ) if artist_id else None
+
+        if should_count:
             self.total_ratings += 1
             self.session_ratings += 1
 
@@ -386,12 +606,154 @@ class LearningEngine:
         else:
             self.exploration_rate = max(base_exploration, self.exploration_rate * 0.98)
 
-        self.last_rating_time = datetime.now()
+        self._rating_deltas[delta['seq']] = delta
+        self._delta_seqs[track_id] = delta['seq']
+        while len(self._rating_deltas) > self.max_rating_deltas:
+            _, dropped = self._rating_deltas.popitem(last=False)
+            if self._delta_seqs.get(dropped['track_id']) == dropped['seq']:
+                del self._delta_seqs[dropped['track_id']]
+
+        return rating_data
+
+    def _bump_arm(self, arms: Dict, summaries: Dict, key: str, field: str, amount: float, outcome: float) -> Dict:
+        created = key not in arms
+        score_data = arms[key]
+        history = score_data['history']
+        evicted = history.oldest() if len(history) == history.maxlen else None
+        previous = score_data[field]
+        score_data[field] += amount
+        history.append(outcome)
+        summaries[key] = _summarize_history(history)
+        return {'key': key, 'field': field, 'previous': previous, 'created': created, 'evicted': evicted}
+
+    def _revert_arm(self, arms: Dict, summaries: Dict, arm_delta: Dict):
+        key = arm_delta['key']
+        if arm_delta['created']:
+            arms.pop(key, None)
+            summaries.pop(key, None)
+            return
+        score_data = arms.get(key)
+        if score_data is None:
+            return
+        score_data[arm_delta['field']] = arm_delta['previous']
+        history = score_data['history']
+        if history:
+            history.pop()
+        if arm_delta['evicted'] is not None:
+            history.appendleft(arm_delta['evicted'])
+        summaries[key] = _summarize_history(history)
+
+    def _revert_rating(self, track_id: str, should_count: bool):
+        entry = {'op': 'undo', 'track_id': track_id, 'counted': should_count}
+        seq = self._delta_seqs.get(track_id)
+        if seq is not None:
+            seqs = list(self._rating_deltas)
+            entry['deltas'] = [self._rating_deltas[key] for key in seqs[seqs.index(seq):]]
+        self._journal(entry)
+        self._undo_update(entry)
+
+        self._publish_snapshot()
+
+        self.storage.delete_rating(track_id)
+        self._snapshot_if_due()
+
+    def _undo_update(self, entry: Dict):
+        track_id = entry['track_id']
+        deltas = entry.get('deltas')
+        if not deltas:
+            print(f"No recorded update for {track_id}; removing its stored rating only")
+            if entry['counted']:
+                self.total_ratings = max(0, self.total_ratings - 1)
+                self.session_ratings = max(0, self.session_ratings - 1)
+            return
 
-        self.apply_time_decay()
+        print(f"Reverting rating {deltas[0]['rating']} for track {track_id}")
+        session = (self.session_start_time, self.session_feature_mean, self.session_ratings, self.consecutive_dislikes)
+        for delta in reversed(deltas):
+            self._rating_deltas.pop(delta['seq'], None)
+            if self._delta_seqs.get(delta['track_id']) == delta['seq']:
+                del self._delta_seqs[delta['track_id']]
+            self._invert_delta(delta)
+        for delta in deltas[1:]:
+            self._reapply_update(delta['entry'])
+
+        if self.session_start_time != session[0]:
+            self.session_start_time, self.session_feature_mean, self.session_ratings, self.consecutive_dislikes = session
+
+    def _reapply_update(self, entry: Dict):
+        if entry['session_id'] != self.session_start_time.isoformat():
+            self.reset_session()
+            self.session_start_time = datetime.fromisoformat(entry['session_id'])
+        self._apply_update(entry)
 
-        self.storage.save_rating(track_id, rating, rating_data)
-        self.save_state()
+    def _journal(self, entry: Dict):
+        self._journal_seq += 1
+        entry['seq'] = self._journal_seq
+        self.storage.append_model_journal(entry)
+
+    def _recover_from_journal(self):
+        entries = self.storage.load_model_journal(self._journal_seq)
+        if not entries:
+            return
+
+        recovered = 0
+        for entry in entries:
+            try:
+                if entry['op'] == 'rate':
+                    self.session_start_time = datetime.fromisoformat(entry['session_id'])
+                    self.exploration_rate = entry['exploration_rate']
+                    self.consecutive_dislikes = entry['consecutive_dislikes']
+                    self._apply_update(entry)
+                elif entry['op'] == 'undo':
+                    self._undo_update(entry)
+            except Exception as e:
+                print(f"Stopping journal recovery at entry {entry.get('seq')}: {e}")
+                break
+            self._journal_seq = entry['seq']
+            recovered += 1
+
+        self.session_feature_mean = np.array([0.5] * 9)
+        self.session_ratings = 0
+        self.consecutive_dislikes = 0
+        self.last_rating_time = datetime.now()
+        self.session_start_time = datetime.now()
+        print(f"Recovered {recovered} model updates from the journal")
+
+    def _snapshot_if_due(self):
+        if self._journal_seq - self._snapshot_seq >= self.SNAPSHOT_INTERVAL:
+            self._save_state()
+
+    def _snapshot_if_pending(self):
+        if self._journal_seq > self._snapshot_seq:
+            self._save_state()
+
+    def _invert_delta(self, delta: Dict):
+        previous = delta['previous']
+        self.global_feature_mean = np.array(previous['global_feature_mean'])
+        self.recent_feature_mean = np.array(previous['recent_feature_mean'])
+        self.session_feature_mean = np.array(previous['session_feature_mean'])
+        self.exploration_rate = previous['exploration_rate']
+        self.consecutive_dislikes = previous['consecutive_dislikes']
+        self.total_ratings = previous['total_ratings']
+        self.session_ratings = previous['session_ratings']
+        self.last_rating_time = datetime.fromisoformat(previous['last_rating_time'])
+        self.session_start_time = datetime.fromisoformat(delta['entry']['session_id'])
+
+        if delta['cluster_update'] is not None:
+            self.revert_cluster_update(delta['cluster_update'])
+        if delta['artist'] is not None:
+            self._revert_arm(self.artist_scores, self._artist_summaries, delta['artist'])
+        if delta['genre'] is not None:
+            self._revert_arm(self.genre_scores, self._genre_summaries, delta['genre'])
+        self._undo_decay(delta['decay'])
+
+        if self.recent_ratings and self.recent_ratings[-1]['track_id'] == delta['track_id']:
+            self.recent_ratings.pop()
+        if delta['recent_evicted'] is not None:
+            self.recent_ratings.appendleft(delta['recent_evicted'])
+        if delta['recent_removed'] is not None:
+            index, rating_data = delta['recent_removed']
+            self.recent_ratings.insert(index, rating_data)
 
     def _infer_genre_from_features(self, track_features: Dict) -> Optional[str]:
         try:
@@ -432,28 +794,20 @@ class LearningEngine:
             return None
 
     def _get_primary_genre(self, genres: List[str]) -> Optional[str]:
-        if not genres:
-            return None
-
-        for genre in genres:
-            if GENRE_TAXONOMY.is_cultural_variant(genre):
-                return genre
-
-        for genre in genres:
-            parent = GENRE_TAXONOMY.get_parent_genre(genre)
-            if parent:
-                return genre
-
-        return genres[0] if genres else None
+        return get_primary_genre(genres)
 
     def get_recommended_track(self, session_played_tracks: set) -> Optional[Dict]:
+        if self.catalog is not None and len(self.catalog):
+            return self.recommend_from_catalog(session_played_tracks)
+
         try:
             liked_genres = self._get_liked_genres()
 
             genre_search_probability = 0.5
 
-            if len(self.recent_ratings) >= 5:
-                recent_likes = sum(1 for r in list(self.recent_ratings)[-5:] if r['rating'] > 0)
+            recent_ratings = self.snapshot.recent_ratings
+            if len(recent_ratings) >= 5:
+                recent_likes = sum(1 for r in recent_ratings[-5:] if r['rating'] > 0)
                 like_rate = recent_likes / 5.0
 
                 if like_rate >= 0.8:
@@ -485,8 +839,8 @@ class LearningEngine:
 
             candidates = [t for t in candidates if t.get('id') and t['id'] not in session_played_tracks]
 
-            if len(self.recent_ratings) >= 10:
-                recent_track_ids = set([r['track_id'] for r in list(self.recent_ratings)[-10:]])
+            if len(recent_ratings) >= 10:
+                recent_track_ids = set([r['track_id'] for r in recent_ratings[-10:]])
                 candidates = [t for t in candidates if t['id'] not in recent_track_ids]
 
             if not candidates:
@@ -503,13 +857,8 @@ class LearningEngine:
 
     def _get_liked_genres(self) -> List[str]:
         liked = []
-        for genre, scores in self.genre_scores.items():
-            alpha = scores['alpha']
-            beta = scores['beta']
-            history = scores.get('history', [])
-
-            if len(history) >= 3:
-                recent_avg = sum(list(history)[-5:]) / min(5, len(history))
+        for genre, (alpha, beta, _, recent_avg, history_length) in self.snapshot.genre_arms.items():
+            if history_length >= 3:
                 overall_ratio = alpha / (beta + 1)
 
                 if overall_ratio > 1.3 and alpha > 2.5:
@@ -523,74 +872,51 @@ class LearningEngine:
         all_candidates = []
         seen_track_ids = set()
 
-        for genre in genres[:4]:
-            try:
-                parent = GENRE_TAXONOMY.get_parent_genre(genre)
-                search_genre = parent if parent else genre
-
-                if len(all_candidates) < 10:
-                    results = self.spotify.client.search(q=f"genre:{search_genre}", type='track', limit=20)
-                else:
-                    year = random.choice(['2024', '2023', '2022', '2021', '2020', '2019'])
-                    results = self.spotify.client.search(
-                        q=f"genre:{search_genre} year:{year}",
-                        type='track',
-                        limit=15
-                    )
-
-                if not results or 'tracks' not in results:
+        queries = []
+        for i, genre in enumerate(genres[:4]):
+            parent = GENRE_TAXONOMY.get_parent_genre(genre)
+            search_genre = parent if parent else genre
+            if i == 0:
+                queries.append((f"genre:{search_genre}", 20))
+            else:
+                year = random.choice(['2024', '2023', '2022', '2021', '2020', '2019'])
+                queries.append((f"genre:{search_genre} year:{year}", 15))
+
+        limits = {}
+        for query, limit in queries:
+            limits[query] = max(limits.get(query, 0), limit)
+        results = self.spotify.search_many(list(limits), limits=limits, timeout=self.SEARCH_TIMEOUT,
+                                           random_offset=True)
+        for query, limit in queries:
+            for track in results.get(query, [])[:limit]:
+                track_id = track.get('id')
+                if not track_id or track_id in session_played_tracks or track_id in seen_track_ids:
                     continue
 
-                tracks = results['tracks']['items']
-
-                for track in tracks:
-                    track_id = track.get('id')
-                    if not track_id or track_id in session_played_tracks or track_id in seen_track_ids:
-                        continue
-
-                    seen_track_ids.add(track_id)
-                    track_data = {
-                        'id': track_id,
-                        'name': track.get('name', 'Unknown'),
-                        'artist': ', '.join([artist.get('name', 'Unknown') for artist in track.get('artists', [])]),
-                        'album_cover': track['album']['images'][0]['url'] if track.get('album') and track['album'].get('images') else None,
-                        'uri': track.get('uri', '')
-                    }
-                    all_candidates.append(track_data)
+                seen_track_ids.add(track_id)
+                all_candidates.append(self.spotify.format_track(track))
 
-                    if len(all_candidates) >= 20:
-                        return all_candidates
-
-            except Exception as e:
-                print(f"Error searching genre {genre}: {e}")
-                continue
+                if len(all_candidates) >= 20:
+                    return all_candidates
 
         return all_candidates
 
     def _select_best_candidate(self, candidates: List[Dict], session_played_tracks: set) -> Optional[Dict]:
-        track_ids = [track['id'] for track in candidates]
-        features_dict = self.spotify.get_batch_track_features(track_ids)
+        rows = self.spotify.get_feature_rows([track['id'] for track in candidates])
+        scorable = [(track, rows[track['id']]) for track in candidates
+                    if track['id'] not in session_played_tracks and track['id'] in rows]
 
         scored_tracks = []
-        for track in candidates:
-            if track['id'] in session_played_tracks:
-                continue
-
-            features = features_dict.get(track['id'])
-            if features:
-                primary_genre = self._get_primary_genre(features.get('genres', []))
-                if primary_genre:
-                    features['genres'] = [primary_genre]
-
-                score = self.calculate_track_score(features)
-                scored_tracks.append((track, score))
+        if scorable:
+            scores = self.score_rows(self.spotify.feature_store, [row for _, row in scorable])
+            scored_tracks = [(track, float(score)) for (track, _), score in zip(scorable, scores)]
 
         if not scored_tracks:
             return candidates[0] if candidates else None
 
         scored_tracks.sort(key=lambda x: x[1], reverse=True)
 
-        if self.consecutive_dislikes >= 2:
+        if self.snapshot.consecutive_dislikes >= 2:
             exploration_pool_size = max(1, int(len(scored_tracks) * 0.6))
             exploration_pool = scored_tracks[:exploration_pool_size]
             return random.choice(exploration_pool)[0]
@@ -599,37 +925,31 @@ class LearningEngine:
             return random.choice(top_pool)[0]
 
     def generate_playlist_tracks(self, session_played_tracks: set, count: int = 25) -> List[Dict]:
+        if self.catalog is not None and len(self.catalog):
+            return self.catalog_playlist_tracks(session_played_tracks, count)
+
         all_candidates = []
         seen_ids = set(session_played_tracks)
 
+        snapshot = self.snapshot
         liked_genres = self._get_liked_genres()
-        use_session = self.session_ratings >= 5
+        use_session = snapshot.session_ratings >= 5
 
         if liked_genres:
+            queries = []
             for genre in liked_genres[:6]:
-                try:
-                    parent = GENRE_TAXONOMY.get_parent_genre(genre)
-                    search_genre = parent if parent else genre
-
-                    for year_query in [f"genre:{search_genre}", f"genre:{search_genre} year:2024", f"genre:{search_genre} year:2023"]:
-                        results = self.spotify.client.search(q=year_query, type='track', limit=50)
-                        if not results or 'tracks' not in results:
-                            continue
-                        for track in results['tracks']['items']:
-                            track_id = track.get('id')
-                            if not track_id or track_id in seen_ids:
-                                continue
-                            seen_ids.add(track_id)
-                            all_candidates.append({
-                                'id': track_id,
-                                'name': track.get('name', 'Unknown'),
-                                'artist': ', '.join([a.get('name', 'Unknown') for a in track.get('artists', [])]),
-                                'album_cover': track['album']['images'][0]['url'] if track.get('album') and track['album'].get('images') else None,
-                                'uri': track.get('uri', '')
-                            })
-                except Exception as e:
-                    print(f"Error searching genre {genre} for playlist: {e}")
-                    continue
+                parent = GENRE_TAXONOMY.get_parent_genre(genre)
+                search_genre = parent if parent else genre
+                queries.extend([f"genre:{search_genre}", f"genre:{search_genre} year:2024", f"genre:{search_genre} year:2023"])
+
+            results = self.spotify.search_many(queries, limit=50, timeout=self.SEARCH_TIMEOUT)
+            for query in queries:
+                for track in results.get(query, []):
+                    track_id = track.get('id')
+                    if not track_id or track_id in seen_ids:
+                        continue
+                    seen_ids.add(track_id)
+                    all_candidates.append(self.spotify.format_track(track))
 
         if len(all_candidates) < 50:
             try:
@@ -644,111 +964,309 @@ class LearningEngine:
         if not all_candidates:
             return []
 
-        track_ids = [t['id'] for t in all_candidates]
-        features_dict = self.spotify.get_batch_track_features(track_ids)
+        rows = self.spotify.get_feature_rows([t['id'] for t in all_candidates])
+        scorable = [(track, rows[track['id']]) for track in all_candidates if track['id'] in rows]
+        if not scorable:
+            return []
 
-        scored_tracks = []
-        for track in all_candidates:
-            features = features_dict.get(track['id'])
-            if not features:
+        store = self.spotify.feature_store
+        scorable_rows = [row for _, row in scorable]
+        scores = self.score_rows(store, scorable_rows, session_bonus=0.2 if use_session else 0.0)
+        features, genre_ids, artist_idx, fallback = store.take(scorable_rows)
+
+        picks = mmr_select(
+            scores,
+            features,
+            count,
+            artist_keys=[int(artist) if artist >= 0 else track.get('artist') for (track, _), artist in zip(scorable, artist_idx)],
+            genre_keys=[int(genre) if genre >= 0 else None for genre in genre_ids],
+            fallback=fallback.astype(bool)
+        )
+        return [scorable[i][0] for i in picks]
+
+    def build_scoring_model(self, catalog, session_bonus: float = 0.0,
+                            snapshot: Optional[ModelSnapshot] = None) -> ScoringModel:
+        snapshot = snapshot or self.snapshot
+        config = self.config
+        recent_ratings = snapshot.recent_ratings
+        genre_count = len(catalog.genres)
+        artist_count = len(catalog.artist_ids)
+
+        genre_rows = {genre: catalog.genre_index[genre] for genre in snapshot.genre_arms if genre in catalog.genre_index}
+        artist_rows = catalog.artist_rows(snapshot.artist_arms.keys())
+        genre_scores = self._catalog_arm_scores(snapshot.genre_arms, genre_rows, genre_count, 0.5, 2.5, 0.4)
+        artist_scores = self._catalog_arm_scores(snapshot.artist_arms, artist_rows, artist_count, 0.4, 2, 0.5)
+
+        genre_diversity = np.zeros(genre_count + 1, dtype=np.float32)
+        artist_penalty = np.zeros(artist_count + 1, dtype=np.float32)
+        diversity_bonus = 0.0
+        if len(recent_ratings) >= 5:
+            diversity_bonus = 0.1
+
+            recent_genres = [r.get('primary_genre') for r in recent_ratings[-5:] if r.get('primary_genre')]
+            if len(recent_genres) >= 2:
+                genre_diversity[:genre_count] = 0.15
+                for genre in recent_genres:
+                    if genre in catalog.genre_index:
+                        genre_diversity[catalog.genre_index[genre]] = 0.0
+
+            recent_10_artists = [r.get('artist_id') for r in recent_ratings[-10:] if r.get('artist_id')]
+            recent_5_artists = [r.get('artist_id') for r in recent_ratings[-5:] if r.get('artist_id')]
+            for artist_id, row in catalog.artist_rows(set(recent_10_artists)).items():
+                recent_5_count = recent_5_artists.count(artist_id)
+                recent_10_count = recent_10_artists.count(artist_id)
+                if recent_5_count > 0:
+                    artist_penalty[row] = 0.5 * (recent_5_count / 5.0)
+                elif recent_10_count > 1:
+                    artist_penalty[row] = 0.3 * (recent_10_count / 10.0)
+
+        weights = np.array([config[key] for key in (
+            'feature_weight', 'genre_weight', 'artist_weight', 'exploration_weight',
+            'diversity_weight', 'genre_diversity_weight', 'mood_weight'
+        )], dtype=np.float32)
+        fallback_weights = np.array([config[key] for key in (
+            'fallback_feature_weight', 'fallback_genre_weight', 'fallback_artist_weight',
+            'fallback_exploration_weight', 'fallback_diversity_weight', 'fallback_genre_diversity_weight'
+        )] + [0.0], dtype=np.float32)
+
+        return ScoringModel(
+            centroids=snapshot.cluster_centroids.astype(np.float32),
+            global_mean=snapshot.global_feature_mean.astype(np.float32),
+            recent_mean=snapshot.recent_feature_mean.astype(np.float32),
+            session_mean=snapshot.session_feature_mean.astype(np.float32),
+            preference_weights=self.get_recent_preference_weights(snapshot.session_ratings),
+            distance_scale=config['distance_scale'],
+            genre_scores=genre_scores,
+            artist_scores=artist_scores,
+            genre_diversity=genre_diversity,
+            artist_penalty=artist_penalty,
+            diversity_bonus=diversity_bonus,
+            exploration_rate=snapshot.exploration_rate,
+            mood_enabled=snapshot.session_ratings >= 3,
+            session_bonus=session_bonus,
+            weights=weights,
+            fallback_weights=fallback_weights
+        )
+
+    def _catalog_arm_scores(self, arms: Dict[str, Tuple], rows: Dict[str, int], size: int,
+                            recent_weight: float, penalty_ratio: float, penalty_factor: float) -> np.ndarray:
+        alphas = np.ones(size + 1)
+        betas = np.ones(size + 1)
+        recent_avgs = np.zeros(size + 1)
+        for key, row in rows.items():
+            alphas[row], betas[row], recent_avgs[row] = arms[key][:3]
+
+        scores = _shape_arm_samples(self.rng.beta(alphas, betas), alphas, betas, recent_avgs,
+                                    recent_weight, penalty_ratio, penalty_factor).astype(np.float32)
+        scores[-1] = 0.5
+        return scores
+
+    def score_rows(self, store, rows: List[int], session_bonus: float = 0.0) -> np.ndarray:
+        snapshot = self.snapshot
+        block = store.block(rows)
+        model = self.build_scoring_model(block, session_bonus=session_bonus, snapshot=snapshot)
+        recent_track_ids = {r['track_id'] for r in snapshot.recent_ratings[-5:]}
+        recent = np.array([track_id in recent_track_ids for track_id in block.track_ids], dtype=bool)
+        return score_feature_block(model, block.features, block.genre_ids, block.artist_idx, block.fallback,
+                                   self.rng, recent=recent)
+
+    def score_catalog(self, catalog, limit: int, exclude: set = frozenset(), session_bonus: float = 0.0,
+                      chunk_rows: int = 65536) -> List[Tuple[float, int]]:
+        model = self.build_scoring_model(catalog, session_bonus=session_bonus)
+        keep = limit + len(exclude)
+        best: List[Tuple[float, int]] = []
+        if self.catalog_scorer is not None:
+            best = self.catalog_scorer.top_rows(catalog, model, keep, seed=int(self.rng.integers(2 ** 63)))
+        else:
+            for offset, features, genre_ids, artist_idx, fallback in catalog.iter_chunks(chunk_rows):
+                for candidate in score_top_rows(model, features, genre_ids, artist_idx, fallback, offset, keep, self.rng):
+                    if len(best) < keep:
+                        heapq.heappush(best, candidate)
+                    elif candidate > best[0]:
+                        heapq.heapreplace(best, candidate)
+
+        ranked = []
+        for score, row in sorted(best, reverse=True):
+            if catalog.track_id(row) in exclude:
                 continue
+            ranked.append((score, row))
+            if len(ranked) >= limit:
+                break
+        return ranked
 
-            primary_genre = self._get_primary_genre(features.get('genres', []))
-            if primary_genre:
-                features['genres'] = [primary_genre]
+    def _catalog_exclusions(self, session_played_tracks: set) -> set:
+        recent_ratings = self.snapshot.recent_ratings
+        return set(session_played_tracks) | {r['track_id'] for r in recent_ratings[-10:]}
 
-            score = self.calculate_track_score(features)
+    def recommend_from_catalog(self, session_played_tracks: set) -> Optional[Dict]:
+        try:
+            pool_size = 12 if self.snapshot.consecutive_dislikes >= 2 else 5
+            ranked = self.score_catalog(self.catalog, pool_size, self._catalog_exclusions(session_played_tracks))
+            if not ranked:
+                print("No catalog tracks left to recommend")
+                return None
 
-            if use_session and not features.get('fallback'):
-                try:
-                    feature_vector = self.get_feature_vector(features)
-                    session_distance = np.linalg.norm(feature_vector - self.session_feature_mean)
-                    session_bonus = np.exp(-session_distance * 2) * 0.2
-                    score += session_bonus
-                except Exception:
-                    pass
+            _, row = random.choice(ranked)
+            track = self.catalog.track(row)
+            self.spotify.cache_track_features(track['id'], self.catalog.track_features(row))
+            return track
+        except Exception as e:
+            print(f"Error recommending from catalog: {e}")
+            return None
+
+    def catalog_playlist_tracks(self, session_played_tracks: set, count: int = 25) -> List[Dict]:
+        session_bonus = 0.2 if self.snapshot.session_ratings >= 5 else 0.0
+        ranked = self.score_catalog(self.catalog, count * 40, set(session_played_tracks), session_bonus=session_bonus)
+        if not ranked:
+            return []
 
-            scored_tracks.append((track, score))
+        rows = np.array([row for _, row in ranked])
+        picks = mmr_select(
+            np.array([score for score, _ in ranked]),
+            self.catalog.features[rows],
+            count,
+            artist_keys=[int(artist) if artist >= 0 else None for artist in self.catalog.artist_idx[rows]],
+            genre_keys=[int(genre) if genre >= 0 else None for genre in self.catalog.genre_ids[rows]],
+            fallback=self.catalog.fallback[rows]
+        )
+        return [self.catalog.track(int(rows[i])) for i in picks]
 
-        scored_tracks.sort(key=lambda x: x[1], reverse=True)
+    def refresh_playlist(self, session_played_tracks: set, count: int = 25) -> Dict:
+        tracks = self.generate_playlist_tracks(session_played_tracks, count=count)
+        if not tracks:
+            return {'success': False, 'error': 'No tracks found'}
 
-        selected = []
-        selected_artists = set()
-        for track, score in scored_tracks:
-            artist = track.get('artist', '')
-            if artist in selected_artists and len(selected) >= 5:
-                continue
-            selected.append(track)
-            selected_artists.add(artist)
-            if len(selected) >= count:
-                break
+        track_uris = [t['uri'] for t in tracks if t.get('uri')]
+        return self.spotify.update_playlist(track_uris, max_tracks=count)
 
-        return selected
+    def get_genre_track(self, genre_name: str, session_played_tracks: set) -> Optional[Dict]:
+        parent = GENRE_TAXONOMY.get_parent_genre(genre_name.lower())
+        search_genre = parent if parent else genre_name
+
+        tracks = self.spotify.search_tracks(f"genre:{search_genre}", limit=50)
+        if not tracks:
+            return None
+
+        available_tracks = [t for t in tracks if t.get('id') and t['id'] not in session_played_tracks]
+        if not available_tracks:
+            available_tracks = [t for t in tracks if t.get('id')]
+
+        if not available_tracks:
+            return None
+
+        track = random.choice(available_tracks)
+        if not track.get('id') or not track.get('name'):
+            return None
+
+        return self.spotify.format_track(track)
 
     def get_top_rated_tracks(self, limit: int = 50) -> List[Tuple[str, int]]:
-        ratings = self.storage.load_ratings()
-        sorted_tracks = sorted(
-            [(track_id, data['rating']) for track_id, data in ratings.items() if data['rating'] > 0],
-            key=lambda x: x[1],
-            reverse=True
-        )
-        return sorted_tracks[:limit]
+        return self.storage.top_rated(limit)
 
     def get_session_stats(self) -> Dict:
+        snapshot = self.snapshot
         return {
-            "total_ratings": self.total_ratings,
-            "session_ratings": self.session_ratings,
-            "exploration_rate": self.exploration_rate,
-            "consecutive_dislikes": self.consecutive_dislikes,
+            "total_ratings": snapshot.total_ratings,
+            "session_ratings": snapshot.session_ratings,
+            "exploration_rate": snapshot.exploration_rate,
+            "consecutive_dislikes": snapshot.consecutive_dislikes,
+            "session_feature_mean": snapshot.session_feature_mean.tolist(),
+            "feature_mode": self.spotify.feature_mode,
         }
 
+    def reset_model(self):
+        self._submit(self._reset_model).result()
+
+    def _reset_model(self):
+        self.genre_scores.clear()
+        self.artist_scores.clear()
+        self._genre_summaries.clear()
+        self._artist_summaries.clear()
+        self._rating_deltas.clear()
+        self._delta_seqs.clear()
+        self.cluster_centroids = np.empty((0, 9))
+        self.cluster_counts = np.empty(0)
+        self.cluster_ids = []
+        self._next_cluster_id = 0
+        self.total_ratings = 0
+        self.session_ratings = 0
+        self.recent_ratings.clear()
+        self.global_feature_mean = np.array([0.5] * 9)
+        self.recent_feature_mean = np.array([0.5] * 9)
+        self.session_feature_mean = np.array([0.5] * 9)
+        self.exploration_rate = 0.4
+        self.consecutive_dislikes = 0
+
+        self._journal_seq = 0
+        self._snapshot_seq = 0
+
+        self._publish_snapshot()
+
+        self.storage.clear_ratings()
+        self.storage.clear_model_state()
+
     def save_state(self):
+        self._submit(self._save_state).result()
+
+    def _save_state(self):
         state = {
-            'genre_scores': {k: {'alpha': v['alpha'], 'beta': v['beta'], 'history': list(v['history'])}
+            'genre_scores': {k: {'alpha': v['alpha'], 'beta': v['beta'], **v['history'].to_state()}
                            for k, v in self.genre_scores.items()},
-            'artist_scores': {k: {'alpha': v['alpha'], 'beta': v['beta'], 'history': list(v['history'])}
+            'artist_scores': {k: {'alpha': v['alpha'], 'beta': v['beta'], **v['history'].to_state()}
                             for k, v in self.artist_scores.items()},
             'global_feature_mean': self.global_feature_mean.tolist(),
             'recent_feature_mean': self.recent_feature_mean.tolist(),
             'exploration_rate': self.exploration_rate,
             'total_ratings': self.total_ratings,
-            'feature_clusters': self.feature_clusters
+            'feature_clusters': self._serialize_clusters(),
+            'journal_seq': self._journal_seq
         }
         self.storage.save_model_state(state)
+        self._snapshot_seq = self._journal_seq
+
+    def get_genre_leaderboard(self, limit: int = 15) -> List[Dict]:
+        aggregated = [(genre, scores) for genre, scores in self.get_aggregated_genre_scores().items()
+                      if scores['total_interactions']]
+        if not aggregated:
+            return []
+
+        alphas = np.array([scores['alpha'] for _, scores in aggregated])
+        betas = np.array([scores['beta'] for _, scores in aggregated])
+        probabilities = self.rng.beta(alphas, betas)
+
+        leaderboard = [{
+            'name': genre,
+            'probability': float(probability),
+            'samples': scores['total_interactions'],
+            'total_interactions': scores['alpha'] + scores['beta'],
+            'subgenres': scores['subgenres']
+        } for (genre, scores), probability in zip(aggregated, probabilities)]
+
+        leaderboard.sort(key=lambda x: (x['probability'], x['samples']), reverse=True)
+        return leaderboard[:limit]
 
     def get_aggregated_genre_scores(self) -> Dict[str, Dict]:
         aggregated = defaultdict(lambda: {
             'alpha': 0.0,
             'beta': 0.0,
-            'history': [],
             'subgenres': [],
             'total_interactions': 0
         })
 
-        for genre, scores in self.genre_scores.items():
-            parent = GENRE_TAXONOMY.get_parent_genre(genre)
-            is_cultural = GENRE_TAXONOMY.is_cultural_variant(genre)
-
-            if parent:
-                display_genre = parent
-            elif is_cultural:
-                display_genre = genre.title()
-            else:
-                display_genre = genre.title()
+        for genre, (alpha, beta, _, _, history_length) in self.snapshot.genre_arms.items():
+            display_genre = GENRE_TAXONOMY.lookup(genre).display_name
 
             if display_genre not in aggregated:
                 aggregated[display_genre] = {
                     'alpha': 0.0,
                     'beta': 0.0,
-                    'history': [],
                     'subgenres': [],
                     'total_interactions': 0
                 }
 
-            aggregated[display_genre]['alpha'] += scores['alpha']
-            aggregated[display_genre]['beta'] += scores['beta']
-            aggregated[display_genre]['history'].extend(scores.get('history', []))
+            aggregated[display_genre]['alpha'] += alpha
+            aggregated[display_genre]['beta'] += beta
             aggregated[display_genre]['subgenres'].append(genre)
-            aggregated[display_genre]['total_interactions'] += len(scores.get('history', []))
+            aggregated[display_genre]['total_interactions'] += history_length
 
         return dict(aggregated)
\ No newline at end of file
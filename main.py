@@ -1,19 +1,93 @@
-import customtkinter as ctk
-from gui import MusicLearnerGUI
+import argparse
+import os
 from spotify_client import SpotifyClient
 from learning_engine import LearningEngine
-from storage import Storage
+from storage import Storage, DEFAULT_PROFILE
+from playlist_sync import DEFAULT_PLAYLIST_SIZE
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Spotify AI Learner")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run the recommendation service instead of the desktop GUI")
+    parser.add_argument("--host", default="127.0.0.1", help="Address the service binds to")
+    parser.add_argument("--port", type=int, default=8765, help="Port the service listens on")
+    parser.add_argument("--token", default=os.environ.get("SPOTIFY_AI_TOKEN"),
+                        help="Service token required for rating, playlist, playback and reset requests "
+                             "(defaults to $SPOTIFY_AI_TOKEN; the service generates one if unset)")
+    parser.add_argument("--allow-origin", action="append", default=[], metavar="ORIGIN",
+                        help="Browser origin allowed to call the service, e.g. http://localhost:3000 (repeatable)")
+    parser.add_argument("--connect", metavar="URL",
+                        help="Run the GUI as a thin client of a running service, e.g. http://127.0.0.1:8765")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE,
+                        help="Named profile whose ratings and taste model are used by the GUI")
+    parser.add_argument("--catalog", metavar="DIR",
+                        help="Recommend from a local track catalog built with catalog.py instead of live search")
+    parser.add_argument("--scoring-workers", type=int, default=0,
+                        help="Processes used to score the catalog in parallel (0 scores in this process)")
+    parser.add_argument("--playlist-size", type=int, default=DEFAULT_PLAYLIST_SIZE,
+                        help="Tracks written to the generated playlist by Update Playlist")
+    parser.add_argument("--max-active-profiles", type=int, default=4,
+                        help="Profiles the service keeps loaded in memory before unloading the least recently used")
+    return parser.parse_args()
+
+def run_gui(spotify, engine, storage, playlist_size=DEFAULT_PLAYLIST_SIZE):
+    import customtkinter as ctk
+    from gui import MusicLearnerGUI
 
-def main():
     ctk.set_appearance_mode("dark")
     ctk.set_default_color_theme("blue")
-    
-    storage = Storage()
-    spotify = SpotifyClient()
-    engine = LearningEngine(storage, spotify)
-    
-    app = MusicLearnerGUI(spotify, engine, storage)
+
+    app = MusicLearnerGUI(spotify, engine, storage, playlist_size=playlist_size)
     app.mainloop()
 
+def main():
+    args = parse_args()
+
+    if args.connect:
+        from service_client import ServiceClient, RemoteEngine, RemoteSpotify
+        client = ServiceClient(args.connect, token=args.token)
+        run_gui(RemoteSpotify(client), RemoteEngine(client, profile=args.profile), None, args.playlist_size)
+        return
+
+    spotify = SpotifyClient(storage=Storage(), playlist_size=args.playlist_size)
+
+    catalog = None
+    catalog_scorer = None
+    if args.catalog:
+        from catalog import TrackCatalog
+        catalog = TrackCatalog(args.catalog)
+        print(f"Loaded catalog with {len(catalog)} tracks from {args.catalog}")
+        if args.scoring_workers > 0:
+            from parallel_scoring import ParallelScorer
+            catalog_scorer = ParallelScorer(workers=args.scoring_workers)
+
+    if args.serve:
+        from profiles import ProfileManager
+        from recommendation_server import RecommendationServer
+        profiles = ProfileManager(spotify, max_active=args.max_active_profiles, catalog=catalog,
+                                  catalog_scorer=catalog_scorer)
+        server = RecommendationServer(profiles, spotify, host=args.host, port=args.port, token=args.token,
+                                      allowed_origins=args.allow_origin)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            profiles.close_all()
+            spotify.close()
+            if catalog_scorer is not None:
+                catalog_scorer.close()
+        return
+
+    storage = Storage(profile=args.profile)
+    engine = LearningEngine(storage, spotify, catalog=catalog, catalog_scorer=catalog_scorer)
+    try:
+        run_gui(spotify, engine, storage, args.playlist_size)
+    finally:
+        engine.close()
+        spotify.close()
+        if catalog_scorer is not None:
+            catalog_scorer.close()
+
 if __name__ == "__main__":
     main()
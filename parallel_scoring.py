@@ -0,0 +1,102 @@
+import heapq
+import itertools
+import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from catalog import DEFAULT_CHUNK_ROWS, TrackCatalog
+from learning_engine import ScoringModel, score_top_rows
+
+_worker_catalogs: Dict[str, TrackCatalog] = {}
+_worker_models: Dict[str, ScoringModel] = {}
+
+
+def _open_catalog(path: str) -> TrackCatalog:
+    catalog = _worker_catalogs.get(path)
+    if catalog is None:
+        catalog = _worker_catalogs[path] = TrackCatalog(path)
+    return catalog
+
+
+def _load_model(spec: Tuple[str, int]) -> ScoringModel:
+    name, size = spec
+    model = _worker_models.get(name)
+    if model is None:
+        block = shared_memory.SharedMemory(name=name)
+        try:
+            model = pickle.loads(block.buf[:size])
+        finally:
+            block.close()
+        _worker_models.clear()
+        _worker_models[name] = model
+    return model
+
+
+def _share_model(model: ScoringModel) -> Tuple[shared_memory.SharedMemory, Tuple[str, int]]:
+    payload = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+    block = shared_memory.SharedMemory(create=True, size=max(1, len(payload)))
+    block.buf[:len(payload)] = payload
+    return block, (block.name, len(payload))
+
+
+def _score_range(catalog: TrackCatalog, start: int, stop: int, model: ScoringModel, limit: int,
+                 seed: int) -> List[Tuple[float, int]]:
+    return score_top_rows(model, catalog.features[start:stop], catalog.genre_ids[start:stop],
+                          catalog.artist_idx[start:stop], catalog.fallback[start:stop],
+                          start, limit, np.random.default_rng(seed))
+
+
+def _score_catalog_range(task: Tuple[str, int, int, Tuple[str, int], int, int]) -> List[Tuple[float, int]]:
+    path, start, stop, model_spec, limit, seed = task
+    return _score_range(_open_catalog(path), start, stop, _load_model(model_spec), limit, seed)
+
+
+class ParallelScorer:
+    def __init__(self, workers: Optional[int] = None, chunk_rows: int = DEFAULT_CHUNK_ROWS):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.chunk_rows = chunk_rows
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _ranges(self, rows: int) -> List[Tuple[int, int]]:
+        chunk_rows = max(1, min(self.chunk_rows, -(-rows // self.workers)))
+        return [(start, min(start + chunk_rows, rows)) for start in range(0, rows, chunk_rows)]
+
+    def top_rows(self, catalog: TrackCatalog, model: ScoringModel, limit: int,
+                 seed: Optional[int] = None) -> List[Tuple[float, int]]:
+        if not len(catalog):
+            return []
+        ranges = self._ranges(len(catalog))
+        seeds = [int(chunk_seed) for chunk_seed in
+                 np.random.SeedSequence(seed).generate_state(len(ranges), dtype=np.uint64)]
+
+        if self.workers == 1:
+            results = [_score_range(catalog, start, stop, model, limit, chunk_seed)
+                       for (start, stop), chunk_seed in zip(ranges, seeds)]
+            return heapq.nlargest(limit, itertools.chain.from_iterable(results))
+
+        block, model_spec = _share_model(model)
+        try:
+            tasks = [(catalog.path, start, stop, model_spec, limit, chunk_seed)
+                     for (start, stop), chunk_seed in zip(ranges, seeds)]
+            return heapq.nlargest(limit, itertools.chain.from_iterable(self._pool().map(_score_catalog_range, tasks)))
+        finally:
+            block.close()
+            block.unlink()
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
@@ -0,0 +1,83 @@
+import math
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_RELEVANCE_WEIGHT = 0.7
+DEFAULT_ARTIST_CAP = 2
+
+
+def default_genre_cap(count: int) -> int:
+    return max(3, math.ceil(count * 0.4))
+
+
+def _codes(keys: Optional[Sequence], size: int) -> np.ndarray:
+    if keys is None:
+        return np.full(size, -1, dtype=np.int64)
+    codes = np.full(size, -1, dtype=np.int64)
+    lookup = {}
+    for i, key in enumerate(keys):
+        if key is not None and key != '':
+            codes[i] = lookup.setdefault(key, len(lookup))
+    return codes
+
+
+def _unit_rows(features: np.ndarray, fallback: Optional[np.ndarray]) -> np.ndarray:
+    centered = features - features.mean(axis=0)
+    norms = np.linalg.norm(centered, axis=1, keepdims=True)
+    unit = np.divide(centered, norms, out=np.zeros_like(centered), where=norms > 1e-9)
+    if fallback is not None:
+        unit[np.asarray(fallback, dtype=bool)] = 0.0
+    return unit
+
+
+def mmr_select(relevance: np.ndarray, features: np.ndarray, count: int,
+               artist_keys: Optional[Sequence] = None, genre_keys: Optional[Sequence] = None,
+               fallback: Optional[np.ndarray] = None, relevance_weight: float = DEFAULT_RELEVANCE_WEIGHT,
+               artist_cap: int = DEFAULT_ARTIST_CAP, genre_cap: Optional[int] = None) -> List[int]:
+    relevance = np.asarray(relevance, dtype=float)
+    size = len(relevance)
+    count = min(count, size)
+    if count <= 0:
+        return []
+
+    spread = relevance.max() - relevance.min()
+    relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones(size)
+    unit = _unit_rows(np.asarray(features, dtype=float), fallback)
+    genre_cap = default_genre_cap(count) if genre_cap is None else genre_cap
+
+    artist_codes = _codes(artist_keys, size)
+    genre_codes = _codes(genre_keys, size)
+    artist_counts = np.zeros(artist_codes.max() + 2, dtype=int)
+    genre_counts = np.zeros(genre_codes.max() + 2, dtype=int)
+
+    max_similarity = np.zeros(size)
+    selected_mask = np.zeros(size, dtype=bool)
+    capped = np.zeros(size, dtype=bool)
+    redundancy_weight = 1.0 - relevance_weight
+    selected = []
+
+    for _ in range(count):
+        marginal = relevance_weight * relevance - redundancy_weight * max_similarity
+        blocked = selected_mask | capped
+        if blocked.all():
+            blocked = selected_mask
+        marginal[blocked] = -np.inf
+
+        pick = int(np.argmax(marginal))
+        selected.append(pick)
+        selected_mask[pick] = True
+        np.maximum(max_similarity, unit @ unit[pick], out=max_similarity)
+
+        artist = artist_codes[pick]
+        if artist >= 0:
+            artist_counts[artist] += 1
+            if artist_counts[artist] >= artist_cap:
+                capped |= artist_codes == artist
+        genre = genre_codes[pick]
+        if genre >= 0:
+            genre_counts[genre] += 1
+            if genre_counts[genre] >= genre_cap:
+                capped |= genre_codes == genre
+
+    return selected
@@ -0,0 +1,111 @@
+import math
+from bisect import bisect_left
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+DEFAULT_PLAYLIST_SIZE = 25
+WRITE_BATCH = 100
+
+
+class PlaylistPlan(NamedTuple):
+    removals: List[Tuple[str, int]]
+    additions: List[Tuple[int, List[str]]]
+
+    @property
+    def calls(self) -> int:
+        return math.ceil(len(self.removals) / WRITE_BATCH) + len(self.additions)
+
+    @property
+    def added(self) -> int:
+        return sum(len(uris) for _, uris in self.additions)
+
+
+def replace_calls(track_count: int) -> int:
+    return max(1, math.ceil(track_count / WRITE_BATCH))
+
+
+def _longest_increasing(values: Sequence[int]) -> Set[int]:
+    tails: List[int] = []
+    tail_indices: List[int] = []
+    previous = [-1] * len(values)
+    for i, value in enumerate(values):
+        k = bisect_left(tails, value)
+        if k:
+            previous[i] = tail_indices[k - 1]
+        if k == len(tails):
+            tails.append(value)
+            tail_indices.append(i)
+        else:
+            tails[k] = value
+            tail_indices[k] = i
+
+    keep = set()
+    i = tail_indices[-1] if tail_indices else -1
+    while i >= 0:
+        keep.add(i)
+        i = previous[i]
+    return keep
+
+
+def plan_sync(current: Sequence[str], target: Sequence[str]) -> PlaylistPlan:
+    target_ranks = {uri: rank for rank, uri in enumerate(target)}
+    removals = []
+    kept_positions = []
+    kept_ranks = []
+    seen = set()
+    for position, uri in enumerate(current):
+        rank = target_ranks.get(uri)
+        if rank is None or uri in seen:
+            removals.append((uri, position))
+            continue
+        seen.add(uri)
+        kept_positions.append(position)
+        kept_ranks.append(rank)
+
+    in_order = _longest_increasing(kept_ranks)
+    kept = set()
+    for i, position in enumerate(kept_positions):
+        if i in in_order:
+            kept.add(target[kept_ranks[i]])
+        else:
+            removals.append((current[position], position))
+
+    additions = []
+    run_start, run = 0, []
+    for rank, uri in enumerate(target):
+        if uri in kept:
+            continue
+        if run and run_start + len(run) == rank and len(run) < WRITE_BATCH:
+            run.append(uri)
+            continue
+        if run:
+            additions.append((run_start, run))
+        run_start, run = rank, [uri]
+    if run:
+        additions.append((run_start, run))
+
+    removals.sort(key=lambda removal: removal[1], reverse=True)
+    return PlaylistPlan(removals, additions)
+
+
+def apply_plan(client, playlist_id: str, plan: PlaylistPlan, snapshot_id: Optional[str]) -> Optional[str]:
+    for start in range(0, len(plan.removals), WRITE_BATCH):
+        positions: Dict[str, List[int]] = {}
+        for uri, position in plan.removals[start:start + WRITE_BATCH]:
+            positions.setdefault(uri, []).append(position)
+        items = [{'uri': uri, 'positions': uri_positions} for uri, uri_positions in positions.items()]
+        result = client.playlist_remove_specific_occurrences_of_items(playlist_id, items, snapshot_id=snapshot_id)
+        snapshot_id = (result or {}).get('snapshot_id', snapshot_id)
+
+    for position, uris in plan.additions:
+        result = client.playlist_add_items(playlist_id, uris, position=position)
+        snapshot_id = (result or {}).get('snapshot_id', snapshot_id)
+    return snapshot_id
+
+
+def replace_contents(client, playlist_id: str, uris: Sequence[str]) -> Optional[str]:
+    result = client.playlist_replace_items(playlist_id, list(uris[:WRITE_BATCH]))
+    snapshot_id = (result or {}).get('snapshot_id')
+    for start in range(WRITE_BATCH, len(uris), WRITE_BATCH):
+        result = client.playlist_add_items(playlist_id, list(uris[start:start + WRITE_BATCH]))
+        snapshot_id = (result or {}).get('snapshot_id', snapshot_id)
+    return snapshot_id
@@ -0,0 +1,152 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from learning_engine import LearningEngine
+from storage import Storage, DEFAULT_PROFILE
+
+
+class ProfileManager:
+    def __init__(self, spotify_client, data_dir: str = "data", max_active: int = 4, catalog=None,
+                 catalog_scorer=None):
+        self.spotify = spotify_client
+        self.data_dir = data_dir
+        self.catalog = catalog
+        self.catalog_scorer = catalog_scorer
+        self.max_active = max(1, max_active)
+
+        self._engines: "OrderedDict[str, LearningEngine]" = OrderedDict()
+        self._leases: Dict[str, int] = {}
+        self._retiring: Dict[str, LearningEngine] = {}
+        self._inflight_loads: Dict[str, Future] = {}
+        self._closing: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def get_engine(self, profile: str = DEFAULT_PROFILE) -> LearningEngine:
+        name = Storage.validate_profile_name(profile or DEFAULT_PROFILE)
+
+        with self._lock:
+            engine = self._engines.get(name) or self._retiring.pop(name, None)
+            if engine is not None:
+                self._engines[name] = engine
+                self._engines.move_to_end(name)
+                evicted = self._evict_idle(keep=name)
+            else:
+                loading = self._inflight_loads.get(name)
+                if loading is None:
+                    loading = self._inflight_loads[name] = Future()
+                    closing = self._closing.get(name)
+                    owner = True
+                else:
+                    owner = False
+        if engine is not None:
+            self._unload_engines(evicted)
+            return engine
+        if not owner:
+            return loading.result()
+
+        try:
+            if closing is not None:
+                closing.result()
+            engine = LearningEngine(Storage(self.data_dir, profile=name), self.spotify, catalog=self.catalog,
+                                    catalog_scorer=self.catalog_scorer)
+        except BaseException as e:
+            with self._lock:
+                del self._inflight_loads[name]
+            loading.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._inflight_loads[name]
+            self._engines[name] = engine
+            evicted = self._evict_idle(keep=name)
+        loading.set_result(engine)
+        self._unload_engines(evicted)
+        return engine
+
+    @contextmanager
+    def lease(self, profile: str = DEFAULT_PROFILE) -> Iterator[LearningEngine]:
+        name = Storage.validate_profile_name(profile or DEFAULT_PROFILE)
+        with self._lock:
+            self._leases[name] = self._leases.get(name, 0) + 1
+        try:
+            yield self.get_engine(name)
+        finally:
+            with self._lock:
+                self._leases[name] -= 1
+                evicted = []
+                if not self._leases[name]:
+                    del self._leases[name]
+                    retiring = self._retiring.pop(name, None)
+                    if retiring is not None:
+                        evicted.append(self._detach(name, retiring))
+                evicted.extend(self._evict_idle())
+            self._unload_engines(evicted)
+
+    def _evict_idle(self, keep: Optional[str] = None) -> List[Tuple[str, LearningEngine]]:
+        evicted = []
+        for name in list(self._engines):
+            if len(self._engines) <= self.max_active:
+                break
+            if name != keep and name not in self._leases:
+                evicted.append(self._detach(name, self._engines.pop(name)))
+        return evicted
+
+    def unload(self, profile: str) -> bool:
+        with self._lock:
+            engine = self._engines.pop(profile, None)
+            if engine is None:
+                return False
+            if profile in self._leases:
+                self._retiring[profile] = engine
+                return True
+            self._detach(profile, engine)
+        self._unload_engine(profile, engine)
+        return True
+
+    def _detach(self, name: str, engine: LearningEngine) -> Tuple[str, LearningEngine]:
+        self._closing[name] = Future()
+        return name, engine
+
+    def save_all(self):
+        with self._lock:
+            engines = list(self._engines.values()) + list(self._retiring.values())
+        for engine in engines:
+            engine.save_state()
+
+    def close_all(self):
+        with self._lock:
+            engines = [self._detach(name, engine) for name, engine in
+                       list(self._engines.items()) + list(self._retiring.items())]
+            self._engines.clear()
+            self._retiring.clear()
+        self._unload_engines(engines)
+
+    def _unload_engines(self, engines: List[Tuple[str, LearningEngine]]):
+        for name, engine in engines:
+            self._unload_engine(name, engine)
+
+    def _unload_engine(self, name: str, engine: LearningEngine):
+        try:
+            engine.save_state()
+            print(f"Unloaded profile '{name}'")
+        except Exception as e:
+            print(f"Error saving profile '{name}' on unload: {e}")
+        finally:
+            engine.close()
+            with self._lock:
+                closing = self._closing.pop(name, None)
+            if closing is not None:
+                closing.set_result(None)
+
+    def active_profiles(self) -> List[str]:
+        with self._lock:
+            return list(self._engines.keys())
+
+    def list_profiles(self) -> Dict[str, List[str]]:
+        return {
+            'profiles': Storage.list_profiles(self.data_dir),
+            'active': self.active_profiles()
+        }
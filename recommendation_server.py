@@ -0,0 +1,331 @@
+import hmac
+import json
+import secrets
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse, parse_qs
+
+from storage import DEFAULT_PROFILE, Storage
+
+MAX_BODY_BYTES = 64 * 1024
+
+
+class LatencyMetrics:
+    def __init__(self, window: int = 500):
+        self._lock = threading.Lock()
+        self._window = window
+        self._endpoints = {}
+        self._started_at = time.time()
+
+    def record(self, endpoint: str, elapsed: float, ok: bool):
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = {
+                    'count': 0,
+                    'errors': 0,
+                    'total': 0.0,
+                    'max': 0.0,
+                    'samples': deque(maxlen=self._window)
+                }
+                self._endpoints[endpoint] = stats
+
+            stats['count'] += 1
+            if not ok:
+                stats['errors'] += 1
+            stats['total'] += elapsed
+            stats['max'] = max(stats['max'], elapsed)
+            stats['samples'].append(elapsed)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            endpoints = {}
+            for endpoint, stats in self._endpoints.items():
+                samples = sorted(stats['samples'])
+                endpoints[endpoint] = {
+                    'count': stats['count'],
+                    'errors': stats['errors'],
+                    'mean_ms': 1000.0 * stats['total'] / stats['count'],
+                    'p50_ms': 1000.0 * self._percentile(samples, 0.50),
+                    'p95_ms': 1000.0 * self._percentile(samples, 0.95),
+                    'p99_ms': 1000.0 * self._percentile(samples, 0.99),
+                    'max_ms': 1000.0 * stats['max']
+                }
+            return {
+                'uptime_s': time.time() - self._started_at,
+                'endpoints': endpoints
+            }
+
+    @staticmethod
+    def _percentile(samples, fraction: float) -> float:
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, int(round(fraction * (len(samples) - 1))))
+        return samples[index]
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _int(payload: Dict, key: str, default: Optional[int] = None) -> int:
+    value = payload.get(key, default)
+    if isinstance(value, str) and value.lstrip('-').isdigit():
+        value = int(value)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise BadRequest(f"'{key}' must be an integer")
+    return value
+
+
+def _bool(payload: Dict, key: str, default: bool) -> bool:
+    value = payload.get(key, default)
+    if not isinstance(value, bool):
+        raise BadRequest(f"'{key}' must be a JSON boolean")
+    return value
+
+
+def _str(payload: Dict, key: str) -> str:
+    value = payload.get(key)
+    if not isinstance(value, str) or not value:
+        raise BadRequest(f"'{key}' must be a non-empty string")
+    return value
+
+
+def _str_set(payload: Dict, key: str) -> set:
+    value = payload.get(key, [])
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise BadRequest(f"'{key}' must be a list of strings")
+    return set(value)
+
+
+class RecommendationService:
+    ROUTES = {
+        ('POST', '/recommendation'): 'handle_recommendation',
+        ('POST', '/rate'): 'handle_rate',
+        ('POST', '/undo'): 'handle_undo',
+        ('GET', '/leaderboard'): 'handle_leaderboard',
+        ('POST', '/playlist'): 'handle_playlist',
+        ('POST', '/genre-track'): 'handle_genre_track',
+        ('GET', '/stats'): 'handle_stats',
+        ('GET', '/current'): 'handle_current',
+        ('POST', '/play'): 'handle_play',
+        ('POST', '/reset'): 'handle_reset',
+        ('GET', '/metrics'): 'handle_metrics',
+        ('GET', '/profiles'): 'handle_profiles'
+    }
+    MUTATING_ROUTES = {'/rate', '/undo', '/playlist', '/play', '/reset'}
+
+    def __init__(self, profiles, spotify_client, token: Optional[str] = None):
+        self.profiles = profiles
+        self.spotify = spotify_client
+        self.token = token
+        self.metrics = LatencyMetrics()
+
+    def _engine(self, payload: Dict):
+        profile = payload.get('profile') or DEFAULT_PROFILE
+        if not isinstance(profile, str):
+            raise BadRequest("'profile' must be a string")
+        try:
+            Storage.validate_profile_name(profile)
+        except ValueError as e:
+            raise BadRequest(str(e))
+        return self.profiles.lease(profile)
+
+    def authorized(self, path: str, token: Optional[str]) -> bool:
+        if path not in self.MUTATING_ROUTES or self.token is None:
+            return True
+        return token is not None and hmac.compare_digest(token.encode('utf-8'), self.token.encode('utf-8'))
+
+    def dispatch(self, method: str, path: str, payload: Dict, token: Optional[str] = None):
+        handler_name = self.ROUTES.get((method, path))
+        if handler_name is None:
+            return 404, {'error': f"Unknown endpoint {method} {path}"}
+        if not self.authorized(path, token):
+            return 401, {'error': f"{method} {path} requires a valid service token"}
+
+        start_time = time.perf_counter()
+        ok = False
+        try:
+            result = getattr(self, handler_name)(payload)
+            ok = True
+            return 200, result
+        except BadRequest as e:
+            return 400, {'error': f"Bad request: {e}"}
+        except Exception as e:
+            print(f"Error handling {method} {path}: {e}")
+            return 500, {'error': str(e)}
+        finally:
+            self.metrics.record(path, time.perf_counter() - start_time, ok)
+
+    def handle_recommendation(self, payload: Dict) -> Dict:
+        exclude = _str_set(payload, 'exclude')
+        with self._engine(payload) as engine:
+            return {'track': engine.get_recommended_track(exclude)}
+
+    def _rating_update(self, payload: Dict, is_undo: bool) -> Dict:
+        track_id = _str(payload, 'track_id')
+        rating = _int(payload, 'rating')
+        should_count = _bool(payload, 'should_count', True)
+        with self._engine(payload) as engine:
+            engine.update_with_rating(track_id, rating, is_undo=is_undo, should_count=should_count)
+            return {'stats': engine.get_session_stats()}
+
+    def handle_rate(self, payload: Dict) -> Dict:
+        return self._rating_update(payload, is_undo=False)
+
+    def handle_undo(self, payload: Dict) -> Dict:
+        return self._rating_update(payload, is_undo=True)
+
+    def handle_leaderboard(self, payload: Dict) -> Dict:
+        limit = _int(payload, 'limit', 15)
+        with self._engine(payload) as engine:
+            return {'genres': engine.get_genre_leaderboard(limit=limit)}
+
+    def handle_playlist(self, payload: Dict) -> Dict:
+        exclude = _str_set(payload, 'exclude')
+        count = _int(payload, 'count', 25)
+        with self._engine(payload) as engine:
+            return engine.refresh_playlist(exclude, count=count)
+
+    def handle_genre_track(self, payload: Dict) -> Dict:
+        exclude = _str_set(payload, 'exclude')
+        genre = _str(payload, 'genre')
+        with self._engine(payload) as engine:
+            return {'track': engine.get_genre_track(genre, exclude)}
+
+    def handle_stats(self, payload: Dict) -> Dict:
+        with self._engine(payload) as engine:
+            return engine.get_session_stats()
+
+    def handle_current(self, payload: Dict) -> Dict:
+        return {'track': self.spotify.get_current_track()}
+
+    def handle_play(self, payload: Dict) -> Dict:
+        self.spotify.play_track(_str(payload, 'uri'))
+        return {'ok': True}
+
+    def handle_reset(self, payload: Dict) -> Dict:
+        with self._engine(payload) as engine:
+            engine.reset_model()
+        return {'ok': True}
+
+    def handle_metrics(self, payload: Dict) -> Dict:
+        metrics = self.metrics.snapshot()
+        metrics['search_cache'] = self.spotify.search_cache.stats()
+        metrics['features'] = self.spotify.feature_status()
+        metrics['auth_routing'] = self.spotify.routing_status()
+        return metrics
+
+    def handle_profiles(self, payload: Dict) -> Dict:
+        return self.profiles.list_profiles()
+
+
+def _make_handler(service: RecommendationService, allowed_origins: Iterable[str] = ()):
+    allowed_origins = set(allowed_origins)
+
+    class RequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self._handle('GET')
+
+        def do_POST(self):
+            self._handle('POST')
+
+        def do_OPTIONS(self):
+            if self.headers.get('Origin') not in allowed_origins:
+                self._send_json(403, {'error': "Origin not allowed"})
+                return
+            self.send_response(204)
+            self._send_cors_headers()
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def _handle(self, method: str):
+            parsed = urlparse(self.path)
+            payload = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                self._send_json(400, {'error': "Invalid Content-Length header"})
+                return
+            if length > MAX_BODY_BYTES:
+                self._send_json(413, {'error': f"Request body exceeds {MAX_BODY_BYTES} bytes"})
+                return
+            if length:
+                try:
+                    body = json.loads(self.rfile.read(length))
+                    if isinstance(body, dict):
+                        payload.update(body)
+                except (json.JSONDecodeError, ValueError) as e:
+                    self._send_json(400, {'error': f"Invalid JSON body: {e}"})
+                    return
+
+            token = None
+            authorization = self.headers.get('Authorization') or ''
+            if authorization.startswith('Bearer '):
+                token = authorization[len('Bearer '):].strip()
+            status, result = service.dispatch(method, parsed.path.rstrip('/') or '/', payload, token=token)
+            self._send_json(status, result)
+
+        def _send_json(self, status: int, data):
+            body = json.dumps(data, default=str).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self._send_cors_headers()
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_cors_headers(self):
+            origin = self.headers.get('Origin')
+            if origin not in allowed_origins:
+                return
+            self.send_header('Access-Control-Allow-Origin', origin)
+            self.send_header('Vary', 'Origin')
+            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+            self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+
+        def log_message(self, format, *args):
+            pass
+
+    return RequestHandler
+
+
+class RecommendationServer:
+    def __init__(self, profiles, spotify_client, host: str = "127.0.0.1", port: int = 8765,
+                 token: Optional[str] = None, allowed_origins: Optional[List[str]] = None):
+        self.generated_token = token is None
+        self.service = RecommendationService(profiles, spotify_client, token=token or secrets.token_urlsafe(24))
+        self.httpd = ThreadingHTTPServer((host, port), _make_handler(self.service, allowed_origins or ()))
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        print(f"Recommendation service listening on {self.url}")
+        if self.generated_token:
+            print(f"Service token (pass it to clients with --token): {self.service.token}")
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.httpd.server_close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
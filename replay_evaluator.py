@@ -0,0 +1,223 @@
+import argparse
+import contextlib
+import json
+import os
+import random
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from feature_store import FeatureStore
+from features import FALLBACK_VECTOR, FEATURE_NAMES
+from learning_engine import LearningEngine
+from storage import Storage, DEFAULT_PROFILE
+
+
+class ReplayDataset:
+    def __init__(self, track_ids: List[str], features: np.ndarray, ratings: np.ndarray,
+                 genres: List[List[str]], artist_ids: List[Optional[str]]):
+        self.track_ids = track_ids
+        self.features = features
+        self.ratings = ratings
+        self.genres = genres
+        self.artist_ids = artist_ids
+
+    def __len__(self) -> int:
+        return len(self.track_ids)
+
+    @classmethod
+    def from_ratings(cls, ratings: Dict[str, Dict], track_cache: Optional[Dict[str, Dict]] = None) -> 'ReplayDataset':
+        track_cache = track_cache or {}
+        records = sorted(ratings.items(), key=lambda item: item[1].get('timestamp', ''))
+
+        track_ids = []
+        vectors = []
+        labels = []
+        genres = []
+        artist_ids = []
+        for track_id, record in records:
+            vector = record.get('features') or []
+            if len(vector) != len(FEATURE_NAMES) or not record.get('rating'):
+                continue
+
+            cached = track_cache.get(track_id, {})
+            if record.get('primary_genre'):
+                track_genres = [record['primary_genre']]
+            else:
+                track_genres = list(cached.get('genres', []))
+
+            track_ids.append(track_id)
+            vectors.append(vector)
+            labels.append(1 if record['rating'] > 0 else -1)
+            genres.append(track_genres)
+            artist_ids.append(record.get('artist_id') or cached.get('artist_id'))
+
+        return cls(
+            track_ids,
+            np.array(vectors, dtype=float).reshape(-1, len(FEATURE_NAMES)),
+            np.array(labels, dtype=np.int8),
+            genres,
+            artist_ids
+        )
+
+    @classmethod
+    def from_storage(cls, storage: Storage) -> 'ReplayDataset':
+        return cls.from_ratings(storage.load_ratings(), storage.load_track_cache())
+
+
+class ReplaySpotifyClient:
+    feature_mode = 'full'
+
+    def __init__(self, dataset: ReplayDataset):
+        features = np.asarray(dataset.features).reshape(-1, len(FEATURE_NAMES))
+        self.feature_store = FeatureStore(capacity=max(1, len(dataset)))
+        self.feature_store.add_many(dataset.track_ids, features, dataset.genres, dataset.artist_ids,
+                                    np.isclose(features, FALLBACK_VECTOR).all(axis=1))
+
+    def get_feature_row(self, track_id: str) -> Optional[int]:
+        return self.feature_store.row(track_id)
+
+    def get_feature_rows(self, track_ids: List[str]) -> Dict[str, int]:
+        rows = {}
+        for track_id in track_ids:
+            row = self.feature_store.row(track_id)
+            if row is not None:
+                rows[track_id] = row
+        return rows
+
+    def get_track_features(self, track_id: str) -> Optional[Dict]:
+        row = self.feature_store.row(track_id)
+        return self.feature_store.track_features(row) if row is not None else None
+
+    def get_batch_track_features(self, track_ids: List[str]) -> Dict[str, Optional[Dict]]:
+        return {track_id: self.get_track_features(track_id) for track_id in track_ids}
+
+    def cache_track_features(self, track_id: str, features: Dict):
+        self.feature_store.add_features(dict(features, id=track_id))
+
+    def fetch_genres_for_artist(self, artist_id: str) -> List[str]:
+        return []
+
+
+class ReplayStorage:
+    def __init__(self, state: Optional[Dict] = None):
+        self.state = state or {}
+
+    def load_model_state(self) -> Dict:
+        return dict(self.state)
+
+    def load_engine_config(self) -> Dict:
+        return {}
+
+    def save_model_state(self, state: Dict):
+        pass
+
+    def append_model_journal(self, entry: Dict):
+        pass
+
+    def load_model_journal(self, after_seq: int = 0) -> List[Dict]:
+        return []
+
+    def save_rating(self, track_id: str, rating: int, rating_data: Dict):
+        pass
+
+    def delete_rating(self, track_id: str) -> bool:
+        return False
+
+
+def roc_auc(scores: np.ndarray, labels: np.ndarray) -> Optional[float]:
+    positives = labels > 0
+    n_pos = int(positives.sum())
+    n_neg = len(labels) - n_pos
+    if n_pos == 0 or n_neg == 0:
+        return None
+
+    order = np.argsort(scores, kind='mergesort')
+    sorted_scores = scores[order]
+    ranks = np.empty(len(scores), dtype=float)
+    start = 0
+    while start < len(sorted_scores):
+        end = start
+        while end + 1 < len(sorted_scores) and sorted_scores[end + 1] == sorted_scores[start]:
+            end += 1
+        ranks[order[start:end + 1]] = (start + end) / 2.0 + 1.0
+        start = end + 1
+
+    return float((ranks[positives].sum() - n_pos * (n_pos + 1) / 2.0) / (n_pos * n_neg))
+
+
+def replay(dataset: ReplayDataset, seed: int = 0, config: Optional[Dict] = None,
+           spotify: Optional[ReplaySpotifyClient] = None) -> Dict:
+    random.seed(seed)
+    np.random.seed(seed)
+
+    spotify = spotify or ReplaySpotifyClient(dataset)
+    engine = LearningEngine(ReplayStorage(), spotify, config=config, seed=seed)
+
+    scores = np.zeros(len(dataset))
+    score_seconds = 0.0
+    update_seconds = 0.0
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            for row, track_id in enumerate(dataset.track_ids):
+                start = time.perf_counter()
+                scores[row] = engine.score_rows(spotify.feature_store, [spotify.get_feature_row(track_id)])[0]
+                score_seconds += time.perf_counter() - start
+
+                start = time.perf_counter()
+                engine.update_with_rating(track_id, int(dataset.ratings[row]))
+                update_seconds += time.perf_counter() - start
+        finally:
+            engine.close()
+
+    total_seconds = score_seconds + update_seconds
+    n = len(dataset)
+    return {
+        'ratings': n,
+        'like_rate': float((dataset.ratings > 0).mean()) if n else 0.0,
+        'auc': roc_auc(scores, dataset.ratings),
+        'ratings_per_second': n / total_seconds if total_seconds > 0 else 0.0,
+        'scores_per_second': n / score_seconds if score_seconds > 0 else 0.0,
+        'updates_per_second': n / update_seconds if update_seconds > 0 else 0.0,
+        'elapsed_s': total_seconds
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay rating history through the learning engine offline")
+    parser.add_argument('--data-dir', default='data', help="Data directory holding ratings.json")
+    parser.add_argument('--profile', default=DEFAULT_PROFILE, help="Profile whose ratings are replayed")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the engine's exploration randomness")
+    parser.add_argument('--config', help="Engine config JSON to evaluate instead of the profile's own")
+    parser.add_argument('--json', action='store_true', help="Print the metrics as JSON")
+    args = parser.parse_args()
+
+    storage = Storage(args.data_dir, profile=args.profile)
+    dataset = ReplayDataset.from_storage(storage)
+    if not len(dataset):
+        print("No ratings with stored features to replay")
+        return
+
+    if args.config:
+        with open(args.config) as file:
+            config = json.load(file)
+    else:
+        config = storage.load_engine_config()
+
+    metrics = replay(dataset, seed=args.seed, config=config)
+
+    if args.json:
+        print(json.dumps(metrics, indent=2))
+        return
+
+    auc = f"{metrics['auc']:.4f}" if metrics['auc'] is not None else "n/a"
+    print(f"Replayed {metrics['ratings']} ratings ({metrics['like_rate']:.0%} likes)")
+    print(f"AUC (like vs dislike): {auc}")
+    print(f"Throughput: {metrics['ratings_per_second']:.0f} ratings/s "
+          f"(score {metrics['scores_per_second']:.0f}/s, update {metrics['updates_per_second']:.0f}/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_TTL_SECONDS = 6 * 3600
+DEFAULT_MAX_QUERIES = 1000
+SEARCH_PAGE_LIMIT = 50
+
+
+def normalize_query(query: str) -> str:
+    return ' '.join(query.lower().split())
+
+
+def compact_track(track: Dict) -> Dict:
+    album = track.get('album') or {}
+    return {
+        'id': track.get('id'),
+        'name': track.get('name'),
+        'uri': track.get('uri'),
+        'popularity': track.get('popularity'),
+        'duration_ms': track.get('duration_ms'),
+        'artists': [{'id': artist.get('id'), 'name': artist.get('name')} for artist in track.get('artists') or []],
+        'album': {'id': album.get('id'), 'name': album.get('name'), 'images': album.get('images') or []}
+    }
+
+
+class SearchCache:
+    def __init__(self, ttl: float = DEFAULT_TTL_SECONDS, max_queries: int = DEFAULT_MAX_QUERIES,
+                 path: Optional[str] = None, save_interval: float = 30.0):
+        self.ttl = ttl
+        self.max_queries = max_queries
+        self.path = path
+        self.save_interval = save_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Tuple[str, str], Dict]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = time.time()
+        if path:
+            self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as file:
+                stored = json.load(file)
+        except Exception as e:
+            print(f"Error loading search cache {self.path}: {e}")
+            return
+
+        now = time.time()
+        for entry in stored.get('entries', []):
+            if now - entry.get('fetched_at', 0) >= self.ttl:
+                continue
+            item_times = {int(position): fetched_at for position, fetched_at in entry.get('item_times', {}).items()}
+            items = {}
+            for position, item in entry.get('items', {}).items():
+                position = int(position)
+                item_times.setdefault(position, entry['fetched_at'])
+                if now - item_times[position] < self.ttl:
+                    items[position] = item
+            self._entries[(entry['query'], entry['type'])] = {
+                'fetched_at': entry['fetched_at'],
+                'total': entry.get('total'),
+                'items': items,
+                'item_times': {position: item_times[position] for position in items}
+            }
+        while len(self._entries) > self.max_queries:
+            self._entries.popitem(last=False)
+
+    def _live_entry(self, key: Tuple[str, str]) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry['fetched_at'] >= self.ttl:
+            del self._entries[key]
+            self._dirty = True
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _fresh(self, entry: Dict, position: int, now: float) -> bool:
+        return position in entry['items'] and now - entry['item_times'][position] < self.ttl
+
+    def get(self, query: str, search_type: str, limit: int, offset: int = 0) -> Optional[List[Dict]]:
+        key = (normalize_query(query), search_type)
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is not None:
+                stop = offset + limit
+                if entry['total'] is not None:
+                    stop = min(stop, entry['total'])
+                positions = range(offset, stop)
+                now = time.time()
+                if all(self._fresh(entry, position, now) for position in positions):
+                    self.hits += 1
+                    return [entry['items'][position] for position in positions]
+            self.misses += 1
+            return None
+
+    def put(self, query: str, search_type: str, offset: int, items: List[Dict], total: Optional[int] = None):
+        key = (normalize_query(query), search_type)
+        with self._lock:
+            now = time.time()
+            entry = self._live_entry(key)
+            if entry is None:
+                entry = self._entries[key] = {'fetched_at': now, 'total': total, 'items': {}, 'item_times': {}}
+            else:
+                entry['fetched_at'] = now
+                if total is not None:
+                    entry['total'] = total
+                for position in [position for position in entry['items'] if not self._fresh(entry, position, now)]:
+                    del entry['items'][position]
+                    del entry['item_times'][position]
+            for position, item in enumerate(items, offset):
+                entry['items'][position] = item
+                entry['item_times'][position] = now
+
+            while len(self._entries) > self.max_queries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def cached_prefix(self, query: str, search_type: str) -> int:
+        with self._lock:
+            entry = self._live_entry((normalize_query(query), search_type))
+            if entry is None:
+                return 0
+            now = time.time()
+            count = 0
+            while self._fresh(entry, count, now):
+                count += 1
+            return count
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'queries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    def save(self, force: bool = False):
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty or (not force and time.time() - self._last_save < self.save_interval):
+                return
+            entries = [{
+                'query': query,
+                'type': search_type,
+                'fetched_at': entry['fetched_at'],
+                'total': entry['total'],
+                'items': {str(position): item for position, item in entry['items'].items()},
+                'item_times': {str(position): fetched_at for position, fetched_at in entry['item_times'].items()}
+            } for (query, search_type), entry in self._entries.items()]
+            self._dirty = False
+            self._last_save = time.time()
+
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, 'w') as file:
+                json.dump({'entries': entries}, file)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            print(f"Error writing search cache {self.path}: {e}")
@@ -0,0 +1,110 @@
+import json
+import urllib.error
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import urlencode
+
+
+class ServiceClient:
+    def __init__(self, base_url: str, timeout: float = 60.0, token: Optional[str] = None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.token = token
+
+    def request(self, method: str, path: str, payload: Optional[Dict] = None) -> Dict:
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=data,
+            method=method,
+            headers=headers
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read() or b'{}')
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get('error', str(e))
+            except Exception:
+                message = str(e)
+            raise RuntimeError(f"Service error on {method} {path}: {message}") from e
+
+
+class RemoteEngine:
+    def __init__(self, client: ServiceClient, profile: Optional[str] = None):
+        self.client = client
+        self.profile = profile
+        self._ratings = ThreadPoolExecutor(max_workers=1, thread_name_prefix="remote-ratings")
+
+    def _get(self, path: str, params: Optional[Dict] = None) -> Dict:
+        params = dict(params or {})
+        if self.profile:
+            params['profile'] = self.profile
+        if params:
+            path += '?' + urlencode(params)
+        return self.client.request('GET', path)
+
+    def _post(self, path: str, payload: Dict) -> Dict:
+        if self.profile:
+            payload = {**payload, 'profile': self.profile}
+        return self.client.request('POST', path, payload)
+
+    def get_recommended_track(self, session_played_tracks: set) -> Optional[Dict]:
+        result = self._post('/recommendation', {'exclude': list(session_played_tracks)})
+        return result.get('track')
+
+    def submit_rating(self, track_id: str, rating: int, is_undo: bool = False, should_count: bool = True) -> Future:
+        return self._ratings.submit(self.update_with_rating, track_id, rating, is_undo, should_count)
+
+    def update_with_rating(self, track_id: str, rating: int, is_undo: bool = False, should_count: bool = True):
+        path = '/undo' if is_undo else '/rate'
+        self._post(path, {
+            'track_id': track_id,
+            'rating': rating,
+            'should_count': should_count
+        })
+
+    def get_genre_leaderboard(self, limit: int = 15) -> List[Dict]:
+        return self._get('/leaderboard', {'limit': limit}).get('genres', [])
+
+    def refresh_playlist(self, session_played_tracks: set, count: int = 25) -> Dict:
+        return self._post('/playlist', {
+            'exclude': list(session_played_tracks),
+            'count': count
+        })
+
+    def get_genre_track(self, genre_name: str, session_played_tracks: set) -> Optional[Dict]:
+        result = self._post('/genre-track', {
+            'genre': genre_name,
+            'exclude': list(session_played_tracks)
+        })
+        return result.get('track')
+
+    def get_session_stats(self) -> Dict:
+        return self._get('/stats')
+
+    def reset_model(self):
+        self._post('/reset', {})
+
+
+class RemoteSpotify:
+    def __init__(self, client: ServiceClient):
+        self.client = client
+
+    def get_current_track(self) -> Optional[Dict]:
+        try:
+            return self.client.request('GET', '/current').get('track')
+        except Exception as exception:
+            print(f"Error fetching current track: {exception}")
+            return None
+
+    def play_track(self, uri: str):
+        try:
+            self.client.request('POST', '/play', {'uri': uri})
+        except Exception as exception:
+            print(f"Error playing track: {exception}")
+
@@ -1,18 +1,47 @@
 import spotipy
 from spotipy.oauth2 import SpotifyOAuth, SpotifyClientCredentials
 import os
-from typing import Optional, Dict, List
+from collections import defaultdict
+from typing import Optional, Dict, List, Tuple, TypedDict
+import queue
+import threading
 import time
+from concurrent.futures import Future
 from dotenv import load_dotenv
 import random
 
+from async_spotify import AsyncSpotifyClient
+from circuit_breaker import CLOSED, CircuitBreaker, CircuitOpenError, parse_retry_after
+from feature_store import FeatureStore
+from features import FALLBACK_VECTOR
+from playlist_sync import DEFAULT_PLAYLIST_SIZE, apply_plan, plan_sync, replace_calls, replace_contents
+from search_cache import SEARCH_PAGE_LIMIT, SearchCache, compact_track
+
 load_dotenv()
 
 
+class TrackCandidate(TypedDict, total=False):
+    id: str
+    name: str
+    artist: str
+    album_cover: Optional[str]
+    uri: str
+    artist_id: Optional[str]
+    artist_ids: List[str]
+    album_id: Optional[str]
+    album_name: Optional[str]
+    popularity: Optional[int]
+
+
 class SpotifyClient:
     PLAYLIST_NAME = "AI Music Discovery - Top Picks"
+    INFLIGHT_TIMEOUT = 60
+    PREFETCH_BATCH_WINDOW = 0.05
+    FEATURE_RETRY_SECONDS = 300
+    NO_FEATURES_TTL = 24 * 3600
+    GENRE_RETRY_SECONDS = 60
 
-    def __init__(self):
+    def __init__(self, storage=None, playlist_size: int = DEFAULT_PLAYLIST_SIZE):
         self.scope = (
             "user-read-currently-playing "
             "user-read-playback-state "
@@ -54,11 +83,42 @@ class SpotifyClient:
         import requests as req_lib
         self._requests = req_lib
 
-        self._feature_cache = {}
         self._track_cache = {}
         self._artist_genre_cache = {}
+        self._track_artists: Dict[str, Optional[str]] = {}
+        self._cache_lock = threading.Lock()
+        self._inflight_features: Dict[str, Future] = {}
+        self._inflight_artists: Dict[str, Future] = {}
+        self._feature_retry_at: Dict[str, float] = {}
+        self._genre_retry_at: Dict[str, float] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {
+            'audio_features': CircuitBreaker('audio_features')
+        }
+        self.auth_breakers = {
+            path: CircuitBreaker(f'{path}_auth', failure_threshold=2, reset_timeout=30.0, max_reset_timeout=1800.0)
+            for path in ('app', 'user')
+        }
+        self._routing: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._routing_lock = threading.Lock()
+        self.prefetch_genres = True
+        self._prefetch_queue: 'queue.Queue[str]' = queue.Queue()
+        self._prefetch_queued = set()
+        self._prefetch_thread: Optional[threading.Thread] = None
+        self._async_api: Optional[AsyncSpotifyClient] = None
         self._user_id = None
         self._playlist_id = None
+        self._playlist_snapshot: Optional[str] = None
+        self._playlist_uris: Optional[List[str]] = None
+        self._playlist_lock = threading.Lock()
+        self.storage = storage
+        self.playlist_size = playlist_size
+        self.search_cache = SearchCache(path=storage.search_cache_file if storage is not None else None)
+        self.feature_store = FeatureStore(path=storage.feature_store_file if storage is not None else None)
+        for track_id in self.feature_store.fallback_track_ids():
+            self._feature_retry_at[track_id] = 0.0
+            self._track_artists[track_id] = self.feature_store.artist_id(self.feature_store.row(track_id))
+        for track_id in self.feature_store.genreless_track_ids():
+            self._genre_retry_at[track_id] = 0.0
 
     def _get_user_id(self) -> str:
         if self._user_id is None:
@@ -84,64 +144,246 @@ class SpotifyClient:
             offset += 50
         return None
 
-    def update_playlist(self, track_uris: List[str]) -> Dict:
-        if not track_uris:
-            return {'success': False, 'error': 'No tracks to add'}
+    def _fetch_playlist_uris(self, playlist_id: str) -> List[str]:
+        uris = []
+        offset = 0
+        while True:
+            page = self.client.playlist_items(playlist_id, fields='items(track(uri)),next',
+                                              limit=100, offset=offset)
+            items = page.get('items', [])
+            uris.extend(item['track']['uri'] for item in items if item.get('track') and item['track'].get('uri'))
+            if not items or not page.get('next'):
+                break
+            offset += 100
+        return uris
+
+    def _remember_playlist(self, playlist_id: str, snapshot_id: Optional[str], uris: List[str]):
+        self._playlist_id = playlist_id
+        self._playlist_snapshot = snapshot_id
+        self._playlist_uris = list(uris)
+        if self.storage is not None:
+            self.storage.save_playlist_handle({
+                'user_id': self._user_id,
+                'playlist_id': playlist_id,
+                'snapshot_id': snapshot_id,
+                'uris': self._playlist_uris
+            })
+
+    def _forget_playlist(self):
+        self._user_id = None
+        self._playlist_snapshot = None
+        self._playlist_uris = None
+        if self.storage is not None:
+            self.storage.clear_playlist_handle()
+
+    def _open_stored_playlist(self) -> bool:
+        handle = self.storage.load_playlist_handle() if self.storage is not None else {}
+        playlist_id = handle.get('playlist_id') or self._playlist_id
+        if not playlist_id:
+            return False
+        if handle.get('user_id') and self._user_id is None:
+            self._user_id = handle['user_id']
 
         try:
-            playlist_id = self._find_existing_playlist()
+            info = self.client.playlist(playlist_id, fields='snapshot_id,owner(id)')
+        except Exception as e:
+            print(f"Stored playlist {playlist_id} is no longer available: {e}")
+            return False
+        if info['owner']['id'] != self._get_user_id():
+            return False
+
+        if handle.get('playlist_id') == playlist_id and handle.get('snapshot_id') == info['snapshot_id']:
+            uris = handle.get('uris', [])
+        else:
+            uris = self._fetch_playlist_uris(playlist_id)
+        self._remember_playlist(playlist_id, info['snapshot_id'], uris)
+        return True
+
+    def _open_playlist(self) -> str:
+        if self._playlist_id and self._playlist_uris is not None:
+            return self._playlist_id
+        if self._open_stored_playlist():
+            return self._playlist_id
 
-            if playlist_id is None:
-                user_id = self._get_user_id()
-                playlist = self.client.user_playlist_create(
-                    user_id,
-                    self.PLAYLIST_NAME,
-                    public=False,
-                    description="Auto-generated by AI Music Discovery. Updated with your top predicted tracks."
-                )
-                playlist_id = playlist['id']
-                self._playlist_id = playlist_id
+        self._forget_playlist()
+        self._playlist_id = None
+        playlist_id = self._find_existing_playlist()
+        if playlist_id is not None:
+            self._remember_playlist(playlist_id, None, self._fetch_playlist_uris(playlist_id))
+            return playlist_id
+
+        playlist = self.client.user_playlist_create(
+            self._get_user_id(),
+            self.PLAYLIST_NAME,
+            public=False,
+            description="Auto-generated by AI Music Discovery. Updated with your top predicted tracks."
+        )
+        self._remember_playlist(playlist['id'], playlist.get('snapshot_id'), [])
+        return playlist['id']
+
+    def _sync_playlist(self, uris: List[str]) -> Dict:
+        playlist_id = self._open_playlist()
+        plan = plan_sync(self._playlist_uris, uris)
+        if plan.calls > replace_calls(len(uris)):
+            snapshot_id = replace_contents(self.client, playlist_id, uris)
+            calls, added, removed = replace_calls(len(uris)), len(uris), len(self._playlist_uris)
+        else:
+            snapshot_id = apply_plan(self.client, playlist_id, plan, self._playlist_snapshot)
+            calls, added, removed = plan.calls, plan.added, len(plan.removals)
+        self._remember_playlist(playlist_id, snapshot_id, uris)
+        return {'api_calls': calls, 'added': added, 'removed': removed}
+
+    def update_playlist(self, track_uris: List[str], max_tracks: Optional[int] = None) -> Dict:
+        if not track_uris:
+            return {'success': False, 'error': 'No tracks to add'}
 
-            valid_uris = [uri for uri in track_uris[:25] if uri and uri.startswith('spotify:track:')]
+        limit = max_tracks or self.playlist_size
+        valid_uris = list(dict.fromkeys(uri for uri in track_uris if uri and uri.startswith('spotify:track:')))[:limit]
+        if not valid_uris:
+            return {'success': False, 'error': 'No valid track URIs'}
 
-            if not valid_uris:
-                return {'success': False, 'error': 'No valid track URIs'}
+        with self._playlist_lock:
+            try:
+                try:
+                    changes = self._sync_playlist(valid_uris)
+                except Exception as e:
+                    print(f"Playlist sync failed, reloading playlist: {e}")
+                    self._forget_playlist()
+                    changes = self._sync_playlist(valid_uris)
+
+                return {
+                    'success': True,
+                    'playlist_id': self._playlist_id,
+                    'track_count': len(valid_uris),
+                    'url': f"https://open.spotify.com/playlist/{self._playlist_id}",
+                    **changes
+                }
+            except Exception as exception:
+                print(f"Error updating playlist: {exception}")
+                return {'success': False, 'error': str(exception)}
+
+    def _count_route(self, endpoint: str, outcome: str):
+        with self._routing_lock:
+            self._routing[endpoint][outcome] += 1
+
+    def _auth_paths(self) -> List[Tuple[str, spotipy.Spotify]]:
+        if self._app_client is self.client:
+            return [('user', self.client)]
+        return [('app', self._app_client), ('user', self.client)]
+
+    def _call_routed(self, endpoint: str, *args):
+        last_error = None
+        for path, client in self._auth_paths():
+            breaker = self.auth_breakers[path]
+            if not breaker.allow():
+                self._count_route(endpoint, f'{path}_skipped')
+                continue
+            try:
+                result = getattr(client, endpoint)(*args)
+            except Exception as e:
+                retry_after = (getattr(e, 'headers', None) or {}).get('Retry-After')
+                breaker.record_failure(str(e), retry_after=parse_retry_after(retry_after))
+                self._count_route(endpoint, f'{path}_failed')
+                last_error = e
+                continue
+            breaker.record_success()
+            self._count_route(endpoint, path)
+            return result
 
-            self.client.playlist_replace_items(playlist_id, valid_uris)
+        if last_error is not None:
+            raise last_error
+        raise CircuitOpenError(f"no healthy auth path for {endpoint}")
 
-            return {
-                'success': True,
-                'playlist_id': playlist_id,
-                'track_count': len(valid_uris),
-                'url': f"https://open.spotify.com/playlist/{playlist_id}"
-            }
-        except Exception as exception:
-            print(f"Error updating playlist: {exception}")
-            return {'success': False, 'error': str(exception)}
+    def routing_status(self) -> Dict:
+        with self._routing_lock:
+            calls = {endpoint: dict(outcomes) for endpoint, outcomes in self._routing.items()}
+        return {
+            'paths': {path: breaker.stats() for path, breaker in self.auth_breakers.items()},
+            'calls': calls
+        }
 
     def _batch_fetch_artist_genres(self, artist_ids: List[str]) -> Dict[str, List[str]]:
-        uncached = [aid for aid in artist_ids if aid and aid not in self._artist_genre_cache]
-        unique_uncached = list(dict.fromkeys(uncached))
+        owned_ids = []
+        pending = {}
+        with self._cache_lock:
+            for aid in dict.fromkeys(artist_ids):
+                if not aid or aid in self._artist_genre_cache:
+                    continue
+                if aid in self._inflight_artists:
+                    pending[aid] = self._inflight_artists[aid]
+                else:
+                    self._inflight_artists[aid] = Future()
+                    owned_ids.append(aid)
 
-        for i in range(0, len(unique_uncached), 50):
-            batch = unique_uncached[i:i + 50]
-            try:
+        try:
+            for i in range(0, len(owned_ids), 50):
+                batch = owned_ids[i:i + 50]
                 try:
-                    artist_results = self._app_client.artists(batch)
-                except Exception:
-                    artist_results = self.client.artists(batch)
-
-                if artist_results and artist_results.get('artists'):
-                    for artist_info in artist_results['artists']:
-                        if artist_info and artist_info.get('id'):
-                            self._artist_genre_cache[artist_info['id']] = artist_info.get('genres', [])
+                    artist_results = self._call_routed('artists', batch)
+
+                    if artist_results and artist_results.get('artists'):
+                        with self._cache_lock:
+                            for artist_info in artist_results['artists']:
+                                if artist_info and artist_info.get('id'):
+                                    self._artist_genre_cache[artist_info['id']] = artist_info.get('genres', [])
+                except CircuitOpenError as e:
+                    print(f"Skipping artist genre fetch: {e}")
+                except Exception as e:
+                    print(f"Error batch fetching artist genres: {e}")
+                    with self._cache_lock:
+                        for aid in batch:
+                            if aid not in self._artist_genre_cache:
+                                self._artist_genre_cache[aid] = []
+        finally:
+            with self._cache_lock:
+                for aid in owned_ids:
+                    self._inflight_artists.pop(aid).set_result(None)
+
+        for aid, future in pending.items():
+            try:
+                future.result(timeout=self.INFLIGHT_TIMEOUT)
             except Exception as e:
-                print(f"Error batch fetching artist genres: {e}")
-                for aid in batch:
-                    if aid not in self._artist_genre_cache:
-                        self._artist_genre_cache[aid] = []
+                print(f"Error waiting for in-flight genres of artist {aid}: {e}")
+
+        with self._cache_lock:
+            return {aid: self._artist_genre_cache.get(aid, []) for aid in artist_ids if aid}
+
+    def prefetch_artist_genres(self, artist_ids: List[str]):
+        if not self.prefetch_genres:
+            return
+        with self._cache_lock:
+            queued = [aid for aid in dict.fromkeys(artist_ids)
+                      if aid and aid not in self._artist_genre_cache
+                      and aid not in self._inflight_artists and aid not in self._prefetch_queued]
+            if not queued:
+                return
+            self._prefetch_queued.update(queued)
+            if self._prefetch_thread is None:
+                self._prefetch_thread = threading.Thread(target=self._run_genre_prefetch, daemon=True)
+                self._prefetch_thread.start()
+        for aid in queued:
+            self._prefetch_queue.put(aid)
+
+    def _run_genre_prefetch(self):
+        while True:
+            batch = [self._prefetch_queue.get()]
+            deadline = time.monotonic() + self.PREFETCH_BATCH_WINDOW
+            while len(batch) < 50:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._prefetch_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
 
-        return {aid: self._artist_genre_cache.get(aid, []) for aid in artist_ids if aid}
+            try:
+                self._batch_fetch_artist_genres(batch)
+            except Exception as e:
+                print(f"Error prefetching artist genres: {e}")
+            finally:
+                with self._cache_lock:
+                    self._prefetch_queued.difference_update(batch)
 
     def _batch_fetch_tracks(self, track_ids: List[str]) -> Dict[str, Dict]:
         results = {}
@@ -150,10 +392,7 @@ class SpotifyClient:
         for i in range(0, len(unique_ids), 50):
             batch = unique_ids[i:i + 50]
             try:
-                try:
-                    tracks_response = self._app_client.tracks(batch)
-                except Exception:
-                    tracks_response = self.client.tracks(batch)
+                tracks_response = self._call_routed('tracks', batch)
 
                 if tracks_response and tracks_response.get('tracks'):
                     for track_info in tracks_response['tracks']:
@@ -164,38 +403,21 @@ class SpotifyClient:
 
         return results
 
-    def _build_feature_result(self, track_id, features, artist_id, genres):
+    def _store_features(self, track_id, features, artist_id, genres) -> int:
         if features:
-            return {
-                'id': track_id,
-                'danceability': features['danceability'],
-                'energy': features['energy'],
-                'valence': features['valence'],
-                'tempo': features['tempo'] / 200.0,
-                'acousticness': features['acousticness'],
-                'instrumentalness': features['instrumentalness'],
-                'speechiness': features['speechiness'],
-                'liveness': features['liveness'],
-                'loudness': (features['loudness'] + 60) / 60.0,
-                'genres': genres,
-                'artist_id': artist_id,
-                'fallback': False
-            }
-        return {
-            'id': track_id,
-            'danceability': 0.5,
-            'energy': 0.5,
-            'valence': 0.5,
-            'tempo': 0.5,
-            'acousticness': 0.5,
-            'instrumentalness': 0.0,
-            'speechiness': 0.5,
-            'liveness': 0.5,
-            'loudness': 0.5,
-            'genres': genres,
-            'artist_id': artist_id,
-            'fallback': True
-        }
+            vector = [
+                features['danceability'],
+                features['energy'],
+                features['valence'],
+                features['tempo'] / 200.0,
+                features['acousticness'],
+                features['instrumentalness'],
+                features['speechiness'],
+                features['liveness'],
+                (features['loudness'] + 60) / 60.0
+            ]
+            return self.feature_store.add(track_id, vector, genres, artist_id, fallback=False)
+        return self.feature_store.add(track_id, FALLBACK_VECTOR, genres, artist_id, fallback=True)
 
     def get_current_track(self) -> Optional[Dict]:
         try:
@@ -211,7 +433,10 @@ class SpotifyClient:
                     'duration_ms': track['duration_ms'],
                     'progress_ms': current['progress_ms']
                 }
-                self._track_cache[track['id']] = track_data
+                with self._cache_lock:
+                    self._track_cache[track['id']] = track_data
+                    if track['artists'] and track['artists'][0].get('id'):
+                        self._track_artists[track['id']] = track['artists'][0]['id']
                 return track_data
             return None
         except Exception as exception:
@@ -219,77 +444,239 @@ class SpotifyClient:
             return None
 
     def get_track_features(self, track_id: str) -> Optional[Dict]:
-        if track_id in self._feature_cache:
-            return self._feature_cache[track_id]
+        row = self.get_feature_row(track_id)
+        return self.feature_store.track_features(row) if row is not None else None
 
-        result = self.get_batch_track_features([track_id])
-        return result.get(track_id)
+    def cache_track_features(self, track_id: str, features: Dict):
+        self.feature_store.add_features(dict(features, id=track_id))
 
     def get_batch_track_features(self, track_ids: List[str]) -> Dict[str, Optional[Dict]]:
+        rows = self.get_feature_rows(track_ids)
+        return {track_id: self.feature_store.track_features(row) for track_id, row in rows.items()}
+
+    def get_feature_row(self, track_id: str) -> Optional[int]:
+        row = self.feature_store.row(track_id)
+        if row is not None and track_id not in self._feature_retry_at and track_id not in self._genre_retry_at:
+            return row
+        return self.get_feature_rows([track_id]).get(track_id)
+
+    def get_feature_rows(self, track_ids: List[str]) -> Dict[str, int]:
         results = {}
-        uncached_ids = []
+        owned_ids = []
+        pending = {}
+        genre_retries = []
+
+        now = time.time()
+        retry_fallbacks = self.breakers['audio_features'].available()
+
+        with self._cache_lock:
+            for track_id in dict.fromkeys(track_ids):
+                row = self.feature_store.row(track_id)
+                if row is not None and retry_fallbacks and self._feature_retry_at.get(track_id, now + 1) <= now:
+                    row = None
+                if row is not None:
+                    results[track_id] = row
+                    if self._genre_retry_at.get(track_id, now + 1) <= now:
+                        genre_retries.append(track_id)
+                elif track_id in self._inflight_features:
+                    pending[track_id] = self._inflight_features[track_id]
+                else:
+                    self._inflight_features[track_id] = Future()
+                    owned_ids.append(track_id)
+
+        if owned_ids:
+            try:
+                fetched = self._fetch_track_features(owned_ids)
+            except BaseException as e:
+                with self._cache_lock:
+                    for track_id in owned_ids:
+                        self._inflight_features.pop(track_id).set_exception(e)
+                raise
+
+            with self._cache_lock:
+                for track_id in owned_ids:
+                    self._inflight_features.pop(track_id).set_result(fetched[track_id])
+            results.update(fetched)
+
+        for track_id, future in pending.items():
+            try:
+                results[track_id] = future.result(timeout=self.INFLIGHT_TIMEOUT)
+            except Exception as e:
+                print(f"Error waiting for in-flight features of {track_id}: {e}")
+
+        if genre_retries and any(breaker.available() for breaker in self.auth_breakers.values()):
+            self._retry_track_genres(genre_retries)
 
-        for track_id in track_ids:
-            if track_id in self._feature_cache:
-                results[track_id] = self._feature_cache[track_id]
-            else:
-                uncached_ids.append(track_id)
+        self.feature_store.save()
+        return results
 
-        if not uncached_ids:
-            return results
+    def _retry_track_genres(self, track_ids: List[str]):
+        store = self.feature_store
+        track_to_artist = {track_id: store.artist_id(store.row(track_id)) for track_id in track_ids}
+        artist_genres = self._batch_fetch_artist_genres([aid for aid in track_to_artist.values() if aid])
+        self._note_genre_results(track_to_artist, artist_genres)
+
+    def _note_genre_results(self, track_to_artist: Dict[str, Optional[str]], artist_genres: Dict[str, List[str]]):
+        now = time.time()
+        with self._cache_lock:
+            for track_id, artist_id in track_to_artist.items():
+                if not artist_id or artist_id in self._artist_genre_cache:
+                    if self._genre_retry_at.pop(track_id, None) is not None:
+                        self.feature_store.set_genres(self.feature_store.row(track_id), artist_genres.get(artist_id, []))
+                else:
+                    self._genre_retry_at[track_id] = now + self.GENRE_RETRY_SECONDS
+
+    def _fetch_track_features(self, unique_uncached: List[str]) -> Dict[str, int]:
+        results = {}
+        features_by_id, without_features = self._fetch_audio_features(unique_uncached)
 
-        unique_uncached = list(dict.fromkeys(uncached_ids))
+        with self._cache_lock:
+            track_to_artist = {track_id: self._track_artists[track_id]
+                               for track_id in unique_uncached if self._track_artists.get(track_id)}
+        unknown = [track_id for track_id in unique_uncached if track_id not in track_to_artist]
 
-        features_by_id = {}
-        for i in range(0, len(unique_uncached), 100):
-            batch = unique_uncached[i:i + 100]
-            if self._app_auth is not None:
-                try:
-                    token = self._app_auth.get_access_token()
-                    headers = {"Authorization": f"Bearer {token}"}
-                    url = "https://api.spotify.com/v1/audio-features"
-                    params = {"ids": ','.join(batch)}
-                    resp = self._requests.get(url, headers=headers, params=params, timeout=15)
-                    if resp.status_code == 200:
-                        feature_list = resp.json().get('audio_features', [])
-                        for tid, feat in zip(batch, feature_list):
-                            if feat:
-                                features_by_id[tid] = feat
-                except Exception:
-                    pass
-
-        track_info_map = self._batch_fetch_tracks(unique_uncached)
-
-        artist_ids_needed = []
-        track_to_artist = {}
-        for track_id in unique_uncached:
+        track_info_map = self._batch_fetch_tracks(unknown) if unknown else {}
+        for track_id in unknown:
             track_info = track_info_map.get(track_id)
             if track_info and track_info.get('artists') and track_info['artists']:
-                artist_id = track_info['artists'][0]['id']
-                track_to_artist[track_id] = artist_id
-                if artist_id not in self._artist_genre_cache:
-                    artist_ids_needed.append(artist_id)
+                track_to_artist[track_id] = track_info['artists'][0]['id']
+                with self._cache_lock:
+                    self._track_artists[track_id] = track_to_artist[track_id]
 
-        if artist_ids_needed:
-            self._batch_fetch_artist_genres(artist_ids_needed)
+        artist_genres = self._batch_fetch_artist_genres(list(track_to_artist.values())) if track_to_artist else {}
 
         for track_id in unique_uncached:
             artist_id = track_to_artist.get(track_id)
-            genres = self._artist_genre_cache.get(artist_id, []) if artist_id else []
+            genres = artist_genres.get(artist_id, []) if artist_id else []
             features = features_by_id.get(track_id)
 
-            result = self._build_feature_result(track_id, features, artist_id, genres)
-            self._feature_cache[track_id] = result
-            results[track_id] = result
+            results[track_id] = self._store_features(track_id, features, artist_id, genres)
+        self._note_genre_results({track_id: track_to_artist.get(track_id) for track_id in unique_uncached}, artist_genres)
+
+        now = time.time()
+        with self._cache_lock:
+            for track_id in unique_uncached:
+                if track_id in features_by_id:
+                    self._feature_retry_at.pop(track_id, None)
+                elif track_id in without_features:
+                    self._feature_retry_at[track_id] = now + self.NO_FEATURES_TTL
+                else:
+                    self._feature_retry_at[track_id] = now + self.FEATURE_RETRY_SECONDS
 
         return results
 
+    def _fetch_audio_features(self, track_ids: List[str]) -> Tuple[Dict[str, Dict], set]:
+        features_by_id = {}
+        without_features = set()
+        if self._app_auth is None:
+            return features_by_id, without_features
+
+        breaker = self.breakers['audio_features']
+        for i in range(0, len(track_ids), 100):
+            batch = track_ids[i:i + 100]
+            if not breaker.allow():
+                break
+            try:
+                token = self._app_auth.get_access_token()
+                headers = {"Authorization": f"Bearer {token}"}
+                url = "https://api.spotify.com/v1/audio-features"
+                params = {"ids": ','.join(batch)}
+                resp = self._requests.get(url, headers=headers, params=params, timeout=15)
+                if resp.status_code != 200:
+                    retry_after = resp.headers.get('Retry-After') if resp.status_code == 429 else None
+                    breaker.record_failure(f"HTTP {resp.status_code}", permanent=resp.status_code in (403, 404),
+                                           retry_after=parse_retry_after(retry_after))
+                    continue
+                feature_list = resp.json().get('audio_features') or []
+            except Exception as e:
+                breaker.record_failure(str(e))
+                continue
+
+            breaker.record_success()
+            for tid, feat in zip(batch, feature_list):
+                if feat:
+                    features_by_id[tid] = feat
+                else:
+                    without_features.add(tid)
+        return features_by_id, without_features
+
+    @property
+    def feature_mode(self) -> str:
+        if self._app_auth is None or self.breakers['audio_features'].state != CLOSED:
+            return 'fallback'
+        return 'full'
+
+    def feature_status(self) -> Dict:
+        with self._cache_lock:
+            awaiting_features = len(self._feature_retry_at)
+            awaiting_genres = len(self._genre_retry_at)
+        return {
+            'mode': self.feature_mode,
+            'tracks_without_features': awaiting_features,
+            'tracks_awaiting_genres': awaiting_genres,
+            'store': self.feature_store.stats(),
+            'breakers': {name: breaker.stats() for name, breaker in self.breakers.items()}
+        }
+
+    def search_tracks(self, query: str, limit: int = SEARCH_PAGE_LIMIT, offset: int = 0,
+                      random_offset: bool = False) -> List[Dict]:
+        limit = min(limit, SEARCH_PAGE_LIMIT)
+        if random_offset:
+            cached = self.search_cache.cached_prefix(query, 'track')
+            offset = random.randint(0, cached - limit) if cached > limit else 0
+        cached = self.search_cache.get(query, 'track', limit, offset)
+        if cached is not None:
+            self._note_search_page(cached)
+            return cached
+
+        results = self.client.search(q=query, type='track', limit=SEARCH_PAGE_LIMIT, offset=offset)
+        page = (results or {}).get('tracks') or {}
+        items = [compact_track(track) for track in page.get('items') or [] if track]
+        total = page.get('total')
+        if len(items) < SEARCH_PAGE_LIMIT:
+            total = offset + len(items) if total is None else min(total, offset + len(items))
+
+        self.search_cache.put(query, 'track', offset, items, total)
+        self.search_cache.save()
+        self._note_search_page(items)
+        return items[:limit]
+
+    @property
+    def async_api(self) -> AsyncSpotifyClient:
+        with self._cache_lock:
+            if self._async_api is None:
+                self._async_api = AsyncSpotifyClient(self)
+            return self._async_api
+
+    def search_many(self, queries: List[str], limit: int = SEARCH_PAGE_LIMIT, timeout: Optional[float] = None,
+                    random_offset: bool = False, limits: Optional[Dict[str, int]] = None) -> Dict[str, List[Dict]]:
+        api = self.async_api
+        return api.run(api.search_many(queries, limit=limit, timeout=timeout, random_offset=random_offset,
+                                       limits=limits))
+
+    def close(self):
+        with self._cache_lock:
+            api, self._async_api = self._async_api, None
+        if api is not None:
+            api.close()
+        self.search_cache.save(force=True)
+        self.feature_store.save(force=True)
+
+    def _note_search_page(self, tracks: List[Dict]):
+        primary_artists = {track['id']: track['artists'][0]['id']
+                           for track in tracks if track.get('id') and track['artists'] and track['artists'][0].get('id')}
+        with self._cache_lock:
+            self._track_artists.update(primary_artists)
+        self.prefetch_artist_genres(list(primary_artists.values()))
+
     def fetch_genres_for_artist(self, artist_id: str) -> List[str]:
         if not artist_id:
             return []
 
-        if artist_id in self._artist_genre_cache:
-            return self._artist_genre_cache[artist_id]
+        with self._cache_lock:
+            cached = self._artist_genre_cache.get(artist_id)
+        if cached is not None:
+            return cached
 
         genre_map = self._batch_fetch_artist_genres([artist_id])
         return genre_map.get(artist_id, [])
@@ -320,11 +707,10 @@ class SpotifyClient:
         year_options = ['2024', '2023', '2022', '2021', '2020', '2019', '2018', '2015', '2010', '2005', '2000', '1995', '1990', '1985', '1980', '1975', '1970']
         year = random.choice(year_options)
 
-        results = self.client.search(q=f"{random_char}% year:{year}", type='track', limit=limit)
-        tracks = results['tracks']['items']
+        tracks = self.search_tracks(f"{random_char}% year:{year}", limit=limit)
 
         if tracks:
-            return self._format_track(random.choice(tracks))
+            return self.format_track(random.choice(tracks))
         return None
 
     def _search_by_genre(self, limit: int) -> Optional[Dict]:
@@ -333,43 +719,51 @@ class SpotifyClient:
                  'alternative', 'punk', 'disco', 'house', 'techno', 'ambient']
         genre = random.choice(genres)
 
-        results = self.client.search(q=f"genre:{genre}", type='track', limit=limit)
-        tracks = results['tracks']['items']
+        tracks = self.search_tracks(f"genre:{genre}", limit=limit)
 
         if tracks:
-            return self._format_track(random.choice(tracks))
+            return self.format_track(random.choice(tracks))
         return None
 
     def _search_by_decade(self, limit: int) -> Optional[Dict]:
         decades = ['2020-2024', '2010-2019', '2000-2009', '1990-1999', '1980-1989', '1970-1979']
         decade = random.choice(decades)
 
-        results = self.client.search(q=f"year:{decade}", type='track', limit=limit)
-        tracks = results['tracks']['items']
+        tracks = self.search_tracks(f"year:{decade}", limit=limit)
 
         if tracks:
-            return self._format_track(random.choice(tracks))
+            return self.format_track(random.choice(tracks))
         return None
 
     def _search_wildcard(self, limit: int) -> Optional[Dict]:
         random_char = random.choice('abcdefghijklmnopqrstuvwxyz')
 
-        results = self.client.search(q=f"{random_char}%", type='track', limit=limit)
-        tracks = results['tracks']['items']
+        tracks = self.search_tracks(f"{random_char}%", limit=limit)
 
         if tracks:
-            return self._format_track(random.choice(tracks))
+            return self.format_track(random.choice(tracks))
         return None
 
-    def _format_track(self, track) -> Dict:
-        track_data = {
+    def format_track(self, track: Dict) -> TrackCandidate:
+        album = track.get('album') or {}
+        images = album.get('images') or []
+        artist_ids = [artist['id'] for artist in track.get('artists', []) if artist.get('id')]
+        track_data: TrackCandidate = {
             'id': track['id'],
-            'name': track['name'],
-            'artist': ', '.join([artist['name'] for artist in track['artists']]),
-            'album_cover': track['album']['images'][0]['url'] if track['album']['images'] else None,
-            'uri': track['uri']
+            'name': track.get('name', 'Unknown'),
+            'artist': ', '.join([artist.get('name', 'Unknown') for artist in track.get('artists', [])]),
+            'album_cover': images[0]['url'] if images else None,
+            'uri': track.get('uri', ''),
+            'artist_id': artist_ids[0] if artist_ids else None,
+            'artist_ids': artist_ids,
+            'album_id': album.get('id'),
+            'album_name': album.get('name'),
+            'popularity': track.get('popularity')
         }
-        self._track_cache[track['id']] = track_data
+        with self._cache_lock:
+            self._track_cache[track['id']] = track_data
+            if artist_ids:
+                self._track_artists[track['id']] = artist_ids[0]
         return track_data
 
     def search_batch_random_tracks(self, count: int = 25) -> List[Dict]:
@@ -380,17 +774,12 @@ class SpotifyClient:
 
         for i in range(searches_needed):
             try:
-                results = self.client.search(
-                    q=self._get_diverse_query(i),
-                    type='track',
-                    limit=50
-                )
-                search_tracks = results['tracks']['items']
+                search_tracks = self.search_tracks(self._get_diverse_query(i), limit=50)
 
                 if search_tracks:
                     for track in search_tracks:
                         if track['id'] not in seen_ids:
-                            track_data = self._format_track(track)
+                            track_data = self.format_track(track)
                             tracks.append(track_data)
                             seen_ids.add(track['id'])
 
@@ -424,6 +813,10 @@ class SpotifyClient:
             print("Make sure you have an active Spotify device (app open on phone/computer)")
 
     def clear_cache(self):
-        self._feature_cache.clear()
-        self._track_cache.clear()
-        self._artist_genre_cache.clear()
\ No newline at end of file
+        with self._cache_lock:
+            self.feature_store.clear()
+            self._track_cache.clear()
+            self._track_artists.clear()
+            self._feature_retry_at.clear()
+            self._genre_retry_at.clear()
+            self._artist_genre_cache.clear()
\ No newline at end of file
@@ -1,24 +1,161 @@
+import bisect
+import gzip
+import hashlib
+import heapq
 import json
 import os
+import re
 import threading
-from typing import Dict, Any
+import zlib
+from collections import defaultdict
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from datetime import datetime
 
+DEFAULT_PROFILE = "default"
+PROFILE_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class RatingIndex:
+    def __init__(self, ratings: Optional[Dict[str, Dict]] = None):
+        self.ratings: Dict[str, Dict] = {}
+        self.by_rating: Dict[int, set] = defaultdict(set)
+        self.by_timestamp: List[Tuple[str, str]] = []
+        self.by_session: Dict[str, set] = defaultdict(set)
+        self.by_artist: Dict[str, set] = defaultdict(set)
+
+        for track_id, record in (ratings or {}).items():
+            self._index(track_id, record)
+        self.by_timestamp.sort()
+
+    def _index(self, track_id: str, record: Dict):
+        self.ratings[track_id] = record
+        self.by_rating[record.get('rating', 0)].add(track_id)
+        self.by_timestamp.append((record.get('timestamp', ''), track_id))
+        if record.get('session_id'):
+            self.by_session[record['session_id']].add(track_id)
+        if record.get('artist_id'):
+            self.by_artist[record['artist_id']].add(track_id)
+
+    def add(self, track_id: str, record: Dict):
+        self.remove(track_id)
+        self.ratings[track_id] = record
+        self.by_rating[record.get('rating', 0)].add(track_id)
+        bisect.insort(self.by_timestamp, (record.get('timestamp', ''), track_id))
+        if record.get('session_id'):
+            self.by_session[record['session_id']].add(track_id)
+        if record.get('artist_id'):
+            self.by_artist[record['artist_id']].add(track_id)
+
+    def remove(self, track_id: str) -> Optional[Dict]:
+        record = self.ratings.pop(track_id, None)
+        if record is None:
+            return None
+
+        self._discard(self.by_rating, record.get('rating', 0), track_id)
+        self._discard(self.by_session, record.get('session_id'), track_id)
+        self._discard(self.by_artist, record.get('artist_id'), track_id)
+
+        key = (record.get('timestamp', ''), track_id)
+        position = bisect.bisect_left(self.by_timestamp, key)
+        if position < len(self.by_timestamp) and self.by_timestamp[position] == key:
+            del self.by_timestamp[position]
+        return record
+
+    @staticmethod
+    def _discard(index: Dict, key, track_id: str):
+        if not key or key not in index:
+            return
+        index[key].discard(track_id)
+        if not index[key]:
+            del index[key]
+
+    def top_rated(self, limit: int, min_rating: int = 1) -> List[Tuple[str, int]]:
+        top = []
+        for rating in sorted((r for r in self.by_rating if r >= min_rating), reverse=True):
+            needed = limit - len(top)
+            if needed <= 0:
+                break
+
+            track_ids = self.by_rating[rating]
+            if len(track_ids) <= 4 * needed:
+                newest = heapq.nlargest(needed, track_ids, key=lambda tid: self.ratings[tid].get('timestamp', ''))
+            else:
+                newest = []
+                for _, track_id in reversed(self.by_timestamp):
+                    if track_id in track_ids:
+                        newest.append(track_id)
+                        if len(newest) >= needed:
+                            break
+
+            top.extend((track_id, rating) for track_id in newest)
+        return top
+
+    def in_time_range(self, start: str = '', end: Optional[str] = None) -> List[str]:
+        low = bisect.bisect_left(self.by_timestamp, (start, ''))
+        if end is None:
+            high = len(self.by_timestamp)
+        else:
+            high = bisect.bisect_left(self.by_timestamp, (end, ''))
+        return [track_id for _, track_id in self.by_timestamp[low:high]]
+
 
 class Storage:
-    def __init__(self, data_dir: str = "data"):
-        self.data_dir = data_dir
-        os.makedirs(data_dir, exist_ok=True)
+    LEGACY_SESSION_SEGMENT = "0000-00-legacy"
+    RATINGS_COMPACT_INTERVAL = 1000
+
+    def __init__(self, data_dir: str = "data", profile: Optional[str] = None, compress_old_sessions: bool = False):
+        self.shared_dir = data_dir
+        self.profile = self.validate_profile_name(profile or DEFAULT_PROFILE)
 
-        self.ratings_file = os.path.join(data_dir, "ratings.json")
-        self.model_state_file = os.path.join(data_dir, "model_state.json")
-        self.track_cache_file = os.path.join(data_dir, "track_cache.json")
-        self.session_history_file = os.path.join(data_dir, "session_history.json")
+        if self.profile == DEFAULT_PROFILE:
+            self.data_dir = data_dir
+        else:
+            self.data_dir = os.path.join(data_dir, "profiles", self.profile)
+        os.makedirs(self.data_dir, exist_ok=True)
+
+        self.ratings_file = os.path.join(self.data_dir, "ratings.json")
+        self.ratings_log_file = os.path.join(self.data_dir, "ratings_log.jsonl")
+        self.model_state_file = os.path.join(self.data_dir, "model_state.json")
+        self.previous_model_state_file = os.path.join(self.data_dir, "model_state.prev.json")
+        self.model_journal_file = os.path.join(self.data_dir, "model_journal.jsonl")
+        self.track_cache_file = os.path.join(self.shared_dir, "track_cache.json")
+        self.engine_config_file = os.path.join(self.data_dir, "engine_config.json")
+        self.shared_engine_config_file = os.path.join(self.shared_dir, "engine_config.json")
+        self.playlist_handle_file = os.path.join(self.shared_dir, "playlist.json")
+        self.search_cache_file = os.path.join(self.shared_dir, "search_cache.json")
+        self.feature_store_file = os.path.join(self.shared_dir, "feature_store.npz")
+        self.session_history_file = os.path.join(self.data_dir, "session_history.json")
+        self.sessions_dir = os.path.join(self.data_dir, "sessions")
+        self.compress_old_sessions = compress_old_sessions
 
         self._ratings_lock = threading.Lock()
         self._model_lock = threading.Lock()
+        self._journal_lock = threading.Lock()
+        self._snapshot_seq = 0
+        self._rotate_snapshot = True
         self._cache_lock = threading.Lock()
         self._session_lock = threading.Lock()
+        self._rating_index: Optional[RatingIndex] = None
+        self._ratings_log_entries = 0
+
+    @staticmethod
+    def validate_profile_name(profile: str) -> str:
+        if not PROFILE_NAME_PATTERN.match(profile):
+            raise ValueError(
+                f"Invalid profile name {profile!r}: use 1-64 letters, digits, '-' or '_'"
+            )
+        return profile
+
+    @staticmethod
+    def list_profiles(data_dir: str = "data") -> List[str]:
+        profiles = [DEFAULT_PROFILE]
+        profiles_dir = os.path.join(data_dir, "profiles")
+        if os.path.isdir(profiles_dir):
+            for name in sorted(os.listdir(profiles_dir)):
+                if PROFILE_NAME_PATTERN.match(name) and os.path.isdir(os.path.join(profiles_dir, name)):
+                    if name != DEFAULT_PROFILE:
+                        profiles.append(name)
+        return profiles
 
     def _safe_read_json(self, filepath: str, default=None):
         if default is None:
@@ -57,28 +194,223 @@ class Storage:
             except Exception:
                 pass
 
+    def _ratings(self) -> RatingIndex:
+        if self._rating_index is None:
+            ratings = self._safe_read_json(self.ratings_file, {})
+            entries, damaged = self._read_journal(self.ratings_log_file)
+            for entry in entries:
+                if entry.get('op') == 'put':
+                    ratings[entry['track_id']] = entry['record']
+                elif entry.get('op') == 'delete':
+                    ratings.pop(entry['track_id'], None)
+            self._rating_index = RatingIndex(ratings)
+            self._ratings_log_entries = len(entries)
+            if damaged:
+                self._compact_ratings()
+        return self._rating_index
+
+    def _log_rating_change(self, entry: Dict[str, Any]):
+        try:
+            with open(self.ratings_log_file, 'a') as file:
+                file.write(self._journal_line(entry))
+        except Exception as e:
+            print(f"Error appending to {self.ratings_log_file}: {e}")
+            self._compact_ratings()
+            return
+        self._ratings_log_entries += 1
+        if self._ratings_log_entries >= self.RATINGS_COMPACT_INTERVAL:
+            self._compact_ratings()
+
+    def _compact_ratings(self):
+        temp_path = self.ratings_file + ".tmp"
+        try:
+            with open(temp_path, 'w') as file:
+                json.dump(self._rating_index.ratings, file, indent=2)
+            os.replace(temp_path, self.ratings_file)
+            if os.path.exists(self.ratings_log_file):
+                os.remove(self.ratings_log_file)
+            self._ratings_log_entries = 0
+        except Exception as e:
+            print(f"Error compacting {self.ratings_file}: {e}")
+
     def load_ratings(self) -> Dict[str, Dict]:
         with self._ratings_lock:
-            return self._safe_read_json(self.ratings_file, {})
+            return dict(self._ratings().ratings)
 
     def save_rating(self, track_id: str, rating: int, rating_data: Dict):
         with self._ratings_lock:
-            ratings = self._safe_read_json(self.ratings_file, {})
-            ratings[track_id] = {
+            record = {
                 'rating': rating,
                 'timestamp': rating_data.get('timestamp', datetime.now().isoformat()),
                 'features': rating_data.get('features', []),
-                'session_id': rating_data.get('session_id', '')
+                'session_id': rating_data.get('session_id', ''),
+                'artist_id': rating_data.get('artist_id'),
+                'primary_genre': rating_data.get('primary_genre')
             }
-            self._safe_write_json(self.ratings_file, ratings)
+            self._ratings().add(track_id, record)
+            self._log_rating_change({'op': 'put', 'track_id': track_id, 'record': record})
+
+    def delete_rating(self, track_id: str) -> bool:
+        with self._ratings_lock:
+            index = self._ratings()
+            if index.remove(track_id) is None:
+                return False
+            self._log_rating_change({'op': 'delete', 'track_id': track_id})
+            return True
+
+    def clear_ratings(self):
+        with self._ratings_lock:
+            self._rating_index = RatingIndex()
+            self._compact_ratings()
+
+    def top_rated(self, limit: int = 50, min_rating: int = 1) -> List[Tuple[str, int]]:
+        with self._ratings_lock:
+            return self._ratings().top_rated(limit, min_rating)
+
+    def ratings_in_range(self, start: str = '', end: Optional[str] = None) -> Dict[str, Dict]:
+        with self._ratings_lock:
+            index = self._ratings()
+            return {track_id: index.ratings[track_id] for track_id in index.in_time_range(start, end)}
+
+    def ratings_for_session(self, session_id: str) -> Dict[str, Dict]:
+        with self._ratings_lock:
+            index = self._ratings()
+            return {track_id: index.ratings[track_id] for track_id in index.by_session.get(session_id, ())}
+
+    def ratings_for_artist(self, artist_id: str) -> Dict[str, Dict]:
+        with self._ratings_lock:
+            index = self._ratings()
+            return {track_id: index.ratings[track_id] for track_id in index.by_artist.get(artist_id, ())}
+
+    @staticmethod
+    def _checksum(payload: Dict[str, Any]) -> str:
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+    def _read_model_snapshot(self, filepath: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(filepath, 'r') as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Unreadable model snapshot {filepath}: {e}")
+            return None
+
+        if not isinstance(state, dict):
+            print(f"Unexpected model snapshot format in {filepath}")
+            return None
+        checksum = state.pop('checksum', None)
+        if checksum is not None and checksum != self._checksum(state):
+            print(f"Checksum mismatch in model snapshot {filepath}")
+            return None
+        return state
 
     def load_model_state(self) -> Dict[str, Any]:
         with self._model_lock:
-            return self._safe_read_json(self.model_state_file, {})
+            state = self._read_model_snapshot(self.model_state_file)
+            self._rotate_snapshot = state is not None or not os.path.exists(self.model_state_file)
+            if state is None:
+                state = self._read_model_snapshot(self.previous_model_state_file)
+                if state is not None:
+                    print(f"Recovered model from previous snapshot {self.previous_model_state_file}")
+            state = state or {}
+            self._snapshot_seq = int(state.get('journal_seq', 0))
+            return state
 
     def save_model_state(self, state: Dict[str, Any]):
         with self._model_lock:
-            self._safe_write_json(self.model_state_file, state)
+            payload = dict(state)
+            payload['checksum'] = self._checksum(state)
+            if self._rotate_snapshot and os.path.exists(self.model_state_file):
+                os.replace(self.model_state_file, self.previous_model_state_file)
+            self._safe_write_json(self.model_state_file, payload)
+            self._rotate_snapshot = True
+            keep_after, self._snapshot_seq = self._snapshot_seq, int(state.get('journal_seq', 0))
+        self._compact_model_journal(min(keep_after, self._snapshot_seq))
+
+    def clear_model_state(self):
+        with self._model_lock, self._journal_lock:
+            for filepath in (self.model_state_file, self.previous_model_state_file, self.model_journal_file):
+                try:
+                    os.remove(filepath)
+                except FileNotFoundError:
+                    pass
+            self._snapshot_seq = 0
+            self._rotate_snapshot = True
+
+    @staticmethod
+    def _journal_line(entry: Dict[str, Any]) -> str:
+        body = json.dumps(entry, sort_keys=True, separators=(',', ':'))
+        return json.dumps({'crc': zlib.crc32(body.encode('utf-8')), 'entry': entry}, separators=(',', ':')) + '\n'
+
+    def append_model_journal(self, entry: Dict[str, Any]):
+        line = self._journal_line(entry)
+        with self._journal_lock:
+            with open(self.model_journal_file, 'a') as file:
+                file.write(line)
+                file.flush()
+                os.fsync(file.fileno())
+
+    def _read_journal(self, filepath: str) -> Tuple[List[Dict[str, Any]], bool]:
+        entries = []
+        try:
+            with open(filepath, 'r') as file:
+                for line_number, line in enumerate(file, 1):
+                    try:
+                        record = json.loads(line)
+                        entry = record['entry']
+                        body = json.dumps(entry, sort_keys=True, separators=(',', ':'))
+                        if zlib.crc32(body.encode('utf-8')) != record['crc']:
+                            raise ValueError("checksum mismatch")
+                    except Exception as e:
+                        print(f"Journal {filepath} is damaged at line {line_number} ({e}); dropping the rest")
+                        return entries, True
+                    entries.append(entry)
+        except FileNotFoundError:
+            pass
+        return entries, False
+
+    def _write_model_journal(self, entries: List[Dict[str, Any]]):
+        temp_path = self.model_journal_file + ".tmp"
+        with open(temp_path, 'w') as file:
+            file.writelines(self._journal_line(entry) for entry in entries)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.model_journal_file)
+
+    def load_model_journal(self, after_seq: int = 0) -> List[Dict[str, Any]]:
+        with self._journal_lock:
+            entries, damaged = self._read_journal(self.model_journal_file)
+            if damaged:
+                self._write_model_journal(entries)
+        return [entry for entry in entries if entry.get('seq', 0) > after_seq]
+
+    def _compact_model_journal(self, keep_after: int):
+        with self._journal_lock:
+            entries, _ = self._read_journal(self.model_journal_file)
+            kept = [entry for entry in entries if entry.get('seq', 0) > keep_after]
+            if len(kept) < len(entries):
+                self._write_model_journal(kept)
+
+    def load_engine_config(self) -> Dict[str, float]:
+        if os.path.exists(self.engine_config_file):
+            return self._safe_read_json(self.engine_config_file, {})
+        return self._safe_read_json(self.shared_engine_config_file, {})
+
+    def save_engine_config(self, config: Dict[str, float]):
+        self._safe_write_json(self.engine_config_file, config)
+
+    def load_playlist_handle(self) -> Dict[str, Any]:
+        return self._safe_read_json(self.playlist_handle_file, {})
+
+    def save_playlist_handle(self, handle: Dict[str, Any]):
+        self._safe_write_json(self.playlist_handle_file, handle)
+
+    def clear_playlist_handle(self):
+        try:
+            os.remove(self.playlist_handle_file)
+        except FileNotFoundError:
+            pass
 
     def cache_track(self, track_id: str, track_data: Dict):
         with self._cache_lock:
@@ -90,12 +422,89 @@ class Storage:
         with self._cache_lock:
             return self._safe_read_json(self.track_cache_file, {})
 
+    def _session_segment_path(self, segment: str) -> str:
+        return os.path.join(self.sessions_dir, f"{segment}.jsonl")
+
+    def _migrate_legacy_sessions(self):
+        if not os.path.exists(self.session_history_file):
+            return
+
+        sessions = self._safe_read_json(self.session_history_file, [])
+        os.makedirs(self.sessions_dir, exist_ok=True)
+        if sessions:
+            with open(self._session_segment_path(self.LEGACY_SESSION_SEGMENT), 'a') as file:
+                for session in sessions:
+                    file.write(json.dumps(session) + '\n')
+        try:
+            os.replace(self.session_history_file, self.session_history_file + ".migrated")
+        except Exception as e:
+            print(f"Error retiring {self.session_history_file}: {e}")
+
+    def _session_segments(self) -> List[str]:
+        if not os.path.isdir(self.sessions_dir):
+            return []
+        segments = [name for name in os.listdir(self.sessions_dir)
+                    if name.endswith('.jsonl') or name.endswith('.jsonl.gz')]
+        return [os.path.join(self.sessions_dir, name) for name in sorted(segments)]
+
     def save_session(self, session_data: Dict):
         with self._session_lock:
-            sessions = self._safe_read_json(self.session_history_file, [])
-            sessions.append(session_data)
-            self._safe_write_json(self.session_history_file, sessions)
+            self._migrate_legacy_sessions()
+            os.makedirs(self.sessions_dir, exist_ok=True)
 
-    def load_sessions(self) -> list:
+            segment_path = self._session_segment_path(datetime.now().strftime('%Y-%m'))
+            is_new_segment = not os.path.exists(segment_path)
+            with open(segment_path, 'a') as file:
+                file.write(json.dumps(session_data) + '\n')
+
+            if is_new_segment and self.compress_old_sessions:
+                self._compress_session_segments(keep=segment_path)
+
+    def compress_session_segments(self):
         with self._session_lock:
-            return self._safe_read_json(self.session_history_file, [])
\ No newline at end of file
+            current = self._session_segment_path(datetime.now().strftime('%Y-%m'))
+            self._compress_session_segments(keep=current)
+
+    def _compress_session_segments(self, keep: str):
+        for segment_path in self._session_segments():
+            if segment_path == keep or not segment_path.endswith('.jsonl'):
+                continue
+
+            compressed_path = segment_path + ".gz"
+            temp_path = compressed_path + ".tmp"
+            try:
+                with open(segment_path, 'rb') as source, gzip.open(temp_path, 'wb') as target:
+                    target.write(source.read())
+                os.replace(temp_path, compressed_path)
+                os.remove(segment_path)
+            except Exception as e:
+                print(f"Error compressing {segment_path}: {e}")
+                try:
+                    os.remove(temp_path)
+                except Exception:
+                    pass
+
+    def iter_sessions(self) -> Iterator[Dict]:
+        with self._session_lock:
+            self._migrate_legacy_sessions()
+            segments = self._session_segments()
+
+        for segment_path in segments:
+            opener = gzip.open if segment_path.endswith('.gz') else open
+            try:
+                with opener(segment_path, 'rt') as file:
+                    for line_number, line in enumerate(file, 1):
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            yield json.loads(line)
+                        except (json.JSONDecodeError, ValueError) as e:
+                            print(f"Skipping corrupt session record {segment_path}:{line_number}: {e}")
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                print(f"Error reading {segment_path}: {e}")
+
+    def load_sessions(self) -> list:
+        return list(self.iter_sessions())
\ No newline at end of file
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from learning_engine import LearningEngine
+from replay_evaluator import ReplayDataset, ReplaySpotifyClient
+from storage import Storage
+
+
+def make_dataset(vectors, genres=None, artists=None):
+    track_ids = [f"t{i}" for i in range(len(vectors))]
+    return ReplayDataset(
+        track_ids,
+        np.array(vectors, dtype=float),
+        np.ones(len(vectors), dtype=np.int8),
+        genres or [['rock'] for _ in vectors],
+        artists or [f"a{i}" for i in range(len(vectors))]
+    )
+
+
+@pytest.fixture
+def engine_factory(tmp_path):
+    engines = []
+
+    def factory(dataset, config=None, **kwargs):
+        engine = LearningEngine(Storage(str(tmp_path), **kwargs), ReplaySpotifyClient(dataset), config=config, seed=0)
+        engines.append(engine)
+        return engine
+
+    yield factory
+    for engine in engines:
+        engine.close()
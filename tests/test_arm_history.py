@@ -0,0 +1,44 @@
+import random
+from collections import deque
+
+from arm_history import ArmHistory
+
+
+def test_ring_matches_a_bounded_deque():
+    rng = random.Random(2)
+    history = ArmHistory(maxlen=8)
+    reference = deque(maxlen=8)
+    for _ in range(2000):
+        operation = rng.random()
+        outcome = float(rng.random() < 0.6)
+        if operation < 0.6:
+            history.append(outcome)
+            reference.append(outcome)
+        elif operation < 0.8 and reference:
+            assert history.pop() == reference.pop()
+        elif operation < 0.9:
+            history.appendleft(outcome)
+            if len(reference) < reference.maxlen:
+                reference.appendleft(outcome)
+
+        assert list(history) == list(reference)
+        assert history.oldest() == (reference[0] if reference else None)
+        for count in (1, 5, 10):
+            recent = list(reference)[-count:]
+            assert history.recent_mean(count) == (sum(recent) / len(recent) if recent else 0.0)
+
+
+def test_ring_evicts_the_oldest_outcome_at_maxlen_and_round_trips():
+    history = ArmHistory([1.0] + [0.0] * 49)
+    assert len(history) == 50 and history.oldest() == 1.0
+
+    history.append(1.0)
+    assert len(history) == 50
+    assert list(history) == [0.0] * 49 + [1.0]
+
+    history.appendleft(1.0)
+    assert list(history) == [0.0] * 49 + [1.0]
+
+    assert ArmHistory.from_state(history.to_state()) == history
+    assert ArmHistory.from_state({'history': [1, 0, 1]}) == ArmHistory([1.0, 0.0, 1.0])
+    assert list(ArmHistory.from_state({'history_bits': 0b1111, 'history_length': 2})) == [1.0, 1.0]
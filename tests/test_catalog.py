@@ -0,0 +1,43 @@
+import json
+
+import numpy as np
+
+from catalog import TrackCatalog, normalize_audio_features, read_records
+from features import FALLBACK_VECTOR
+
+RAW_FEATURES = {'danceability': 0.7, 'energy': 0.6, 'valence': 0.3, 'tempo': 120.0, 'acousticness': 0.1,
+                'instrumentalness': 0.0, 'speechiness': 0.05, 'liveness': 0.2, 'loudness': -6.0}
+
+
+def test_catalog_round_trips_through_memory_mapped_files(tmp_path):
+    records = [
+        dict(RAW_FEATURES, id='t1', artist_id='artistB', genres=['indie rock', 'rock'], name='One', artist='B'),
+        dict(RAW_FEATURES, id='t2', artist_id='artistA', genres='k-pop;pop', energy=0.9, uri='spotify:track:t2'),
+        {'id': 't3', 'artist_id': 'artistB', 'name': 'No features'},
+        {'id': 'x' * 30, 'artist_id': 'artistC'},
+        dict(RAW_FEATURES, id='t4')
+    ]
+    source = tmp_path / 'tracks.jsonl'
+    source.write_text('\n'.join(json.dumps(record) for record in records) + '\nnot json\n')
+
+    TrackCatalog.build(str(tmp_path / 'catalog'), read_records(str(source)))
+    catalog = TrackCatalog(str(tmp_path / 'catalog'))
+
+    assert len(catalog) == 4
+    assert isinstance(catalog.features, np.memmap)
+    assert [catalog.track_id(row) for row in range(4)] == ['t1', 't2', 't3', 't4']
+    assert np.allclose(catalog.features[0], normalize_audio_features(records[0]))
+    assert np.allclose(catalog.features[2], FALLBACK_VECTOR)
+    assert catalog.fallback.tolist() == [0, 0, 1, 0]
+
+    first, second, third, fourth = [catalog.track_features(row) for row in range(4)]
+    assert (first['genres'], first['artist_id']) == (['indie rock'], 'artistB')
+    assert (second['genres'], second['artist_id']) == (['k-pop'], 'artistA')
+    assert (third['genres'], third['artist_id'], third['fallback']) == ([], 'artistB', True)
+    assert (fourth['genres'], fourth['artist_id']) == ([], None)
+    assert np.isclose(second['energy'], 0.9)
+
+    assert catalog.artist_rows(['artistA', 'artistB', 'missing']) == {'artistA': 0, 'artistB': 1}
+    assert catalog.track(0) == {'id': 't1', 'name': 'One', 'artist': 'B', 'album_cover': None, 'uri': 'spotify:track:t1'}
+    assert catalog.track(1)['uri'] == 'spotify:track:t2'
+    assert [offset for offset, *_ in catalog.iter_chunks(chunk_rows=3)] == [0, 3]
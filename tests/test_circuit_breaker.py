@@ -0,0 +1,22 @@
+from circuit_breaker import CLOSED, OPEN, CircuitBreaker
+
+
+def test_a_single_throttled_call_opens_for_retry_after():
+    breaker = CircuitBreaker('audio-features', failure_threshold=3, reset_timeout=60.0)
+    breaker.record_failure("HTTP 429", retry_after=5.0)
+
+    assert breaker.state == OPEN
+    assert breaker.reset_timeout == 5.0
+    assert not breaker.allow()
+    assert 4.0 < breaker.stats()['retry_in_s'] <= 5.0
+
+
+def test_plain_failures_wait_for_the_threshold():
+    breaker = CircuitBreaker('audio-features', failure_threshold=3)
+    breaker.record_failure("timeout")
+    breaker.record_failure("timeout")
+    assert breaker.state == CLOSED
+
+    breaker.record_failure("timeout")
+    assert breaker.state == OPEN
+    assert breaker.reset_timeout == 60.0
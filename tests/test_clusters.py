@@ -0,0 +1,61 @@
+import numpy as np
+
+from conftest import make_dataset
+from learning_engine import LearningEngine
+from replay_evaluator import ReplaySpotifyClient
+from storage import Storage
+
+
+def test_undo_out_of_order_removes_the_right_clusters(engine_factory):
+    vectors = [[0.1] * 9, [0.5] * 9, [0.9] * 9]
+    engine = engine_factory(make_dataset(vectors))
+    for track_id in ('t0', 't1', 't2'):
+        engine.update_with_rating(track_id, 1)
+    assert len(engine.cluster_counts) == 3
+
+    engine.update_with_rating('t1', 1, is_undo=True)
+    engine.update_with_rating('t2', 1, is_undo=True)
+
+    assert engine.cluster_counts.tolist() == [1.0]
+    assert np.allclose(engine.cluster_centroids, [vectors[0]], atol=1e-6)
+
+
+def test_undo_of_an_update_matches_never_rating_it(engine_factory):
+    vectors = [[0.1] * 9, [0.9] * 9, [0.12] * 9, [0.88] * 9]
+    engine = engine_factory(make_dataset(vectors))
+    for track_id in ('t0', 't1', 't2', 't3'):
+        engine.update_with_rating(track_id, 1)
+    assert engine.cluster_counts.tolist() == [2.0, 2.0]
+
+    engine.update_with_rating('t0', 1, is_undo=True)
+    engine.update_with_rating('t3', 1, is_undo=True)
+
+    assert engine.cluster_counts.tolist() == [1.0, 1.0]
+    assert np.allclose(engine.cluster_centroids, [vectors[1], vectors[2]], atol=1e-6)
+
+
+def test_cluster_ids_after_undo_match_never_rating_it_and_survive_restart(tmp_path, engine_factory):
+    vectors = [[0.1] * 9, [0.5] * 9, [0.9] * 9, [0.12] * 9]
+    dataset = make_dataset(vectors)
+    engine = engine_factory(dataset)
+    for track_id in ('t0', 't1', 't2', 't3'):
+        engine.update_with_rating(track_id, 1)
+    assert engine.cluster_ids == [0, 1, 2]
+
+    engine.update_with_rating('t1', 1, is_undo=True)
+
+    reference = engine_factory(dataset, profile='reference')
+    for track_id in ('t0', 't2', 't3'):
+        reference.update_with_rating(track_id, 1)
+    assert engine.cluster_ids == reference.cluster_ids == [0, 1]
+    assert engine._next_cluster_id == reference._next_cluster_id == 2
+    assert np.allclose(engine.cluster_centroids, reference.cluster_centroids)
+
+    restarted = LearningEngine(Storage(str(tmp_path)), ReplaySpotifyClient(dataset), seed=0)
+    try:
+        assert restarted.cluster_ids == engine.cluster_ids
+        assert np.allclose(restarted.cluster_centroids, engine.cluster_centroids)
+        restarted.update_with_rating('t1', 1)
+        assert restarted.cluster_ids == [0, 1, 2]
+    finally:
+        restarted.close()
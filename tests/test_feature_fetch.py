@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def spotify(monkeypatch):
+    monkeypatch.setenv('SPOTIFY_CLIENT_ID', 'id')
+    monkeypatch.setenv('SPOTIFY_CLIENT_SECRET', 'secret')
+    from spotify_client import SpotifyClient
+    client = SpotifyClient()
+    client._app_auth = None
+    client.prefetch_genres = False
+    yield client
+    client.close()
+
+
+def test_concurrent_requests_share_one_fetch(spotify, monkeypatch):
+    calls = []
+
+    def slow_fetch(track_ids):
+        calls.append(list(track_ids))
+        time.sleep(0.2)
+        return {track_id: spotify._store_features(track_id, None, 'a1', ['rock']) for track_id in track_ids}
+
+    monkeypatch.setattr(spotify, '_fetch_track_features', slow_fetch)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def request():
+        barrier.wait()
+        results.append(spotify.get_feature_rows(['t1', 't2']))
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert calls == [['t1', 't2']]
+    assert len(results) == 8
+    assert all(result == results[0] for result in results)
+    assert spotify._inflight_features == {}
+
+
+def test_waiters_see_the_owner_fail_and_the_next_call_retries(spotify, monkeypatch):
+    calls = []
+    started = threading.Event()
+
+    def failing_fetch(track_ids):
+        calls.append(list(track_ids))
+        started.set()
+        time.sleep(0.2)
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(spotify, '_fetch_track_features', failing_fetch)
+    errors = []
+
+    def owner():
+        try:
+            spotify.get_feature_rows(['t1'])
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=owner)
+    thread.start()
+    started.wait(5)
+    assert spotify.get_feature_rows(['t1']) == {}
+    thread.join(5)
+
+    assert len(errors) == 1 and calls == [['t1']]
+    assert spotify._inflight_features == {}
+    monkeypatch.setattr(spotify, '_fetch_track_features',
+                        lambda track_ids: {track_id: spotify._store_features(track_id, None, None, []) for track_id in track_ids})
+    assert 't1' in spotify.get_feature_rows(['t1'])
@@ -0,0 +1,26 @@
+from benchmarks import _legacy_get_parent_genre, _legacy_is_cultural_variant
+from genre_taxonomy import GenreTaxonomy
+
+UNKNOWN_GENRES = ['k-pop', 'J-Rock', 'bedroom pop', 'chamber psych', 'vapor soul', 'hyperpop', 'Modern Rock',
+                  'german hip hop', 'indie soul', 'mandopop', 'lo-fi beats', 'C-Pop', 'britpop', 'zzz', '']
+
+
+def test_compiled_lookups_match_the_legacy_functions():
+    taxonomy = GenreTaxonomy()
+    known = list(taxonomy.subgenre_to_parent)
+    genres = known + [genre.upper() for genre in known[::7]] + list(taxonomy.taxonomy) + UNKNOWN_GENRES
+
+    for genre in genres:
+        parent = _legacy_get_parent_genre(genre)
+        assert taxonomy.get_parent_genre(genre) == parent, genre
+        assert taxonomy.should_aggregate(genre) == (parent is not None), genre
+        assert taxonomy.is_cultural_variant(genre) == _legacy_is_cultural_variant(genre), genre
+        assert taxonomy.normalize_genre_for_display(genre) == (parent or genre.title()), genre
+
+
+def test_case_variants_share_one_genre_id():
+    taxonomy = GenreTaxonomy()
+    genre_id = taxonomy.genre_id('Vapor Soul')
+    assert taxonomy.genre_id('vapor soul') == taxonomy.genre_id('VAPOR SOUL') == genre_id
+    assert taxonomy.genre_name(genre_id) == 'vapor soul'
+    assert taxonomy.lookup('Vapor Soul') is taxonomy.lookup('vapor soul')
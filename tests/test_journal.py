@@ -0,0 +1,46 @@
+import json
+
+import numpy as np
+
+from conftest import make_dataset
+from learning_engine import LearningEngine
+from replay_evaluator import ReplaySpotifyClient
+from storage import Storage
+
+
+def model_state(engine):
+    return json.dumps({
+        'genres': {key: (arm['alpha'], arm['beta'], list(arm['history'])) for key, arm in sorted(engine.genre_scores.items())},
+        'artists': {key: (arm['alpha'], arm['beta'], list(arm['history'])) for key, arm in sorted(engine.artist_scores.items())},
+        'global_mean': engine.global_feature_mean.tolist(),
+        'recent_mean': engine.recent_feature_mean.tolist(),
+        'centroids': engine.cluster_centroids.tolist(),
+        'counts': engine.cluster_counts.tolist(),
+        'cluster_ids': engine.cluster_ids,
+        'exploration_rate': engine.exploration_rate,
+        'total_ratings': engine.total_ratings,
+        'journal_seq': engine._journal_seq
+    })
+
+
+def test_recovery_replays_undo_across_a_snapshot(tmp_path, engine_factory):
+    rng = np.random.default_rng(7)
+    count = LearningEngine.SNAPSHOT_INTERVAL + 10
+    dataset = make_dataset(rng.random((count, 9)).tolist(),
+                           genres=[['rock'] if i % 2 else ['jazz'] for i in range(count)],
+                           artists=[f"a{i % 7}" for i in range(count)])
+    engine = engine_factory(dataset)
+    for i in range(LearningEngine.SNAPSHOT_INTERVAL):
+        engine.update_with_rating(f"t{i}", 1 if i % 3 else -1)
+    assert engine._snapshot_seq == LearningEngine.SNAPSHOT_INTERVAL
+
+    engine.update_with_rating(f"t{LearningEngine.SNAPSHOT_INTERVAL - 1}", 1, is_undo=True)
+    engine.update_with_rating(f"t{LearningEngine.SNAPSHOT_INTERVAL}", 1)
+    engine.update_with_rating("t10", 1, is_undo=True)
+    live = model_state(engine)
+
+    recovered = LearningEngine(Storage(str(tmp_path)), ReplaySpotifyClient(dataset), seed=0)
+    try:
+        assert model_state(recovered) == live
+    finally:
+        recovered.close()
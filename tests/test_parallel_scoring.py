@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from catalog import TrackCatalog
+from conftest import make_dataset
+from features import FEATURE_NAMES
+from learning_engine import score_feature_block
+from parallel_scoring import ParallelScorer
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    rng = np.random.default_rng(3)
+    records = [dict(zip(FEATURE_NAMES, rng.random(len(FEATURE_NAMES)).tolist()), id=f"c{i}",
+                    genre=f"genre{i % 7}", artist_id=f"artist{i % 40}") for i in range(3000)]
+    return TrackCatalog.build(str(tmp_path / 'catalog'), records, normalized=True)
+
+
+def exhaustive_top_rows(scorer, catalog, model, limit, seed):
+    ranges = scorer._ranges(len(catalog))
+    seeds = np.random.SeedSequence(seed).generate_state(len(ranges), dtype=np.uint64)
+    scores = np.concatenate([
+        score_feature_block(model, catalog.features[start:stop], catalog.genre_ids[start:stop],
+                            catalog.artist_idx[start:stop], catalog.fallback[start:stop],
+                            np.random.default_rng(int(chunk_seed)))
+        for (start, stop), chunk_seed in zip(ranges, seeds)
+    ])
+    return sorted(((float(score), row) for row, score in enumerate(scores)), reverse=True)[:limit]
+
+
+def test_parallel_top_rows_match_serial_top_rows(engine_factory, catalog):
+    engine = engine_factory(make_dataset([[0.2] * 9, [0.8] * 9], genres=[['genre1'], ['genre4']]))
+    engine.update_with_rating('t0', 1)
+    engine.update_with_rating('t1', -1)
+    models = [engine.build_scoring_model(catalog)]
+    engine.update_with_rating('t1', 1)
+    models.append(engine.build_scoring_model(catalog))
+
+    serial = ParallelScorer(workers=1, chunk_rows=256)
+    parallel = ParallelScorer(workers=2, chunk_rows=256)
+    try:
+        for seed, model in enumerate(models):
+            expected = exhaustive_top_rows(serial, catalog, model, 25, seed)
+            assert serial.top_rows(catalog, model, 25, seed=seed) == expected
+            assert parallel.top_rows(catalog, model, 25, seed=seed) == expected
+    finally:
+        serial.close()
+        parallel.close()
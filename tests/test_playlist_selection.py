@@ -0,0 +1,37 @@
+from collections import Counter
+
+import numpy as np
+
+from benchmarks import _pairwise_mmr_select
+from playlist_selection import DEFAULT_ARTIST_CAP, default_genre_cap, mmr_select
+
+
+def random_candidates(seed, size=300):
+    rng = np.random.default_rng(seed)
+    relevance = rng.random(size)
+    features = rng.random((size, 9))
+    artist_keys = [f"artist{i}" for i in rng.integers(0, 20, size)]
+    genre_keys = [f"genre{i}" for i in rng.integers(0, 6, size)]
+    return relevance, features, artist_keys, genre_keys
+
+
+def test_selection_respects_artist_and_genre_caps():
+    for seed in range(5):
+        relevance, features, artist_keys, genre_keys = random_candidates(seed)
+        picks = mmr_select(relevance, features, 25, artist_keys=artist_keys, genre_keys=genre_keys)
+
+        assert len(picks) == len(set(picks)) == 25
+        assert max(Counter(artist_keys[i] for i in picks).values()) <= DEFAULT_ARTIST_CAP
+        assert max(Counter(genre_keys[i] for i in picks).values()) <= default_genre_cap(25)
+        assert picks == _pairwise_mmr_select(relevance.tolist(), features.tolist(), 25, artist_keys, genre_keys)
+
+
+def test_caps_are_relaxed_once_every_candidate_is_capped():
+    relevance = [0.9, 0.8, 0.7, 0.6, 0.1]
+    features = np.eye(5, 9)
+    artist_keys = ['a', 'a', 'a', 'a', 'b']
+
+    picks = mmr_select(relevance, features, 5, artist_keys=artist_keys)
+
+    assert picks[:3] == [0, 1, 4]
+    assert sorted(picks) == [0, 1, 2, 3, 4]
@@ -0,0 +1,65 @@
+import random
+
+from playlist_sync import apply_plan, plan_sync
+
+
+class FakePlaylist:
+    def __init__(self, uris):
+        self.uris = list(uris)
+        self.calls = 0
+
+    def playlist_remove_specific_occurrences_of_items(self, playlist_id, items, snapshot_id=None):
+        self.calls += 1
+        doomed = {position for item in items for position in item['positions']}
+        for item in items:
+            for position in item['positions']:
+                assert self.uris[position] == item['uri']
+        self.uris = [uri for position, uri in enumerate(self.uris) if position not in doomed]
+        return {'snapshot_id': f"s{self.calls}"}
+
+    def playlist_add_items(self, playlist_id, uris, position=None):
+        self.calls += 1
+        self.uris[position:position] = uris
+        return {'snapshot_id': f"s{self.calls}"}
+
+
+def synced(current, target):
+    plan = plan_sync(current, target)
+    playlist = FakePlaylist(current)
+    apply_plan(playlist, 'playlist', plan, 's0')
+    assert playlist.uris == list(target)
+    assert playlist.calls == plan.calls
+    return plan
+
+
+def test_small_edits_produce_minimal_plans():
+    current = [f"u{i}" for i in range(10)]
+
+    assert synced(current, current) == ([], [])
+
+    moved = current[:2] + current[3:8] + [current[2]] + current[8:]
+    plan = synced(current, moved)
+    assert (len(plan.removals), plan.added, plan.calls) == (1, 1, 2)
+
+    plan = synced(current, current[:4] + ['new'] + current[4:])
+    assert (plan.removals, plan.additions) == ([], [(4, ['new'])])
+
+    plan = synced(current, current[:3] + current[4:])
+    assert (plan.removals, plan.additions) == ([('u3', 3)], [])
+
+
+def test_random_edits_keep_the_longest_ordered_run():
+    rng = random.Random(5)
+    for _ in range(200):
+        current = rng.sample([f"u{i}" for i in range(40)], rng.randint(0, 30))
+        current += rng.sample(current, min(len(current), rng.randint(0, 2)))
+        target = rng.sample([f"u{i}" for i in range(50)], rng.randint(0, 30))
+
+        plan = synced(current, target)
+
+        ranks = [target.index(uri) for uri in dict.fromkeys(current) if uri in target]
+        longest = [0] * len(ranks)
+        for i, rank in enumerate(ranks):
+            longest[i] = 1 + max((longest[j] for j in range(i) if ranks[j] < rank), default=0)
+        assert len(current) - len(plan.removals) == max(longest, default=0)
+        assert plan.added == len(target) - max(longest, default=0)
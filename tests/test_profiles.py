@@ -0,0 +1,62 @@
+import threading
+import time
+
+import pytest
+
+import profiles as profiles_module
+from conftest import make_dataset
+from learning_engine import EngineClosedError, LearningEngine
+from profiles import ProfileManager
+from replay_evaluator import ReplaySpotifyClient
+from storage import Storage
+
+
+def test_close_all_drains_and_snapshots_every_engine(tmp_path):
+    profiles = ProfileManager(ReplaySpotifyClient(make_dataset([[0.2] * 9, [0.8] * 9])), data_dir=str(tmp_path))
+    engine = profiles.get_engine('alice')
+    engine.submit_rating('t0', 1)
+    engine.submit_rating('t1', -1)
+
+    profiles.close_all()
+
+    assert profiles.active_profiles() == []
+    assert Storage(str(tmp_path), profile='alice').load_model_state()['total_ratings'] == 2
+    with pytest.raises(EngineClosedError):
+        engine.submit_rating('t0', 1)
+
+
+def test_cold_load_runs_once_without_blocking_other_profiles(tmp_path, monkeypatch):
+    release = threading.Event()
+    built = []
+
+    class SlowEngine(LearningEngine):
+        def __init__(self, storage, *args, **kwargs):
+            built.append(storage.profile)
+            if storage.profile == 'slow':
+                release.wait(5)
+            super().__init__(storage, *args, **kwargs)
+
+    monkeypatch.setattr(profiles_module, 'LearningEngine', SlowEngine)
+    profiles = ProfileManager(ReplaySpotifyClient(make_dataset([[0.5] * 9])), data_dir=str(tmp_path))
+    fast = profiles.get_engine('fast')
+
+    loaded = []
+    threads = [threading.Thread(target=lambda: loaded.append(profiles.get_engine('slow'))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while 'slow' not in built and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    found = []
+    reader = threading.Thread(target=lambda: found.append(profiles.get_engine('fast')))
+    reader.start()
+    reader.join(1)
+    assert found == [fast]
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert built.count('slow') == 1
+    assert len(loaded) == 3 and all(engine is loaded[0] for engine in loaded)
+    profiles.close_all()
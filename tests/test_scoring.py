@@ -0,0 +1,36 @@
+import numpy as np
+
+from conftest import make_dataset
+from learning_engine import score_feature_block
+
+
+def test_block_model_covers_only_the_block_arms(engine_factory):
+    vectors = [[i / 20.0] * 9 for i in range(20)]
+    genres = [[f"genre{i}"] for i in range(20)]
+    engine = engine_factory(make_dataset(vectors, genres=genres))
+    store = engine.spotify.feature_store
+
+    block = store.block([store.row('t3'), store.row('t7')])
+    model = engine.build_scoring_model(block)
+
+    assert block.genres == ['genre3', 'genre7']
+    assert block.artist_ids == ['a3', 'a7']
+    assert len(model.genre_scores) == 3
+    assert len(model.artist_scores) == 3
+
+
+def test_recently_rated_tracks_get_no_diversity_bonus(engine_factory):
+    vectors = [[i / 10.0] * 9 for i in range(8)]
+    engine = engine_factory(make_dataset(vectors))
+    for i in range(5):
+        engine.update_with_rating(f"t{i}", 1)
+    store = engine.spotify.feature_store
+
+    block = store.block([store.row('t4'), store.row('t6')])
+    model = engine.build_scoring_model(block)
+    args = (model, block.features, block.genre_ids, block.artist_idx, block.fallback)
+    plain = score_feature_block(*args, np.random.default_rng(1))
+    masked = score_feature_block(*args, np.random.default_rng(1), recent=np.array([True, False]))
+
+    assert np.isclose(plain[0] - masked[0], engine.config['diversity_weight'] * model.diversity_bonus)
+    assert np.isclose(plain[1], masked[1])
@@ -0,0 +1,49 @@
+import pytest
+
+from conftest import make_dataset
+
+
+class PagedSearch:
+    def __init__(self):
+        self.offsets = []
+
+    def search(self, q, type='track', limit=10, offset=0, **kwargs):
+        self.offsets.append(offset)
+        items = [{
+            'id': f"t{position}",
+            'name': f"Track {position}",
+            'uri': f"spotify:track:t{position}",
+            'artists': [{'id': 'a1', 'name': 'Artist'}],
+            'album': {'id': 'al1', 'name': 'Album', 'images': []}
+        } for position in range(offset, min(offset + limit, 1000))]
+        return {'tracks': {'items': items, 'total': 1000}}
+
+
+@pytest.fixture
+def spotify(monkeypatch):
+    monkeypatch.setenv('SPOTIFY_CLIENT_ID', 'id')
+    monkeypatch.setenv('SPOTIFY_CLIENT_SECRET', 'secret')
+    from spotify_client import SpotifyClient
+    client = SpotifyClient()
+    client.client = client._app_client = PagedSearch()
+    client._app_auth = None
+    client.prefetch_genres = False
+    yield client
+    client.close()
+
+
+def test_search_many_keeps_the_random_window_for_small_limits(spotify):
+    first_tracks = set()
+    for _ in range(20):
+        results = spotify.search_many(['genre:rock'], limits={'genre:rock': 20}, random_offset=True)
+        assert len(results['genre:rock']) == 20
+        first_tracks.add(results['genre:rock'][0]['id'])
+    assert len(first_tracks) > 1
+    assert spotify.client.offsets == [0]
+
+
+def test_liked_genre_search_varies_between_calls(spotify, engine_factory):
+    engine = engine_factory(make_dataset([[0.5] * 9]))
+    engine.spotify = spotify
+    first_tracks = {engine._search_by_liked_genres(['rock'], set())[0]['id'] for _ in range(20)}
+    assert len(first_tracks) > 1
@@ -0,0 +1,38 @@
+import search_cache
+from search_cache import SearchCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+def page(offset, count=2):
+    return [{'id': f"t{position}"} for position in range(offset, offset + count)]
+
+
+def test_pages_expire_by_their_own_fetch_time(monkeypatch, tmp_path):
+    clock = Clock()
+    monkeypatch.setattr(search_cache.time, 'time', clock.time)
+    cache = SearchCache(ttl=100, path=str(tmp_path / 'cache.json'))
+
+    cache.put('Rock', 'track', 0, page(0), total=10)
+    clock.now += 90
+    cache.put('rock', 'track', 2, page(2), total=10)
+    assert cache.cached_prefix('rock', 'track') == 4
+    clock.now += 20
+
+    assert cache.get('rock', 'track', 2, offset=0) is None
+    assert cache.get('rock', 'track', 2, offset=2) == page(2)
+    assert cache.cached_prefix('rock', 'track') == 0
+
+    cache.save(force=True)
+    reloaded = SearchCache(ttl=100, path=str(tmp_path / 'cache.json'))
+    assert reloaded.get('rock', 'track', 2, offset=0) is None
+    assert reloaded.get('rock', 'track', 2, offset=2) == page(2)
+
+    cache.put('rock', 'track', 0, page(0), total=10)
+    assert cache.get('rock', 'track', 4, offset=0) == page(0, 4)
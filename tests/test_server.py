@@ -0,0 +1,39 @@
+import http.client
+import json
+
+import pytest
+
+from recommendation_server import MAX_BODY_BYTES, RecommendationServer
+
+
+@pytest.fixture
+def server():
+    server = RecommendationServer(None, None, port=0, token='secret')
+    server.start()
+    yield server
+    server.stop()
+
+
+def post_with_length(server, length: str):
+    host, port = server.httpd.server_address[:2]
+    connection = http.client.HTTPConnection(host, port, timeout=5)
+    connection.putrequest('POST', '/rate')
+    connection.putheader('Authorization', 'Bearer secret')
+    connection.putheader('Content-Length', length)
+    connection.endheaders()
+    response = connection.getresponse()
+    body = json.loads(response.read())
+    connection.close()
+    return response.status, body
+
+
+@pytest.mark.parametrize('length', ['abc', '-5'])
+def test_malformed_content_length_is_a_bad_request(server, length):
+    status, body = post_with_length(server, length)
+    assert status == 400
+    assert 'Content-Length' in body['error']
+
+
+def test_oversized_body_is_rejected_before_reading(server):
+    status, _ = post_with_length(server, str(MAX_BODY_BYTES + 1))
+    assert status == 413
@@ -0,0 +1,92 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+import storage as storage_module
+from storage import Storage
+
+
+def rating_data(i):
+    return {'timestamp': f"2024-01-01T00:{i // 60:02d}:{i % 60:02d}", 'session_id': f"s{i % 3}", 'artist_id': f"a{i % 5}"}
+
+
+def test_ratings_are_appended_and_survive_a_reload(tmp_path):
+    storage = Storage(str(tmp_path))
+    storage.RATINGS_COMPACT_INTERVAL = 25
+    for i in range(30):
+        storage.save_rating(f"t{i}", 1 if i % 2 else -1, rating_data(i))
+    storage.delete_rating('t3')
+    storage.save_rating('t4', 1, rating_data(40))
+
+    assert storage._ratings_log_entries == 7
+    assert len(Storage(str(tmp_path))._safe_read_json(storage.ratings_file)) == 25
+
+    reloaded = Storage(str(tmp_path)).load_ratings()
+    assert reloaded == storage.load_ratings()
+    assert 't3' not in reloaded and reloaded['t4']['rating'] == 1
+
+
+def test_a_torn_log_line_keeps_the_ratings_before_it(tmp_path):
+    storage = Storage(str(tmp_path))
+    for i in range(3):
+        storage.save_rating(f"t{i}", 1, rating_data(i))
+    with open(storage.ratings_log_file, 'a') as file:
+        file.write('{"crc": 1, "entry": {"op": "pu')
+
+    reloaded = Storage(str(tmp_path))
+    assert sorted(reloaded.load_ratings()) == ['t0', 't1', 't2']
+    assert not os.path.exists(reloaded.ratings_log_file)
+
+
+def test_indexed_queries_match_load_and_sort(tmp_path):
+    rng = np.random.default_rng(3)
+    storage = Storage(str(tmp_path))
+    for i in rng.permutation(300):
+        storage.save_rating(f"t{i}", int(rng.choice([-1, 1, 2])), rating_data(int(i)))
+    for i in rng.choice(300, 60, replace=False):
+        storage.delete_rating(f"t{i}")
+    for i in rng.choice(300, 40, replace=False):
+        storage.save_rating(f"t{i}", int(rng.choice([-1, 1, 2])), rating_data(int(i) + 400))
+
+    ratings = Storage(str(tmp_path)).load_ratings()
+    for limit, min_rating in ((10, 1), (50, 1), (500, 1), (20, 2), (20, -1)):
+        expected = sorted(((tid, r['rating'], r['timestamp']) for tid, r in ratings.items() if r['rating'] >= min_rating),
+                          key=lambda item: (item[1], item[2]), reverse=True)[:limit]
+        assert storage.top_rated(limit, min_rating) == [(tid, rating) for tid, rating, _ in expected]
+
+    start, end = rating_data(100)['timestamp'], rating_data(200)['timestamp']
+    expected = {tid: r for tid, r in ratings.items() if start <= r['timestamp'] < end}
+    assert storage.ratings_in_range(start, end) == expected
+    assert storage.ratings_for_session('s1') == {tid: r for tid, r in ratings.items() if r['session_id'] == 's1'}
+    assert storage.ratings_for_artist('a2') == {tid: r for tid, r in ratings.items() if r['artist_id'] == 'a2'}
+
+
+class FrozenMonth(datetime):
+    month = '2024-01'
+
+    @classmethod
+    def now(cls, tz=None):
+        year, month = cls.month.split('-')
+        return datetime(int(year), int(month), 15)
+
+
+def test_session_segments_round_trip_through_gzip(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_module, 'datetime', FrozenMonth)
+    legacy = [{'session_id': 'legacy', 'ratings': 2}]
+    with open(tmp_path / 'session_history.json', 'w') as file:
+        json.dump(legacy, file)
+
+    storage = Storage(str(tmp_path), compress_old_sessions=True)
+    january = [{'session_id': f"jan{i}", 'ratings': i} for i in range(3)]
+    for session in january:
+        storage.save_session(session)
+    with open(tmp_path / 'sessions' / '2024-01.jsonl', 'a') as file:
+        file.write('{"torn": \n')
+
+    monkeypatch.setattr(FrozenMonth, 'month', '2024-02')
+    storage.save_session({'session_id': 'feb0', 'ratings': 5})
+
+    assert sorted(os.listdir(tmp_path / 'sessions')) == ['0000-00-legacy.jsonl.gz', '2024-01.jsonl.gz', '2024-02.jsonl']
+    assert Storage(str(tmp_path)).load_sessions() == legacy + january + [{'session_id': 'feb0', 'ratings': 5}]
@@ -0,0 +1,45 @@
+import numpy as np
+
+from conftest import make_dataset
+from feature_store import FeatureStore
+from features import FALLBACK_VECTOR
+from hyperparameter_sweep import run_sweep, sample_configs
+from replay_evaluator import ReplaySpotifyClient, replay
+
+
+def sweep_dataset(count=120):
+    rng = np.random.default_rng(5)
+    vectors = rng.random((count, 9))
+    vectors[7] = FALLBACK_VECTOR
+    dataset = make_dataset(vectors.tolist(), genres=[['rock'] if i % 3 else ['jazz'] for i in range(count)],
+                           artists=[f"a{i % 11}" for i in range(count)])
+    dataset.ratings = np.where(vectors[:, 0] > 0.5, 1, -1).astype(np.int8)
+    return dataset
+
+
+def test_bulk_loaded_store_matches_row_by_row_adds():
+    dataset = sweep_dataset()
+    bulk = ReplaySpotifyClient(dataset).feature_store
+    single = FeatureStore()
+    for row, track_id in enumerate(dataset.track_ids):
+        vector = dataset.features[row]
+        single.add(track_id, vector, dataset.genres[row], dataset.artist_ids[row],
+                   fallback=bool(np.allclose(vector, FALLBACK_VECTOR)))
+
+    assert bulk.track_ids == single.track_ids
+    assert bulk.is_fallback(bulk.row('t7'))
+    for row in range(len(dataset)):
+        assert bulk.track_features(row) == single.track_features(row)
+
+
+def test_trials_sharing_a_client_match_fresh_replays():
+    dataset = sweep_dataset()
+    configs = sample_configs(3, seed=1)
+    spotify = ReplaySpotifyClient(dataset)
+
+    shared = [replay(dataset, seed=0, config=config, spotify=spotify)['auc'] for config in configs]
+    fresh = [replay(dataset, seed=0, config=config)['auc'] for config in configs]
+    assert shared == fresh
+
+    results = run_sweep(dataset, configs, workers=1, seed=0)
+    assert {trial: metrics['auc'] for trial, _, metrics in results} == dict(enumerate(fresh))
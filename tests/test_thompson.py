@@ -0,0 +1,37 @@
+import numpy as np
+
+from conftest import make_dataset
+
+
+def per_arm_samples(rng, alpha, beta, recent_avg, draws, recent_weight, penalty_ratio, penalty_factor):
+    samples = []
+    for _ in range(draws):
+        sample = rng.beta(alpha, beta) + recent_weight * recent_avg
+        if beta > alpha * penalty_ratio:
+            sample *= penalty_factor
+        samples.append(min(1.0, max(0.0, sample)))
+    return np.array(samples)
+
+
+def test_batched_samples_match_per_arm_beta_draws(engine_factory):
+    engine = engine_factory(make_dataset([[0.5] * 9]))
+    arms = {
+        'rock': (12.0, 3.0, 0.4, 0.6, 10),
+        'jazz': (2.0, 9.0, -0.2, -0.4, 10),
+        'folk': (1.0, 1.0, 0.0, 0.0, 0),
+        'metal': (30.0, 28.0, 0.1, 0.0, 10)
+    }
+    rows = {'rock': 0, 'jazz': 1, 'folk': 2, 'metal': 3}
+    draws = 4000
+
+    batched = np.array([engine._catalog_arm_scores(arms, rows, len(rows), 0.5, 2.5, 0.4) for _ in range(draws)])
+    assert (batched[:, -1] == 0.5).all()
+
+    rng = np.random.default_rng(11)
+    for key, row in rows.items():
+        alpha, beta, recent_avg = arms[key][:3]
+        reference = per_arm_samples(rng, alpha, beta, recent_avg, draws, 0.5, 2.5, 0.4)
+        quantiles = [0.1, 0.25, 0.5, 0.75, 0.9]
+        assert abs(batched[:, row].mean() - reference.mean()) < 0.01, key
+        assert abs(batched[:, row].std() - reference.std()) < 0.01, key
+        assert np.allclose(np.quantile(batched[:, row], quantiles), np.quantile(reference, quantiles), atol=0.02), key
@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+
+class RecordingSpotify:
+    def __init__(self):
+        self.calls = []
+
+    def search(self, q, type='track', limit=10, offset=0, **kwargs):
+        self.calls.append(('search', q))
+        items = [{
+            'id': f"s{i}",
+            'name': f"Song {i}",
+            'uri': f"spotify:track:s{i}",
+            'popularity': 40 + i,
+            'duration_ms': 180000,
+            'artists': [{'id': f"artist{i}", 'name': f"Artist {i}"}, {'id': 'guest', 'name': 'Guest'}],
+            'album': {'id': f"album{i}", 'name': f"Album {i}", 'images': [{'url': f"cover{i}"}]}
+        } for i in range(3)]
+        return {'tracks': {'items': items, 'total': 3}}
+
+    def tracks(self, track_ids):
+        self.calls.append(('tracks', list(track_ids)))
+        return {'tracks': [{'id': track_id, 'artists': [{'id': f"artist-{track_id}"}]} for track_id in track_ids]}
+
+    def artists(self, artist_ids):
+        self.calls.append(('artists', list(artist_ids)))
+        return {'artists': [{'id': artist_id, 'genres': [f"{artist_id} core"]} for artist_id in artist_ids]}
+
+
+@pytest.fixture
+def spotify(monkeypatch):
+    monkeypatch.setenv('SPOTIFY_CLIENT_ID', 'id')
+    monkeypatch.setenv('SPOTIFY_CLIENT_SECRET', 'secret')
+    from spotify_client import SpotifyClient
+    client = SpotifyClient()
+    client.client = client._app_client = RecordingSpotify()
+    client._app_auth = None
+    client.prefetch_genres = False
+    yield client
+    client.close()
+
+
+def test_search_candidates_keep_artist_and_album_and_skip_track_lookups(spotify):
+    candidates = [spotify.format_track(track) for track in spotify.search_tracks('genre:rock')]
+
+    assert candidates[1]['artist_id'] == 'artist1'
+    assert candidates[1]['artist_ids'] == ['artist1', 'guest']
+    assert (candidates[1]['album_id'], candidates[1]['album_name']) == ('album1', 'Album 1')
+    assert (candidates[1]['album_cover'], candidates[1]['popularity']) == ('cover1', 41)
+    assert candidates[1]['artist'] == 'Artist 1, Guest'
+
+    rows = spotify.get_feature_rows(['s0', 's1', 's2', 'elsewhere'])
+
+    assert [call for call in spotify.client.calls if call[0] == 'tracks'] == [('tracks', ['elsewhere'])]
+    assert spotify.client.calls[-1] == ('artists', ['artist0', 'artist1', 'artist2', 'artist-elsewhere'])
+    assert spotify.feature_store.track_features(rows['s1'])['genres'] == ['artist1 core']
+    assert spotify.feature_store.track_features(rows['elsewhere'])['genres'] == ['artist-elsewhere core']
+
+
+def test_search_results_prefetch_artist_genres_in_one_batch(spotify):
+    spotify.prefetch_genres = True
+    spotify.search_tracks('genre:rock')
+
+    deadline = time.monotonic() + 5
+    while spotify._prefetch_queued and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [call for call in spotify.client.calls if call[0] == 'artists'] == [
+        ('artists', ['artist0', 'artist1', 'artist2'])]
+
+    spotify.search_tracks('genre:rock')
+    rows = spotify.get_feature_rows(['s0', 's1', 's2'])
+
+    assert len([call for call in spotify.client.calls if call[0] == 'artists']) == 1
+    assert not [call for call in spotify.client.calls if call[0] == 'tracks']
+    assert spotify.feature_store.track_features(rows['s2'])['genres'] == ['artist2 core']
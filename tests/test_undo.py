@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+import numpy as np
+
+from conftest import make_dataset
+
+
+def engine_state(engine):
+    return {
+        'genre_arms': {key: [arm['alpha'], arm['beta']] for key, arm in engine.genre_scores.items()},
+        'artist_arms': {key: [arm['alpha'], arm['beta']] for key, arm in engine.artist_scores.items()},
+        'genre_history': {key: list(arm['history']) for key, arm in engine.genre_scores.items()},
+        'artist_history': {key: list(arm['history']) for key, arm in engine.artist_scores.items()},
+        'genre_summaries': dict(engine._genre_summaries),
+        'artist_summaries': dict(engine._artist_summaries),
+        'global_mean': engine.global_feature_mean.tolist(),
+        'recent_mean': engine.recent_feature_mean.tolist(),
+        'session_mean': engine.session_feature_mean.tolist(),
+        'centroids': engine.cluster_centroids.tolist(),
+        'counts': engine.cluster_counts.tolist(),
+        'cluster_ids': list(engine.cluster_ids),
+        'next_cluster_id': engine._next_cluster_id,
+        'exploration_rate': engine.exploration_rate,
+        'consecutive_dislikes': engine.consecutive_dislikes,
+        'total_ratings': engine.total_ratings,
+        'session_ratings': engine.session_ratings,
+        'recent_ratings': [(r['track_id'], r['rating']) for r in engine.recent_ratings]
+    }
+
+
+def test_undoing_a_middle_rating_matches_never_rating_it(engine_factory):
+    vectors = [[0.1] * 9, [0.9] * 9, [0.3] * 9]
+    dataset = make_dataset(vectors, genres=[['rock'], ['jazz'], ['rock']], artists=['a0', 'a1', 'a1'])
+    config = {'decay_rate': 0.0}
+
+    engine = engine_factory(dataset, config=config)
+    engine.update_with_rating('t0', 1)
+    engine.update_with_rating('t1', -1)
+    engine.update_with_rating('t2', -1)
+    engine.update_with_rating('t1', -1, is_undo=True)
+
+    reference = engine_factory(dataset, config=config, profile='reference')
+    reference.update_with_rating('t0', 1)
+    reference.update_with_rating('t2', -1)
+
+    assert engine_state(engine) == engine_state(reference)
+
+
+def test_undoing_the_latest_rating_restores_decayed_arms(engine_factory):
+    dataset = make_dataset([[0.2] * 9, [0.4] * 9], genres=[['rock'], ['rock']], artists=['a0', 'a0'])
+    engine = engine_factory(dataset, config={'decay_hours': 1.0, 'decay_rate': 0.9})
+    engine.update_with_rating('t0', 1)
+    engine.last_rating_time -= timedelta(hours=1.5)
+    before = engine_state(engine)
+
+    engine.update_with_rating('t1', 1)
+    assert next(reversed(engine._rating_deltas.values()))['decay']['clamped']
+    engine.update_with_rating('t1', 1, is_undo=True)
+    after = engine_state(engine)
+
+    for key, value in before.items():
+        if key.endswith('_arms'):
+            assert after[key].keys() == value.keys()
+            for arm, scores in value.items():
+                assert np.allclose(after[key][arm], scores)
+        elif key.endswith('_mean'):
+            assert np.allclose(after[key], value)
+        else:
+            assert after[key] == value